@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from pagination import encode_cursor, decode_cursor
+
+USER_REGISTRATION = "user_registration"
+DOCTOR_APPLICATION = "doctor_application"
+APPOINTMENT_CREATED = "appointment_created"
+
+
+def _user_name(session: Session, user_id: Optional[int]) -> str:
+    user = session.get(models.User, user_id) if user_id is not None else None
+    return user.name if user else "Unknown"
+
+
+def _entry(session: Session, obj) -> Optional[Dict[str, object]]:
+    """Activity row for a newly inserted object, if it is worth one"""
+    if isinstance(obj, models.User):
+        return {"activity_type": USER_REGISTRATION, "entity_id": obj.user_id,
+                "message": f"New user registered: {obj.name}"}
+    if isinstance(obj, models.Doctor):
+        return {"activity_type": DOCTOR_APPLICATION, "entity_id": obj.doctor_id,
+                "message": f"New doctor application: Dr. {obj.name}"}
+    if isinstance(obj, models.Appointment):
+        return {"activity_type": APPOINTMENT_CREATED, "entity_id": obj.appointment_id,
+                "message": f"New appointment scheduled by {_user_name(session, obj.user_id)}"}
+    return None
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def log_flush_activity(session, flush_context):
+    """Append feed entries in the same transaction as the rows they describe"""
+    entries = [entry for entry in (_entry(session, obj) for obj in session.new) if entry]
+    if entries:
+        session.connection().execute(insert(models.ActivityLog.__table__), entries)
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def _existing_activity():
+    """Feed entries for the users, doctors and appointments already stored, oldest first"""
+    U, D, A = models.User, models.Doctor, models.Appointment
+    return union_all(
+        select(literal(USER_REGISTRATION), literal("New user registered: ") + U.name,
+               U.user_id, U.created_at).where(U.created_at.isnot(None)),
+        select(literal(DOCTOR_APPLICATION), literal("New doctor application: Dr. ") + D.name,
+               D.doctor_id, D.created_at).where(D.created_at.isnot(None)),
+        select(literal(APPOINTMENT_CREATED), literal("New appointment scheduled by ") + func.coalesce(U.name, "Unknown"),
+               A.appointment_id, A.created_at).outerjoin(U, U.user_id == A.user_id).where(A.created_at.isnot(None)),
+    ).order_by("created_at")
+
+
+def backfill(db: Session) -> int:
+    """Seed the feed from existing rows, inserted in time order so ids follow created_at"""
+    result = db.execute(insert(models.ActivityLog.__table__).from_select(
+        ["activity_type", "message", "entity_id", "created_at"], _existing_activity()
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def backfill_if_empty() -> int:
+    """Seed an empty feed (e.g. a table created by create_all next to existing data)"""
+    with SessionLocal() as db:
+        if db.execute(select(models.ActivityLog.activity_id).limit(1)).first() is not None:
+            return 0
+        return backfill(db)
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def page(db: Session, limit: int, cursor: Optional[str] = None) -> Tuple[List[models.ActivityLog], Optional[str]]:
+    """
+    Newest entries first. The log is append-only, so activity_id order is
+    time order and a page is one primary-key range scan; the cursor carries
+    the last activity_id returned. Returns (entries, next_cursor) and raises
+    ValueError for a malformed cursor.
+    """
+    A = models.ActivityLog
+    query = select(A).order_by(A.activity_id.desc())
+    if cursor:
+        before = decode_cursor(cursor)
+        if not isinstance(before, int):
+            raise ValueError("Invalid cursor")
+        query = query.where(A.activity_id < before)
+    # Fetch one extra row to know whether another page exists
+    entries = db.execute(query.limit(limit + 1)).scalars().all()
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    return entries, encode_cursor(entries[-1].activity_id)
@@ -1,6 +1,9 @@
 import requests
 import json
-from typing import List, Dict, Any
+import re
+import time
+from collections import Counter
+from typing import List, Dict, Any, Optional
 from fastapi import HTTPException
 import schemas
 from database import get_db
@@ -8,6 +11,10 @@ from sqlalchemy.orm import Session
 import crud
 import os
 from dotenv import load_dotenv
+from cache import symptom_cache
+from circuit_breaker import CircuitBreaker
+from keyword_matcher import KeywordMatcher
+from config import settings
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +23,18 @@ load_dotenv()
 AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://localhost:8001/analyze-symptoms")
 FALLBACK_AI_ENABLED = os.getenv("FALLBACK_AI_ENABLED", "true").lower() == "true"
 
+# Skips the AI service while it is failing, and times calls out relative to
+# its observed latency instead of always waiting AI_TIMEOUT_MAX
+ai_service_breaker = CircuitBreaker(
+    "ai_symptom_service",
+    failure_threshold=settings.AI_BREAKER_FAILURES,
+    reset_timeout=settings.AI_BREAKER_RESET_TIMEOUT,
+    min_timeout=settings.AI_TIMEOUT_MIN,
+    max_timeout=settings.AI_TIMEOUT_MAX,
+    percentile=settings.AI_TIMEOUT_PERCENTILE,
+    multiplier=settings.AI_TIMEOUT_MULTIPLIER,
+)
+
 # Simple symptom to specialization mapping (fallback)
 SYMPTOM_SPECIALIZATION_MAP = {
     "heart": "Cardiologist",
@@ -64,64 +83,100 @@ URGENCY_KEYWORDS = {
     "routine": schemas.UrgencyLevel.LOW,
 }
 
-def analyze_symptoms(symptoms: str, db: Session) -> schemas.SymptomAnalysisResponse:
+# The most urgent keyword found decides the urgency
+URGENCY_RANK = {
+    schemas.UrgencyLevel.LOW: 0,
+    schemas.UrgencyLevel.MEDIUM: 1,
+    schemas.UrgencyLevel.HIGH: 2,
+    schemas.UrgencyLevel.EMERGENCY: 3,
+}
+
+def build_symptom_matcher() -> KeywordMatcher:
+    return KeywordMatcher({"specialization": SYMPTOM_SPECIALIZATION_MAP, "urgency": URGENCY_KEYWORDS})
+
+symptom_matcher = build_symptom_matcher()
+
+def rebuild_symptom_matcher():
+    """Recompile the keyword matcher after SYMPTOM_SPECIALIZATION_MAP or URGENCY_KEYWORDS change"""
+    global symptom_matcher
+    symptom_matcher = build_symptom_matcher()
+    symptom_cache.invalidate("rules")
+
+# Filler words left out of the cache key. Negations ("no", "not", "dont")
+# change the meaning and are kept.
+STOP_WORDS = frozenset({
+    "a", "about", "also", "am", "an", "and", "are", "at", "been", "bit", "for", "from", "got", "had",
+    "has", "have", "having", "i", "im", "is", "it", "ive", "just", "kind", "little", "me", "my", "of",
+    "on", "or", "please", "really", "since", "so", "some", "the", "this", "to", "very", "was", "with",
+})
+
+def normalize_symptoms(symptoms: str) -> str:
+    """Symptom text in lower case, without punctuation or stop-words, words separated by single spaces"""
+    words = re.sub(r"[^\w\s]", " ", symptoms.lower().replace("'", "")).split()
+    return " ".join(word for word in words if word not in STOP_WORDS)
+
+# Returned for AI service answers that are neither a result nor an outage
+GENERAL_ANALYSIS = {
+    "suggested_specialization": "General Physician",
+    "urgency": schemas.UrgencyLevel.MEDIUM,
+    "advice": "Please consult with a doctor for proper diagnosis",
+}
+
+def _response(analysis: Dict[str, Any], db: Session) -> schemas.SymptomAnalysisResponse:
+    # Looked up on every request rather than cached, so newly approved or
+    # removed doctors show up at once
+    recommended_doctors = crud.get_doctor_ids_by_specialization(db, analysis["suggested_specialization"], limit=3)
+    return schemas.SymptomAnalysisResponse(**analysis, recommended_doctors=recommended_doctors)
+
+def ai_analysis(symptoms: str) -> Optional[Dict[str, Any]]:
     """
-    Analyze symptoms using AI service or fallback rules
+    Analysis by the AI service, or None while it is unavailable
     """
+    if not ai_service_breaker.allow():
+        # The service has been failing; don't wait on it
+        return None
     try:
-        # Try to use AI service first
+        started = time.monotonic()
         response = requests.post(
             AI_SERVICE_URL,
             json={"symptoms": symptoms},
-            timeout=10  # 10 second timeout
+            timeout=ai_service_breaker.timeout()
         )
-        
-        if response.status_code == 200:
-            ai_data = response.json()
-            return schemas.SymptomAnalysisResponse(
-                suggested_specialization=ai_data.get("specialization", "General Physician"),
-                urgency=ai_data.get("urgency", schemas.UrgencyLevel.MEDIUM),
-                recommended_doctors=ai_data.get("recommended_doctors", []),
-                advice=ai_data.get("advice")
-            )
+        if response.status_code >= 500:
+            raise requests.HTTPError(f"AI service answered {response.status_code}", response=response)
+        ai_service_breaker.record_success(time.monotonic() - started)
+        if response.status_code != 200:
+            return GENERAL_ANALYSIS
+        ai_data = response.json()
     except (requests.RequestException, requests.Timeout):
-        # AI service failed, use fallback if enabled
-        if FALLBACK_AI_ENABLED:
-            return analyze_symptoms_fallback(symptoms, db)
-        else:
-            raise HTTPException(status_code=503, detail="AI service unavailable")
-    
-    # If all else fails, return general physician
-    return schemas.SymptomAnalysisResponse(
-        suggested_specialization="General Physician",
-        urgency=schemas.UrgencyLevel.MEDIUM,
-        recommended_doctors=[],
-        advice="Please consult with a doctor for proper diagnosis"
-    )
+        ai_service_breaker.record_failure()
+        return None
+    return {
+        "suggested_specialization": ai_data.get("specialization", "General Physician"),
+        "urgency": ai_data.get("urgency", schemas.UrgencyLevel.MEDIUM),
+        "advice": ai_data.get("advice"),
+    }
 
-def analyze_symptoms_fallback(symptoms: str, db: Session) -> schemas.SymptomAnalysisResponse:
+def rule_analysis(symptoms: str) -> Dict[str, Any]:
     """
-    Fallback symptom analysis using simple keyword matching
+    Analysis by keyword matching: the specialization with the most keyword
+    matches (the earliest mentioned on a tie), and the most urgent keyword
     """
-    symptoms_lower = symptoms.lower()
+    votes = Counter()
+    first_mentioned = {}
+    urgency = None
+    for match in symptom_matcher.find(symptoms):
+        if match.table == "specialization":
+            votes[match.value] += 1
+            first_mentioned.setdefault(match.value, match.start)
+        elif urgency is None or URGENCY_RANK[match.value] > URGENCY_RANK[urgency]:
+            urgency = match.value
     
-    # Determine specialization based on keywords
     specialization = "General Physician"
-    for keyword, spec in SYMPTOM_SPECIALIZATION_MAP.items():
-        if keyword in symptoms_lower:
-            specialization = spec
-            break
-    
-    # Determine urgency based on keywords
-    urgency = schemas.UrgencyLevel.MEDIUM
-    for keyword, urg_level in URGENCY_KEYWORDS.items():
-        if keyword in symptoms_lower:
-            urgency = urg_level
-            break
-    
-    # Find doctors with the suggested specialization
-    doctors = crud.get_doctors_by_specialization(db, specialization)
-    recommended_doctors = [doctor.doctor_id for doctor in doctors[:3]]  # Top 3 doctors
+    if votes:
+        specialization = max(votes, key=lambda spec: (votes[spec], -first_mentioned[spec]))
+    if urgency is None:
+        urgency = schemas.UrgencyLevel.MEDIUM
     
     # Generate advice based on urgency
     advice = "Please schedule an appointment with a specialist."
@@ -130,12 +185,43 @@ def analyze_symptoms_fallback(symptoms: str, db: Session) -> schemas.SymptomAnal
     elif urgency == schemas.UrgencyLevel.HIGH:
         advice = "Your symptoms suggest a condition that requires prompt medical attention. Please schedule an appointment as soon as possible."
     
-    return schemas.SymptomAnalysisResponse(
-        suggested_specialization=specialization,
-        urgency=urgency,
-        recommended_doctors=recommended_doctors,
-        advice=advice
-    )
+    return {"suggested_specialization": specialization, "urgency": urgency, "advice": advice}
+
+def analyze_symptoms(symptoms: str, db: Session) -> schemas.SymptomAnalysisResponse:
+    """
+    Analyze symptoms using AI service or fallback rules. Analyses are
+    cached by normalized symptom text; recommended doctors are not.
+    """
+    key = ("ai", normalize_symptoms(symptoms))
+    analysis = symptom_cache.get(key)
+    if analysis is None:
+        analysis = ai_analysis(symptoms)
+        if analysis is None:
+            # AI service failed, use fallback if enabled
+            return ai_service_unavailable(symptoms, db)
+        if analysis is not GENERAL_ANALYSIS:
+            symptom_cache.set(key, analysis)
+    return _response(analysis, db)
+
+def ai_service_unavailable(symptoms: str, db: Session) -> schemas.SymptomAnalysisResponse:
+    """
+    Answer without the AI service: fallback rules if enabled, else 503
+    """
+    if FALLBACK_AI_ENABLED:
+        return analyze_symptoms_fallback(symptoms, db)
+    raise HTTPException(status_code=503, detail="AI service unavailable")
+
+def analyze_symptoms_fallback(symptoms: str, db: Session) -> schemas.SymptomAnalysisResponse:
+    """
+    Fallback symptom analysis using simple keyword matching
+    """
+    # The rules read the normalized text, so one key always means one result
+    normalized = normalize_symptoms(symptoms)
+    analysis = symptom_cache.get(("rules", normalized))
+    if analysis is None:
+        analysis = rule_analysis(normalized)
+        symptom_cache.set(("rules", normalized), analysis)
+    return _response(analysis, db)
 
 def analyze_symptoms_from_call(symptoms: str, db: Session) -> schemas.SymptomAnalysisResponse:
     """
@@ -0,0 +1,57 @@
+"""Daily rollups for appointments, symptom checks and calls
+
+Revision ID: 0a6d3b8e5f21
+Revises: f2c7a9e4b183
+Create Date: 2025-10-01 14:37:58.206114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d3b8e5f21'
+down_revision = 'f2c7a9e4b183'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('daily_appointment_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('appointment_type', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'status', 'appointment_type')
+    )
+    op.create_table('daily_symptom_check_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('suggested_specialization', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'suggested_specialization')
+    )
+    op.create_table('daily_call_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('urgency', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'urgency')
+    )
+
+    # Backfill from the existing rows
+    for table, source, day, keys in (
+        ('daily_appointment_stats', 'appointments', 'appointment_time', ('status', 'appointment_type')),
+        ('daily_symptom_check_stats', 'symptom_checks', 'created_at', ('suggested_specialization',)),
+        ('daily_call_stats', 'call_bookings', 'call_timestamp', ('urgency',)),
+    ):
+        key_exprs = ", ".join(f"COALESCE({key}, 'UNKNOWN')" for key in keys)
+        op.execute(
+            f"INSERT INTO {table} (day, {', '.join(keys)}, count) "
+            f"SELECT DATE({day}), {key_exprs}, COUNT(*) FROM {source} "
+            f"WHERE {day} IS NOT NULL GROUP BY DATE({day}), {key_exprs}"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_call_stats')
+    op.drop_table('daily_symptom_check_stats')
+    op.drop_table('daily_appointment_stats')
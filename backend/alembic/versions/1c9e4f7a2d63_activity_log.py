@@ -0,0 +1,51 @@
+"""Append-only activity log for the admin feed
+
+Revision ID: 1c9e4f7a2d63
+Revises: 0a6d3b8e5f21
+Create Date: 2025-10-02 10:12:44.518320
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c9e4f7a2d63'
+down_revision = '0a6d3b8e5f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('activity_log',
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('activity_type', sa.String(length=50), nullable=False),
+    sa.Column('message', sa.String(length=255), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('activity_id')
+    )
+    op.create_index('ix_activity_log_created_at', 'activity_log', ['created_at'], unique=False)
+
+    # Seed the feed from existing registrations, applications and appointments,
+    # oldest first so activity_id order matches created_at order
+    op.execute(
+        "INSERT INTO activity_log (activity_type, message, entity_id, created_at) "
+        "SELECT activity_type, message, entity_id, created_at FROM ("
+        "SELECT 'user_registration' AS activity_type, 'New user registered: ' || name AS message, "
+        "user_id AS entity_id, created_at FROM users WHERE created_at IS NOT NULL "
+        "UNION ALL "
+        "SELECT 'doctor_application', 'New doctor application: Dr. ' || name, doctor_id, created_at "
+        "FROM doctors WHERE created_at IS NOT NULL "
+        "UNION ALL "
+        "SELECT 'appointment_created', 'New appointment scheduled by ' || COALESCE(users.name, 'Unknown'), "
+        "appointments.appointment_id, appointments.created_at "
+        "FROM appointments LEFT OUTER JOIN users ON users.user_id = appointments.user_id "
+        "WHERE appointments.created_at IS NOT NULL"
+        ") AS existing ORDER BY created_at"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_activity_log_created_at', table_name='activity_log')
+    op.drop_table('activity_log')
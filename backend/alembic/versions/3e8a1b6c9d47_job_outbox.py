@@ -0,0 +1,34 @@
+"""Notification outbox: idempotency keys and batch claims on jobs
+
+Revision ID: 3e8a1b6c9d47
+Revises: 2b7d5e8c1f94
+Create Date: 2025-10-06 14:12:38.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a1b6c9d47'
+down_revision = '2b7d5e8c1f94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('idempotency_key', sa.String(length=200), nullable=True))
+    op.add_column('jobs', sa.Column('claim_token', sa.String(length=32), nullable=True))
+    op.add_column('jobs', sa.Column('finished_at', sa.DateTime(), nullable=True))
+    # Jobs that finished before this revision count from their last update
+    op.execute("UPDATE jobs SET finished_at = updated_at WHERE status IN ('SUCCEEDED', 'FAILED')")
+    op.create_index('ix_jobs_status_finished_at', 'jobs', ['status', 'finished_at'], unique=False)
+    op.create_index('ix_jobs_idempotency_key', 'jobs', ['idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_idempotency_key', table_name='jobs')
+    op.drop_index('ix_jobs_status_finished_at', table_name='jobs')
+    op.drop_column('jobs', 'finished_at')
+    op.drop_column('jobs', 'claim_token')
+    op.drop_column('jobs', 'idempotency_key')
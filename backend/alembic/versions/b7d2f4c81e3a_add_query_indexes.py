@@ -0,0 +1,44 @@
+"""Add indexes for hot query predicates
+
+Revision ID: b7d2f4c81e3a
+Revises: 5a4e9a4aadaa
+Create Date: 2025-09-20 10:12:05.413870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f4c81e3a'
+down_revision = '5a4e9a4aadaa'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_created_at', 'users', ['created_at']),
+    ('ix_doctors_status_specialization', 'doctors', ['status', 'specialization']),
+    ('ix_doctors_status_created_at', 'doctors', ['status', 'created_at']),
+    ('ix_hospitals_status', 'hospitals', ['status']),
+    ('ix_appointments_user_time', 'appointments', ['user_id', 'appointment_time']),
+    ('ix_appointments_doctor_time', 'appointments', ['doctor_id', 'appointment_time']),
+    ('ix_appointments_hospital_time', 'appointments', ['hospital_id', 'appointment_time']),
+    ('ix_appointments_status_time', 'appointments', ['status', 'appointment_time']),
+    ('ix_appointments_appointment_time', 'appointments', ['appointment_time']),
+    ('ix_appointments_created_at', 'appointments', ['created_at']),
+    ('ix_medical_records_user_id', 'medical_records', ['user_id']),
+    ('ix_prescriptions_user_id', 'prescriptions', ['user_id', 'prescription_id']),
+    ('ix_prescriptions_created_at', 'prescriptions', ['created_at']),
+    ('ix_symptom_checks_user_id', 'symptom_checks', ['user_id']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
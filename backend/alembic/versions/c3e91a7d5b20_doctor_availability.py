@@ -0,0 +1,54 @@
+"""Structured doctor availability
+
+Revision ID: c3e91a7d5b20
+Revises: b7d2f4c81e3a
+Create Date: 2025-09-22 09:41:27.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e91a7d5b20'
+down_revision = 'b7d2f4c81e3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('doctor_availability_rules',
+    sa.Column('rule_id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('weekday', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.Column('slot_minutes', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.doctor_id'], ),
+    sa.PrimaryKeyConstraint('rule_id')
+    )
+    op.create_index('ix_doctor_availability_rules_rule_id', 'doctor_availability_rules', ['rule_id'], unique=False)
+    op.create_index('ix_doctor_availability_rules_doctor_id', 'doctor_availability_rules', ['doctor_id'], unique=False)
+    op.create_table('doctor_availability_exceptions',
+    sa.Column('exception_id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=True),
+    sa.Column('end_time', sa.Time(), nullable=True),
+    sa.Column('is_available', sa.Boolean(), nullable=True),
+    sa.Column('slot_minutes', sa.Integer(), nullable=True),
+    sa.Column('reason', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.doctor_id'], ),
+    sa.PrimaryKeyConstraint('exception_id')
+    )
+    op.create_index('ix_doctor_availability_exceptions_exception_id', 'doctor_availability_exceptions', ['exception_id'], unique=False)
+    op.create_index('ix_doctor_availability_exceptions_doctor_day', 'doctor_availability_exceptions', ['doctor_id', 'day'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_doctor_availability_exceptions_doctor_day', table_name='doctor_availability_exceptions')
+    op.drop_index('ix_doctor_availability_exceptions_exception_id', table_name='doctor_availability_exceptions')
+    op.drop_table('doctor_availability_exceptions')
+    op.drop_index('ix_doctor_availability_rules_doctor_id', table_name='doctor_availability_rules')
+    op.drop_index('ix_doctor_availability_rules_rule_id', table_name='doctor_availability_rules')
+    op.drop_table('doctor_availability_rules')
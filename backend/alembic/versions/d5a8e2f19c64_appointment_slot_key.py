@@ -0,0 +1,58 @@
+"""Unique slot key on appointments
+
+Revision ID: d5a8e2f19c64
+Revises: c3e91a7d5b20
+Create Date: 2025-09-24 15:12:03.562310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8e2f19c64'
+down_revision = 'c3e91a7d5b20'
+branch_labels = None
+depends_on = None
+
+
+appointments = sa.table(
+    'appointments',
+    sa.column('appointment_id', sa.Integer),
+    sa.column('doctor_id', sa.Integer),
+    sa.column('appointment_time', sa.DateTime),
+    sa.column('status', sa.String),
+    sa.column('slot_key', sa.String),
+)
+
+
+def upgrade() -> None:
+    op.add_column('appointments', sa.Column('slot_key', sa.String(length=64), nullable=True))
+
+    # Existing double bookings keep their rows; only the oldest holds the key
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(appointments.c.appointment_id, appointments.c.doctor_id, appointments.c.appointment_time)
+        .where(appointments.c.status != 'CANCELLED')
+        .where(appointments.c.doctor_id.isnot(None))
+        .where(appointments.c.appointment_time.isnot(None))
+        .order_by(appointments.c.appointment_id)
+    ).all()
+    seen = set()
+    for appointment_id, doctor_id, appointment_time in rows:
+        key = f"{doctor_id}@{appointment_time:%Y-%m-%dT%H:%M}"
+        if key in seen:
+            continue
+        seen.add(key)
+        conn.execute(
+            appointments.update()
+            .where(appointments.c.appointment_id == appointment_id)
+            .values(slot_key=key)
+        )
+
+    op.create_index('ix_appointments_slot_key', 'appointments', ['slot_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_slot_key', table_name='appointments')
+    op.drop_column('appointments', 'slot_key')
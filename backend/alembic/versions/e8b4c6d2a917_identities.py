@@ -0,0 +1,65 @@
+"""Unified identities table for login lookups
+
+Revision ID: e8b4c6d2a917
+Revises: d5a8e2f19c64
+Create Date: 2025-09-26 11:20:45.907113
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b4c6d2a917'
+down_revision = 'd5a8e2f19c64'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def upgrade() -> None:
+    op.create_table('identities',
+    sa.Column('identity_id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('role', sa.Enum('USER', 'DOCTOR', 'ADMIN', name='userrole'), nullable=False),
+    sa.Column('principal_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('identity_id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_index('ix_identities_identity_id', 'identities', ['identity_id'], unique=False)
+
+    # An email in several account tables gets one identity, taken in the
+    # order login used to probe them (users, doctors, admins). Login used to
+    # fall through to the next table on a wrong password; the others are
+    # still reachable that way through crud.authenticate_user, but they are
+    # reported here so they can be given distinct emails.
+    bind = op.get_bind()
+    shared = bind.execute(sa.text(
+        "SELECT email, COUNT(*) FROM ("
+        "SELECT email FROM users UNION ALL "
+        "SELECT email FROM doctors UNION ALL "
+        "SELECT email FROM admins"
+        ") accounts WHERE email IS NOT NULL GROUP BY email HAVING COUNT(*) > 1"
+    )).fetchall()
+    for email, count in shared:
+        logger.warning("identities: %s belongs to %d accounts; login resolves it to the first of "
+                       "users, doctors, admins and falls back to the others on a wrong password", email, count)
+
+    for role, table, key in (('USER', 'users', 'user_id'),
+                             ('DOCTOR', 'doctors', 'doctor_id'),
+                             ('ADMIN', 'admins', 'admin_id')):
+        op.execute(
+            f"INSERT INTO identities (email, role, principal_id, created_at) "
+            f"SELECT t.email, '{role}', t.{key}, CURRENT_TIMESTAMP FROM {table} t "
+            f"WHERE t.email IS NOT NULL "
+            f"AND NOT EXISTS (SELECT 1 FROM identities i WHERE i.email = t.email)"
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_identities_identity_id', table_name='identities')
+    op.drop_table('identities')
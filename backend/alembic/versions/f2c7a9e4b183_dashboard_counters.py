@@ -0,0 +1,64 @@
+"""Dashboard counters rollup
+
+Revision ID: f2c7a9e4b183
+Revises: e8b4c6d2a917
+Create Date: 2025-09-29 10:05:12.441870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a9e4b183'
+down_revision = 'e8b4c6d2a917'
+branch_labels = None
+depends_on = None
+
+
+# counter column -> (table, extra WHERE clause)
+COUNTERS = {
+    'users_total': ('users', None),
+    'doctors_total': ('doctors', None),
+    'doctors_pending': ('doctors', "status = 'PENDING'"),
+    'doctors_approved': ('doctors', "status = 'APPROVED'"),
+    'doctors_rejected': ('doctors', "status = 'REJECTED'"),
+    'doctors_suspended': ('doctors', "status = 'SUSPENDED'"),
+    'hospitals_total': ('hospitals', None),
+    'hospitals_pending': ('hospitals', "status = 'PENDING'"),
+    'hospitals_approved': ('hospitals', "status = 'APPROVED'"),
+    'hospitals_rejected': ('hospitals', "status = 'REJECTED'"),
+    'appointments_total': ('appointments', None),
+    'appointments_requested': ('appointments', "status = 'REQUESTED'"),
+    'appointments_confirmed': ('appointments', "status = 'CONFIRMED'"),
+    'appointments_cancelled': ('appointments', "status = 'CANCELLED'"),
+    'appointments_completed': ('appointments', "status = 'COMPLETED'"),
+    'appointments_no_show': ('appointments', "status = 'NO_SHOW'"),
+    'appointments_in_person': ('appointments', "appointment_type = 'IN_PERSON'"),
+    'appointments_video': ('appointments', "appointment_type = 'VIDEO'"),
+    'prescriptions_total': ('prescriptions', None),
+}
+
+
+def upgrade() -> None:
+    op.create_table('dashboard_counters',
+    sa.Column('counter_id', sa.Integer(), nullable=False),
+    *[sa.Column(name, sa.Integer(), nullable=False) for name in COUNTERS],
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('counter_id')
+    )
+
+    # Seed the single row from the current tables
+    counts = ", ".join(
+        f"(SELECT COUNT(*) FROM {table}{' WHERE ' + where if where else ''})"
+        for table, where in COUNTERS.values()
+    )
+    op.execute(
+        f"INSERT INTO dashboard_counters (counter_id, {', '.join(COUNTERS)}, reconciled_at, updated_at) "
+        f"SELECT 1, {counts}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('dashboard_counters')
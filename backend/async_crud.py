@@ -0,0 +1,81 @@
+# Coroutine versions of the crud.py reads used by the hot endpoints
+# (appointments, doctor/hospital directory, auth lookups). Writes stay in
+# crud.py so the derived indexes and caches keep a single update path.
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+import models
+from pagination import encode_cursor, decode_cursor
+
+
+# -----------------------------
+# Pagination
+# -----------------------------
+async def paginate(db: AsyncSession, stmt, key_column, skip: int = 0, limit: int = 100, cursor: str = None):
+    """Async counterpart of crud.paginate; returns (items, next_cursor)"""
+    stmt = stmt.order_by(key_column)
+    if cursor:
+        stmt = stmt.where(key_column > decode_cursor(cursor))
+    elif skip:
+        stmt = stmt.offset(skip)
+    items = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(getattr(items[-1], key_column.key))
+
+
+async def _first(db: AsyncSession, stmt):
+    return (await db.execute(stmt.limit(1))).scalars().first()
+
+
+# -----------------------------
+# Users / auth lookups
+# -----------------------------
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await _first(db, select(models.User).where(models.User.email == email))
+
+async def get_doctor_by_email(db: AsyncSession, email: str):
+    return await _first(db, select(models.Doctor).where(models.Doctor.email == email))
+
+async def get_admin_by_email(db: AsyncSession, email: str):
+    return await _first(db, select(models.Admin).where(models.Admin.email == email))
+
+async def get_identity_by_email(db: AsyncSession, email: str):
+    return await _first(db, select(models.Identity).where(models.Identity.email == email))
+
+async def get_principal(db: AsyncSession, role: models.UserRole, principal_id: int):
+    model, _ = models.PRINCIPALS[models.UserRole(role)]
+    return await db.get(model, principal_id)
+
+
+# -----------------------------
+# Doctors / hospitals
+# -----------------------------
+async def get_doctor(db: AsyncSession, doctor_id: int):
+    return await db.get(models.Doctor, doctor_id)
+
+async def get_approved_doctors(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: str = None):
+    stmt = select(models.Doctor).where(models.Doctor.status == models.DoctorStatus.APPROVED)
+    return await paginate(db, stmt, models.Doctor.doctor_id, skip, limit, cursor)
+
+async def get_hospital(db: AsyncSession, hospital_id: int):
+    return await db.get(models.Hospital, hospital_id)
+
+async def get_approved_hospitals(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: str = None):
+    stmt = select(models.Hospital).where(models.Hospital.status == models.HospitalStatus.APPROVED)
+    return await paginate(db, stmt, models.Hospital.hospital_id, skip, limit, cursor)
+
+
+# -----------------------------
+# Appointments
+# -----------------------------
+async def get_appointments_with_users(db: AsyncSession, user_id: int = None, doctor_id: int = None):
+    """Appointments with their patient eager-loaded in the same query"""
+    stmt = select(models.Appointment).options(joinedload(models.Appointment.user))
+    if user_id is not None:
+        stmt = stmt.where(models.Appointment.user_id == user_id)
+    if doctor_id is not None:
+        stmt = stmt.where(models.Appointment.doctor_id == doctor_id)
+    return (await db.execute(stmt)).scalars().all()
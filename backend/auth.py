@@ -1,12 +1,15 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-import crud, schemas
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+import async_crud, models, schemas
+from database import get_async_db
+from cache import principal_cache
 import os
 from dotenv import load_dotenv
 
@@ -17,6 +20,7 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+LOGIN_WORKERS = int(os.getenv("LOGIN_WORKERS", str(min(4, os.cpu_count() or 1))))
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -35,12 +39,28 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+# bcrypt is deliberately slow, so credential checks run on a small dedicated
+# pool instead of the event loop. Extra logins queue here rather than
+# starving the rest of the API.
+login_executor = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="login")
+
+async def run_in_login_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(login_executor, func, *args)
+
+
 # -------------------------
 # JWT utils
 # -------------------------
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create JWT with role/email, and doctor_id if doctor"""
+def token_subject(role: models.UserRole, principal_id: int) -> str:
+    return f"{models.UserRole(role).value}:{principal_id}"
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, principal_id: Optional[int] = None):
+    """Create JWT with role/email, plus sub = "ROLE:id" when principal_id is given"""
     to_encode = data.copy()
+    if principal_id is not None:
+        to_encode["sub"] = token_subject(data["role"], principal_id)
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -62,60 +82,99 @@ def decode_token(token: str):
 # -------------------------
 # Current user getters
 # -------------------------
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def invalidate_principal(role: models.UserRole, principal_id: int):
+    """Drop a cached account after it changes"""
+    principal_cache.invalidate(token_subject(role, principal_id))
+
+
+def principal_snapshot(role: models.UserRole, account) -> schemas.Principal:
+    """What the auth getters need of an account row, detached from its session"""
+    _, key = models.PRINCIPALS[models.UserRole(role)]
+    return schemas.Principal(
+        role=role,
+        principal_id=getattr(account, key),
+        email=account.email,
+        # only patients are verified; doctors and admins are vetted on their own
+        is_active=bool(getattr(account, "is_verified", True)),
+    )
+
+
+async def resolve_principal(db: AsyncSession, payload: dict) -> Optional[schemas.Principal]:
+    """
+    The account a token belongs to. Tokens carry sub = "ROLE:id" and are
+    served from the principal cache, falling back to a primary key lookup;
+    older tokens without it go through the identities table by email.
+    """
+    subject = payload.get("sub")
+    if subject:
+        role, _, principal_id = subject.partition(":")
+        if role != payload.get("role") or not principal_id.isdigit():
+            raise HTTPException(status_code=401, detail="Invalid token")
+        principal = principal_cache.get((subject,))
+        if principal is not None:
+            return principal
+        generation = principal_cache.generation(subject)
+        try:
+            account = await async_crud.get_principal(db, role, int(principal_id))
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        if account is None:
+            return None
+        principal = principal_snapshot(role, account)
+        principal_cache.set((subject,), principal, generation=generation)
+        return principal
+    email = payload.get("email")
+    if not email:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    identity = await async_crud.get_identity_by_email(db, email)
+    if not identity or identity.role != payload.get("role"):
+        return None
+    account = await async_crud.get_principal(db, identity.role, identity.principal_id)
+    return principal_snapshot(identity.role, account) if account is not None else None
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     payload = decode_token(token)
-    email: str = payload.get("email")
     role: str = payload.get("role")
 
-    if not email or not role:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Fetch entity by role
-    if role == schemas.UserRole.USER:
-        user = crud.get_user_by_email(db, email=email)
-    elif role == schemas.UserRole.DOCTOR:
-        user = crud.get_doctor_by_email(db, email=email)
-    elif role == schemas.UserRole.ADMIN:
-        user = crud.get_admin_by_email(db, email=email)
-    else:
+    if role not in {r.value for r in schemas.UserRole}:
         raise HTTPException(status_code=401, detail="Invalid role")
 
+    user = await resolve_principal(db, payload)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     return user
 
 
-async def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: schemas.Principal = Depends(get_current_user)):
     """Check active/verified users"""
-    if hasattr(current_user, "is_verified") and not current_user.is_verified:
+    if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-async def get_current_doctor(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_doctor(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     payload = decode_token(token)
-    email: str = payload.get("email")
     role: str = payload.get("role")
 
-    if not email or role != schemas.UserRole.DOCTOR:
+    if role != schemas.UserRole.DOCTOR:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    doctor = crud.get_doctor_by_email(db, email=email)
+    doctor = await resolve_principal(db, payload)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
 
 
-async def get_current_admin(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_admin(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     payload = decode_token(token)
-    email: str = payload.get("email")
     role: str = payload.get("role")
 
-    if not email or role != schemas.UserRole.ADMIN:
+    if role != schemas.UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    admin = crud.get_admin_by_email(db, email=email)
+    admin = await resolve_principal(db, payload)
     if not admin:
         raise HTTPException(status_code=404, detail="Admin not found")
     return admin
@@ -126,7 +185,7 @@ async def get_current_admin(token: str = Depends(oauth2_scheme), db: Session = D
 # -------------------------
 def require_role(required_role: schemas.UserRole):
     async def role_checker(current_user=Depends(get_current_user)):
-        if getattr(current_user, "role", None) != required_role:
+        if current_user.role != required_role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Requires {required_role} role"
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Compare the latency of the async-session endpoints with their sync versions.
+
+Seeds --doctors approved doctors, --hospitals approved hospitals and
+--appointments appointments in the database in DATABASE_URL (use a scratch
+database), then serves each endpoint that moved to AsyncSession twice from
+a bench app: once as a plain def with a sync Session, run on the
+threadpool, and once as a coroutine with an AsyncSession. A third
+version goes through main.run_read, which picks one of the two by
+database (the sync session on SQLite). Each gets --requests requests,
+--concurrency at a time, and the p50/p99 of each are printed side by
+side. The directory cache is left out so every request reaches the
+database.
+
+    DATABASE_URL=sqlite:///./async_sessions.db python benchmark_async_sessions.py --concurrency 100
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+def seed(doctors: int, hospitals: int, appointments: int):
+    """Approved doctors and hospitals, and appointments spread over patients and doctors"""
+    import models
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    stamp = datetime.now().timestamp()
+    with SessionLocal() as db:
+        db.add_all([models.Hospital(name=f"Bench Hospital {i}", address=f"{i} Bench Road", location_lat=12.9 + i / 1000,
+                                    location_long=77.6, contact_number=f"080{i:07d}",
+                                    status=models.HospitalStatus.APPROVED)
+                    for i in range(hospitals)])
+        doctor_rows = [models.Doctor(name=f"Bench Doctor {i}", email=f"bench-doctor-{stamp}-{i}@example.com",
+                                     password_hash="-", specialization="Cardiologist", license_number=f"L-{i}",
+                                     experience_years=5, consultation_fee=500,
+                                     status=models.DoctorStatus.APPROVED)
+                       for i in range(doctors)]
+        patients = [models.User(name=f"Bench Patient {i}", email=f"bench-patient-{stamp}-{i}@example.com",
+                                password_hash="-")
+                    for i in range(max(1, appointments // 10))]
+        db.add_all(doctor_rows + patients)
+        db.flush()
+        db.add_all([
+            models.Appointment(user_id=random.choice(patients).user_id, doctor_id=random.choice(doctor_rows).doctor_id,
+                               appointment_type=models.AppointmentType.VIDEO,
+                               appointment_time=datetime.now() + timedelta(days=1, minutes=i))
+            for i in range(appointments)
+        ])
+        db.commit()
+        return ([doctor.doctor_id for doctor in doctor_rows], [patient.user_id for patient in patients])
+
+
+def bench_app():
+    """Each converted endpoint under /sync and /async, without auth or the directory cache"""
+    from fastapi import Depends, FastAPI
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    import async_crud
+    import crud
+    from database import get_async_db, get_db
+    from main import appointment_to_schema, doctor_list_adapter, hospital_list_adapter, run_read
+    import schemas
+
+    bench = FastAPI()
+
+    @bench.get("/sync/doctors/")
+    def sync_doctors(db: Session = Depends(get_db)):
+        doctors, _ = crud.get_approved_doctors(db, 0, 100)
+        return doctor_list_adapter.validate_python(doctors, from_attributes=True)
+
+    @bench.get("/async/doctors/")
+    async def async_doctors(db: AsyncSession = Depends(get_async_db)):
+        doctors, _ = await async_crud.get_approved_doctors(db, 0, 100)
+        return doctor_list_adapter.validate_python(doctors, from_attributes=True)
+
+    @bench.get("/sync/doctors/{doctor_id}")
+    def sync_doctor(doctor_id: int, db: Session = Depends(get_db)):
+        return schemas.Doctor.model_validate(crud.get_doctor(db, doctor_id))
+
+    @bench.get("/async/doctors/{doctor_id}")
+    async def async_doctor(doctor_id: int, db: AsyncSession = Depends(get_async_db)):
+        return schemas.Doctor.model_validate(await async_crud.get_doctor(db, doctor_id))
+
+    @bench.get("/sync/hospitals/")
+    def sync_hospitals(db: Session = Depends(get_db)):
+        hospitals, _ = crud.get_approved_hospitals(db, 0, 100)
+        return hospital_list_adapter.validate_python(hospitals, from_attributes=True)
+
+    @bench.get("/async/hospitals/")
+    async def async_hospitals(db: AsyncSession = Depends(get_async_db)):
+        hospitals, _ = await async_crud.get_approved_hospitals(db, 0, 100)
+        return hospital_list_adapter.validate_python(hospitals, from_attributes=True)
+
+    @bench.get("/sync/appointments")
+    def sync_appointments(user_id: int, db: Session = Depends(get_db)):
+        return [appointment_to_schema(a) for a in crud.get_appointments_with_users(db, user_id=user_id)]
+
+    @bench.get("/async/appointments")
+    async def async_appointments(user_id: int, db: AsyncSession = Depends(get_async_db)):
+        return [appointment_to_schema(a) for a in await async_crud.get_appointments_with_users(db, user_id=user_id)]
+
+    @bench.get("/served/doctors/")
+    async def served_doctors():
+        return await run_read(crud.get_approved_doctors, async_crud.get_approved_doctors,
+                              lambda page: doctor_list_adapter.validate_python(page[0], from_attributes=True), 0, 100)
+
+    @bench.get("/served/doctors/{doctor_id}")
+    async def served_doctor(doctor_id: int):
+        return await run_read(crud.get_doctor, async_crud.get_doctor, schemas.Doctor.model_validate, doctor_id)
+
+    @bench.get("/served/hospitals/")
+    async def served_hospitals():
+        return await run_read(crud.get_approved_hospitals, async_crud.get_approved_hospitals,
+                              lambda page: hospital_list_adapter.validate_python(page[0], from_attributes=True), 0, 100)
+
+    @bench.get("/served/appointments")
+    async def served_appointments(user_id: int):
+        return await run_read(crud.get_appointments_with_users, async_crud.get_appointments_with_users,
+                              lambda appointments: [appointment_to_schema(a) for a in appointments], user_id)
+
+    return bench
+
+
+async def load(client, paths, requests: int, concurrency: int):
+    """Latencies (ms) of requests GETs of random paths, concurrency at a time, and the statuses seen"""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, statuses = [], set()
+
+    async def get():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(random.choice(paths))
+            samples.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(get() for _ in range(requests)))
+    return samples, statuses, time.perf_counter() - started
+
+
+def summary(samples, elapsed: float):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return (f"p50={statistics.median(samples):6.1f}ms p99={p99:6.1f}ms max={samples[-1]:6.1f}ms "
+            f"{len(samples) / elapsed:6.0f} req/s")
+
+
+async def run(args) -> int:
+    import httpx
+
+    doctor_ids, patient_ids = seed(args.doctors, args.hospitals, args.appointments)
+    endpoints = {
+        "GET /doctors/": ["/doctors/"],
+        "GET /doctors/{id}": [f"/doctors/{doctor_id}" for doctor_id in doctor_ids],
+        "GET /hospitals/": ["/hospitals/"],
+        "GET /appointments": [f"/appointments?user_id={user_id}" for user_id in patient_ids],
+    }
+    failed = False
+    transport = httpx.ASGITransport(app=bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{args.requests} requests per endpoint and path, {args.concurrency} at a time")
+        for name, paths in endpoints.items():
+            for path in ("sync", "async", "served"):
+                prefixed = [f"/{path}{p}" for p in paths]
+                await load(client, prefixed, args.concurrency, args.concurrency)  # warm up the pools
+                samples, statuses, elapsed = await load(client, prefixed, args.requests, args.concurrency)
+                failed |= statuses != {200}
+                print(f"{name:20} {path:6}  {summary(samples, elapsed)}  statuses {sorted(statuses)}")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--hospitals", type=int, default=100)
+    parser.add_argument("--appointments", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Time the admin dashboard endpoints against a large appointments table.
+
+Seeds the database in DATABASE_URL with --appointments synthetic rows (use a
+scratch database) unless --no-seed is given, then calls each dashboard
+endpoint --repeat times and prints the median and worst latency.
+
+    DATABASE_URL=sqlite:///./bench.db python benchmark_dashboard.py --appointments 1000000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi import Response
+from sqlalchemy import insert
+
+import models
+from database import SessionLocal, engine
+import activity
+import dashboard_api
+import dashboard_counters
+
+BATCH = 50_000
+
+
+def seed(appointments: int, users: int = 10_000, doctors: int = 1_000, hospitals: int = 100):
+    """Bulk-insert synthetic rows; ids are assigned by the database"""
+    rng = random.Random(42)
+    now = datetime.now()
+    statuses = list(models.AppointmentStatus)
+    types = list(models.AppointmentType)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Hospital), [
+            {"name": f"Hospital {i}", "address": "-", "location_lat": 0.0, "location_long": 0.0,
+             "contact_number": "-", "status": rng.choice(list(models.HospitalStatus))}
+            for i in range(hospitals)
+        ])
+        conn.execute(insert(models.Doctor), [
+            {"name": f"Doctor {i}", "email": f"bench-doctor-{i}@example.com", "password_hash": "-",
+             "specialization": "General Physician", "license_number": "-",
+             "status": rng.choice(list(models.DoctorStatus)), "created_at": now - timedelta(days=rng.randint(0, 365))}
+            for i in range(doctors)
+        ])
+        conn.execute(insert(models.User), [
+            {"name": f"User {i}", "email": f"bench-user-{i}@example.com", "password_hash": "-",
+             "created_at": now - timedelta(days=rng.randint(0, 365))}
+            for i in range(users)
+        ])
+        for offset in range(0, appointments, BATCH):
+            conn.execute(insert(models.Appointment), [
+                {"user_id": rng.randint(1, users), "doctor_id": rng.randint(1, doctors),
+                 "hospital_id": rng.randint(1, hospitals), "appointment_type": rng.choice(types),
+                 "status": rng.choice(statuses), "duration": 30,
+                 "appointment_time": now + timedelta(minutes=rng.randint(-525_600, 525_600)),
+                 "created_at": now - timedelta(minutes=rng.randint(0, 525_600))}
+                for _ in range(min(BATCH, appointments - offset))
+            ])
+
+
+def timed(name: str, call, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            call(db)
+            samples.append((time.perf_counter() - started) * 1000)
+    print(f"{name:<24} median={statistics.median(samples):8.1f}ms  max={max(samples):8.1f}ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(args.appointments)
+        print(f"seeded {args.appointments} appointments in {time.perf_counter() - started:.1f}s")
+
+    # Bulk inserts bypass the ORM, so the counters need a full recount
+    started = time.perf_counter()
+    dashboard_counters.reconcile_in_new_session()
+    print(f"reconciled dashboard counters in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    activity.backfill_if_empty()
+    print(f"seeded activity log in {time.perf_counter() - started:.1f}s")
+
+    admin = None  # the endpoints only use it for authorization
+    timed("stats", lambda db: dashboard_api.get_dashboard_stats(db=db, current_admin=admin), args.repeat)
+    timed("appointments-overview", lambda db: dashboard_api.get_appointments_overview(db=db, current_admin=admin), args.repeat)
+    timed("recent-activity", lambda db: dashboard_api.get_recent_activity(response=Response(), limit=10, db=db, current_admin=admin), args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
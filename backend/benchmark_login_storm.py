@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Measure how a burst of logins affects the latency of other endpoints.
+
+Runs the app in-process against the database in DATABASE_URL, samples
+GET /health and GET /hospitals/ on their own, then again while POST /token
+is hammered with concurrent logins. With credential checks off the event
+loop the two sets of numbers should stay close.
+
+    python benchmark_login_storm.py --email user@example.com --password secret
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from main import app
+
+PROBE_PATHS = ("/health", "/hospitals/")
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, interval: float):
+    """Latencies (ms) of the probe endpoints until stop is set"""
+    samples = []
+    while not stop.is_set():
+        for path in PROBE_PATHS:
+            started = time.perf_counter()
+            await client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def login_storm(client: httpx.AsyncClient, email: str, password: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = []
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/token", data={"username": email, "password": password})
+            statuses.append(response.status_code)
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses
+
+
+def summary(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"n={len(samples)} p50={statistics.median(samples):.1f}ms p95={p95:.1f}ms max={samples[-1]:.1f}ms"
+
+
+async def run(args) -> int:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        baseline = asyncio.create_task(probe(client, stop, args.interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        quiet = await baseline
+
+        stop = asyncio.Event()
+        during = asyncio.create_task(probe(client, stop, args.interval))
+        started = time.perf_counter()
+        statuses = await login_storm(client, args.email, args.password, args.logins, args.concurrency)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        storm = await during
+
+    print(f"logins: {len(statuses)} in {elapsed:.2f}s ({len(statuses) / elapsed:.1f}/s), "
+          f"statuses {sorted(set(statuses))}")
+    print(f"probe latency, idle:        {summary(quiet)}")
+    print(f"probe latency, login storm: {summary(storm)}")
+    return 0 if statuses and all(code == 200 for code in statuses) else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01, help="pause between probe rounds (s)")
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
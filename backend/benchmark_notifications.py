@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare notification throughput: blocking sends one after another, the
+async senders (pooled keep-alive connections, all channels in parallel), and
+the async senders through the services' batch endpoints.
+
+Starts a local HTTP sink standing in for the email, SMS and push services
+and their batch endpoints (see benchmark_reminders.py), then delivers
+--recipients x 3 messages each way and prints messages per second and the
+peak concurrency each service saw.
+
+    python benchmark_notifications.py --recipients 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from benchmark_reminders import Sink, start_sink
+
+
+def messages(recipients: int):
+    import notifications
+    for i in range(recipients):
+        yield notifications.email_message(f"patient{i}@example.com", "Appointment Reminder", "reminder", {"n": i})
+        yield notifications.sms_message(f"555{i:07d}", f"Reminder {i}")
+        yield notifications.push_message(i, "Appointment Reminder", f"Reminder {i}", {"appointment_id": i})
+
+
+def blocking(recipients: int) -> int:
+    import notifications
+    send = {
+        "email": notifications.send_email,
+        "sms": notifications.send_sms,
+        "push": notifications.send_push_notification,
+    }
+    return sum(send[channel](**arguments) for channel, arguments in messages(recipients))
+
+
+async def fan_out(recipients: int, batch_urls: dict) -> int:
+    import notifications
+    notifications.BATCH_URLS.update(batch_urls)
+    try:
+        return sum(await notifications.send_all(*messages(recipients)))
+    finally:
+        await notifications.close_providers()
+
+
+def timed(name: str, run, total: int):
+    Sink.peak_in_flight.clear()
+    started = time.perf_counter()
+    delivered = run()
+    elapsed = time.perf_counter() - started
+    peaks = ", ".join(f"{path} {peak}" for path, peak in sorted(Sink.peak_in_flight.items()))
+    print(f"{name:<10} {delivered}/{total} delivered in {elapsed:6.2f}s = {total / elapsed:8.1f} msg/s  (peak in flight: {peaks})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="sink delay per request (s)")
+    parser.add_argument("--concurrency", type=int, default=20, help="per-channel limit of the async senders")
+    parser.add_argument("--batch-size", type=int, default=100, help="messages per batch request")
+    args = parser.parse_args()
+
+    server = start_sink(args.latency, 0.0)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    for channel in ("EMAIL", "SMS", "PUSH"):
+        os.environ[f"{channel}_CONCURRENCY"] = str(args.concurrency)
+    os.environ["NOTIFICATION_BATCH_SIZE"] = str(args.batch_size)
+    total = args.recipients * 3
+
+    timed("blocking", lambda: blocking(args.recipients), total)
+    unbatched = {channel: None for channel in ("email", "sms", "push")}
+    batched = {channel: f"{base}/{channel}/batch" for channel in ("email", "sms", "push")}
+    timed("async", lambda: asyncio.run(fan_out(args.recipients, unbatched)), total)
+    timed("batched", lambda: asyncio.run(fan_out(args.recipients, batched)), total)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Time POST /appointments/send-reminders and the job queue that delivers them.
+
+Starts a local HTTP sink that stands in for the email, SMS and push
+services (with --latency per request and --failure-rate of 500 answers, or
+with --batch of rejected messages on their batch endpoints),
+seeds --appointments confirmed appointments in the database in DATABASE_URL
+(use a scratch database), then calls the endpoint and waits until the job
+workers have drained the queue.
+
+    DATABASE_URL=sqlite:///./reminders.db python benchmark_reminders.py --appointments 300 --latency 0.2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Sink(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real provider
+    latency = 0.0
+    failure_rate = 0.0
+    received = Counter()
+    in_flight = Counter()
+    peak_in_flight = Counter()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.endswith("/batch"):
+            return self.batch(json.loads(body)["messages"])
+        with self.lock:
+            self.in_flight[self.path] += 1
+            self.peak_in_flight[self.path] = max(self.peak_in_flight[self.path], self.in_flight[self.path])
+        time.sleep(self.latency)
+        failed = random.random() < self.failure_rate
+        with self.lock:
+            self.in_flight[self.path] -= 1
+            self.received[(self.path, "failed" if failed else "ok")] += 1
+        self.send_response(500 if failed else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def batch(self, messages):
+        """One round trip for the whole batch; failures are per message"""
+        path = self.path[:-len("/batch")]
+        with self.lock:
+            self.in_flight[self.path] += 1
+            self.peak_in_flight[self.path] = max(self.peak_in_flight[self.path], self.in_flight[self.path])
+        time.sleep(self.latency)
+        results = [{"ok": random.random() >= self.failure_rate} for _ in messages]
+        with self.lock:
+            self.in_flight[self.path] -= 1
+            for result in results:
+                self.received[(path, "ok" if result["ok"] else "failed")] += 1
+            self.received[(self.path, "requests")] += 1
+        body = json.dumps({"results": [r if r["ok"] else {**r, "error": "rejected"} for r in results]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SinkServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the default backlog of 5 resets concurrent clients
+
+
+def start_sink(latency: float, failure_rate: float, batch: bool = False) -> ThreadingHTTPServer:
+    Sink.latency, Sink.failure_rate = latency, failure_rate
+    server = SinkServer(("127.0.0.1", 0), Sink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    # Read by notifications.py at import time
+    os.environ["EMAIL_SERVICE_URL"] = f"{base}/email"
+    os.environ["SMS_SERVICE_URL"] = f"{base}/sms"
+    os.environ["PUSH_SERVICE_URL"] = f"{base}/push"
+    if batch:
+        os.environ["EMAIL_BATCH_URL"] = f"{base}/email/batch"
+        os.environ["SMS_BATCH_URL"] = f"{base}/sms/batch"
+        os.environ["PUSH_BATCH_URL"] = f"{base}/push/batch"
+    return server
+
+
+def seed(appointments: int):
+    import auth, crud, models, schemas
+    from database import SessionLocal
+
+    now = datetime.now()
+    with SessionLocal() as db:
+        if crud.get_identity_by_email(db, "bench-admin@example.com") is None:
+            crud.create_admin(db, schemas.AdminCreate(name="Bench Admin", email="bench-admin@example.com", password="bench"))
+        user = models.User(name="Bench Patient", email=f"bench-patient-{now.timestamp()}@example.com",
+                           phone="5550100", password_hash="-")
+        doctor = models.Doctor(name="Bench Doctor", email=f"bench-doctor-{now.timestamp()}@example.com",
+                               password_hash="-", status=models.DoctorStatus.APPROVED)
+        db.add_all([user, doctor])
+        db.flush()
+        db.add_all([
+            models.Appointment(user_id=user.user_id, doctor_id=doctor.doctor_id,
+                               appointment_type=models.AppointmentType.VIDEO,
+                               status=models.AppointmentStatus.CONFIRMED,
+                               appointment_time=now + timedelta(minutes=30 + i % 600))
+            for i in range(appointments)
+        ])
+        db.commit()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.2, help="sink delay per request (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="share of sink requests answered with 500")
+    parser.add_argument("--batch", action="store_true", help="deliver through the services' batch endpoints")
+    parser.add_argument("--timeout", type=float, default=300, help="give up waiting for the queue after (s)")
+    args = parser.parse_args()
+
+    start_sink(args.latency, args.failure_rate, args.batch)
+    # Retry quickly so the run finishes in reasonable time
+    os.environ.setdefault("JOB_RETRY_DELAY", "0.5")
+    os.environ.setdefault("JOB_POLL_INTERVAL", "0.2")
+
+    from fastapi.testclient import TestClient
+    import models
+    from database import engine
+    from main import app
+
+    models.Base.metadata.create_all(bind=engine)
+    seed(args.appointments)
+
+    with TestClient(app) as client:  # runs the startup hooks, which start the job workers
+        token = client.post("/token", data={"username": "bench-admin@example.com", "password": "bench"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        started = time.perf_counter()
+        response = client.post("/appointments/send-reminders", params={"hours_before": 24}, headers=headers)
+        elapsed = time.perf_counter() - started
+        queued = sum(len(result.get("job_ids", [])) for result in response.json()["results"])
+        print(f"send-reminders: HTTP {response.status_code} in {elapsed * 1000:.0f}ms, {queued} jobs queued")
+
+        started = time.perf_counter()
+        while True:
+            counts = client.get("/admin/dashboard/jobs", headers=headers).json()["by_status"]
+            if counts["QUEUED"] + counts["RUNNING"] == 0 or time.perf_counter() - started > args.timeout:
+                break
+            time.sleep(0.5)
+        print(f"queue drained in {time.perf_counter() - started:.1f}s: {counts}")
+
+    for (path, outcome), count in sorted(Sink.received.items()):
+        print(f"  sink {path:<13} {outcome:<8} {count}")
+    return 0 if counts["QUEUED"] + counts["RUNNING"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Time free-slot lookups over long windows across many doctors.
+
+Seeds --doctors approved doctors in the database in DATABASE_URL (use a
+scratch database), each with weekday rules, a few days off and
+--appointments booked appointments spread over the next --days days. Then
+times scheduling.free_slots for each doctor over the whole window (what
+GET /doctors/{id}/slots does at its maximum range) and
+scheduling.next_free_slot across all of them at once (what telephony
+booking does), and prints the p50/p99 of each. Exits non-zero when the
+single-doctor p99 is above --max-ms.
+
+    DATABASE_URL=sqlite:///./slots.db python benchmark_slots.py --doctors 300
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, time as clock, timedelta, timezone
+
+
+def seed(doctors: int, appointments: int, days: int):
+    """Doctors working mon-fri 09:00-17:00 with some days off and booked appointments"""
+    import models
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    stamp = datetime.now().timestamp()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    with SessionLocal() as db:
+        doctor_rows = [models.Doctor(name=f"Bench Doctor {i}", email=f"bench-doctor-{stamp}-{i}@example.com",
+                                     password_hash="-", specialization="Cardiologist", license_number=f"L-{i}",
+                                     experience_years=5, consultation_fee=500,
+                                     status=models.DoctorStatus.APPROVED)
+                       for i in range(doctors)]
+        patient = models.User(name="Bench Patient", email=f"bench-patient-{stamp}@example.com", password_hash="-")
+        db.add_all(doctor_rows + [patient])
+        db.flush()
+        for doctor in doctor_rows:
+            db.add_all([models.DoctorAvailabilityRule(doctor_id=doctor.doctor_id, weekday=weekday,
+                                                      start_time=clock(9), end_time=clock(17), slot_minutes=30)
+                        for weekday in range(5)])
+            db.add_all([models.DoctorAvailabilityException(doctor_id=doctor.doctor_id,
+                                                           day=(today + timedelta(days=random.randrange(days))).date(),
+                                                           is_available=False, reason="leave")
+                        for _ in range(3)])
+            db.add_all([models.Appointment(user_id=patient.user_id, doctor_id=doctor.doctor_id,
+                                           appointment_type=models.AppointmentType.VIDEO,
+                                           appointment_time=today + timedelta(days=random.randrange(days), hours=9,
+                                                                              minutes=30 * random.randrange(16)),
+                                           duration=30)
+                        for _ in range(appointments)])
+        db.commit()
+        return [doctor.doctor_id for doctor in doctor_rows]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def summary(samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50={statistics.median(samples):7.2f}ms p99={p99:7.2f}ms max={samples[-1]:7.2f}ms"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--appointments", type=int, default=200, help="per doctor")
+    parser.add_argument("--days", type=int, default=None, help="window length (default MAX_WINDOW_DAYS)")
+    parser.add_argument("--max-ms", type=float, default=50.0, help="allowed single-doctor p99")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    from database import SessionLocal
+    from scheduling import MAX_WINDOW_DAYS, free_slots, next_free_slot
+
+    days = args.days or MAX_WINDOW_DAYS
+    doctor_ids = seed(args.doctors, args.appointments, days)
+    start = datetime.now()
+    end = start + timedelta(days=days)
+
+    with SessionLocal() as db:
+        single, counts = [], []
+        for doctor_id in doctor_ids:
+            elapsed, slots = timed(free_slots, db, doctor_id, start, end)
+            single.append(elapsed)
+            counts.append(len(slots))
+        # An aware window must give the same slots as the naive local one
+        aware = free_slots(db, doctor_ids[0], start.astimezone(timezone.utc), end.astimezone(timezone.utc))
+        consistent = aware == free_slots(db, doctor_ids[0], start, end)
+        across = [timed(next_free_slot, db, doctor_ids, start)[0] for _ in range(20)]
+        window = [timed(free_slots, db, doctor_ids[0], start, end)[0] for _ in range(20)]
+
+    print(f"{args.doctors} doctors, {args.appointments} appointments each, {days}-day window, "
+          f"{statistics.mean(counts):.0f} free slots per doctor")
+    print(f"free_slots per doctor       {summary(single)}")
+    print(f"free_slots, repeated        {summary(window)}")
+    print(f"next_free_slot, all doctors {summary(across)}")
+    print(f"aware window matches naive: {consistent}")
+    p99 = sorted(single)[min(len(single) - 1, int(len(single) * 0.99))]
+    return 0 if consistent and p99 <= args.max_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Measure concurrent SQLite writers with and without the in-process write lock.
+
+Runs --writers threads against the database in DATABASE_URL (use a scratch
+SQLite database), each doing --transactions rounds of an ORM write (queue a
+job) followed by a core UPDATE (claim a job), the two kinds of write the
+app does. The rounds run once with the write lock listeners removed,
+leaving SQLite's busy_timeout to sort the writers out, and once with them
+in place. Prints throughput and the "database is locked" and lock timeout
+errors of each run. Lower SQLITE_BUSY_TIMEOUT_MS to see how the unlocked
+writers fare once their waits outlast it.
+
+    DATABASE_URL=sqlite:///./writers.db python benchmark_sqlite_writers.py --writers 16
+    SQLITE_BUSY_TIMEOUT_MS=100 DATABASE_URL=sqlite:///./writers.db python benchmark_sqlite_writers.py --writers 32
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def writer(transactions: int, errors: Counter, done: Counter, lock: threading.Lock):
+    import jobs
+    from database import SessionLocal
+    from sqlalchemy.exc import OperationalError
+
+    for i in range(transactions):
+        try:
+            with SessionLocal() as db:
+                jobs.enqueue(db, ("benchmark", {"round": i}))
+                db.commit()
+                jobs.claim(db, 1)
+            outcome = None
+        except OperationalError as e:
+            outcome = "database is locked" if "locked" in str(e) else type(e).__name__
+        except TimeoutError:
+            outcome = "write lock timeout"
+        with lock:
+            if outcome:
+                errors[outcome] += 1
+            else:
+                done["transactions"] += 1
+
+
+def run(writers: int, transactions: int):
+    errors, done, lock = Counter(), Counter(), threading.Lock()
+    threads = [threading.Thread(target=writer, args=(transactions, errors, done, lock)) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return done["transactions"], errors, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--transactions", type=int, default=100, help="rounds per writer")
+    args = parser.parse_args()
+
+    from sqlalchemy import event
+
+    import database
+    import models
+
+    if not database.is_sqlite:
+        print("DATABASE_URL is not a SQLite database; the write lock only applies to SQLite")
+        return 1
+    models.Base.metadata.create_all(bind=database.engine)
+    listeners = [
+        ("before_flush", database.acquire_write_lock),
+        ("do_orm_execute", database.acquire_write_lock_for_dml),
+        ("after_transaction_end", database.release_write_lock),
+    ]
+
+    print(f"{args.writers} writers x {args.transactions} rounds, "
+          f"busy_timeout={database.SQLITE_PRAGMAS['busy_timeout']}ms")
+    failed = False
+    for label, locked in (("without write lock", False), ("with write lock", True)):
+        for name, listener in listeners:
+            if locked and not event.contains(database.SessionLocal, name, listener):
+                event.listen(database.SessionLocal, name, listener)
+            elif not locked and event.contains(database.SessionLocal, name, listener):
+                event.remove(database.SessionLocal, name, listener)
+        committed, errors, elapsed = run(args.writers, args.transactions)
+        failed |= locked and bool(errors)
+        print(f"{label:20} {committed:6} rounds in {elapsed:6.2f}s ({committed / elapsed:7.1f}/s), "
+              f"errors: {dict(errors) or 'none'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
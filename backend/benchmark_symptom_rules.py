@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Time the keyword rules of analyze_symptoms_fallback as the keyword tables grow.
+
+Extends SYMPTOM_SPECIALIZATION_MAP with --terms made-up keywords, rebuilds
+the matcher, and compares it with scanning every keyword with a substring
+check (the rules before the automaton) on --texts symptom descriptions.
+First checks that the rules still route the inputs in EQUIVALENT_INPUTS,
+compound words among them, as the substring rules did; exits non-zero if
+one differs.
+
+    python benchmark_symptom_rules.py --terms 5000 --texts 2000
+"""
+import argparse
+import random
+import string
+import sys
+import time
+
+
+# Inputs the substring rules got right, which the whole-word rules must agree on
+EQUIVALENT_INPUTS = (
+    "headache", "toothache", "stomachache", "earache", "heartburn",
+    "bad headache since yesterday", "severe toothache", "heartburn after meals",
+    "child with earache", "stomachaches at night", "chest pain", "broken bone",
+    "nosebleed", "frequent nosebleeds", "blurry eyesight", "eyestrain", "swollen eyelid", "red eyeballs",
+    "eardrum pain", "earwax buildup", "torn earlobe", "irregular heartbeat", "racing heartbeats",
+    "broken collarbone", "jawbone pain", "cheekbone fracture", "backbone pain", "bruised tailbone",
+    "shinbone", "hipbone", "breastbone pain",
+)
+
+
+def made_up_terms(count: int, rng: random.Random):
+    terms = set()
+    while len(terms) < count:
+        terms.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10))))
+    return sorted(terms)
+
+
+def substring_scan(text: str, tables) -> int:
+    return sum(1 for table in tables for keyword in table if keyword in text)
+
+
+def substring_rules(text: str):
+    """(specialization, urgency) as the rules before the automaton chose them: the first keyword found in each table"""
+    import ai_symptom_checker as ai
+    import schemas
+
+    specialization = next((spec for keyword, spec in ai.SYMPTOM_SPECIALIZATION_MAP.items() if keyword in text),
+                          "General Physician")
+    urgency = next((level for keyword, level in ai.URGENCY_KEYWORDS.items() if keyword in text),
+                   schemas.UrgencyLevel.MEDIUM)
+    return specialization, urgency
+
+
+def check_equivalence() -> int:
+    """Print how the substring rules and rule_analysis route each input; returns the number that differ"""
+    import ai_symptom_checker as ai
+
+    differences = 0
+    for text in EQUIVALENT_INPUTS:
+        normalized = ai.normalize_symptoms(text)
+        old = substring_rules(normalized)
+        analysis = ai.rule_analysis(normalized)
+        new = analysis["suggested_specialization"], analysis["urgency"]
+        differences += old != new
+        print(f"  [{'ok' if old == new else 'DIFF'}] {text!r}: {new[0]}, {new[1].value}"
+              + ("" if old == new else f" (was {old[0]}, {old[1].value})"))
+    return differences
+
+
+def timed(name: str, run, count: int):
+    started = time.perf_counter()
+    found = run()
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<15} {elapsed * 1000:8.1f}ms = {elapsed / count * 1e6:8.1f}us per text ({found} matches)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--terms", type=int, default=5000, help="keywords added to the specialization map")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    import ai_symptom_checker as ai
+
+    print("equivalence with the substring rules:")
+    if check_equivalence():
+        return 1
+
+    rng = random.Random(args.seed)
+    terms = made_up_terms(args.terms, rng)
+    vocabulary = list(ai.SYMPTOM_SPECIALIZATION_MAP) + list(ai.URGENCY_KEYWORDS) + terms[:200] + [
+        "fever", "cough", "since", "yesterday", "sharp", "left", "side", "tired", "night", "worse",
+    ]
+    texts = [ai.normalize_symptoms(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 30))))
+             for _ in range(args.texts)]
+
+    for label, extra in (("built-in tables", []), (f"+{args.terms} terms", terms)):
+        ai.SYMPTOM_SPECIALIZATION_MAP.update({term: "General Physician" for term in extra})
+        started = time.perf_counter()
+        ai.rebuild_symptom_matcher()
+        built = time.perf_counter() - started
+        tables = (ai.SYMPTOM_SPECIALIZATION_MAP, ai.URGENCY_KEYWORDS)
+        print(f"{label}: {ai.symptom_matcher.size} keywords, matcher built in {built * 1000:.0f}ms")
+        timed("substring scan", lambda: sum(substring_scan(text, tables) for text in texts), len(texts))
+        timed("automaton", lambda: sum(len(ai.symptom_matcher.find(text)) for text in texts), len(texts))
+        timed("rule_analysis", lambda: sum(1 for text in texts if ai.rule_analysis(text)), len(texts))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
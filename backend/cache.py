@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional
+
+from config import settings
+
+# Every cache registers itself here so its counters can be reported
+caches: Dict[str, "TTLCache"] = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ttl seconds.
+    Keys are tuples whose first element is a namespace, so a whole group
+    of entries can be invalidated at once.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._invalidated_at: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] < time.monotonic():
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def generation(self, namespace: str) -> int:
+        """Token to pass to set() so a value built during an invalidation is not stored"""
+        with self._lock:
+            return self._generations[namespace]
+
+    def invalidated_within(self, namespace: str, seconds: float) -> bool:
+        """Whether namespace was invalidated in the last seconds"""
+        with self._lock:
+            invalidated_at = self._invalidated_at.get(namespace)
+            return invalidated_at is not None and time.monotonic() - invalidated_at < seconds
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generations[key[0]]:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate(self, namespace: str):
+        """Drop every entry whose key starts with namespace"""
+        with self._lock:
+            self._generations[namespace] += 1
+            self._invalidated_at[namespace] = time.monotonic()
+            for key in [k for k in self._data if isinstance(k, tuple) and k and k[0] == namespace]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Serialized responses of the public doctor/hospital directory endpoints
+directory_cache = TTLCache(
+    "directory",
+    maxsize=settings.DIRECTORY_CACHE_SIZE,
+    ttl=settings.DIRECTORY_CACHE_TTL,
+)
+
+# Accounts behind access tokens, keyed by (token subject,) so that each
+# principal is its own namespace and can be invalidated on its own
+principal_cache = TTLCache(
+    "principals",
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+)
+
+# Symptom analyses keyed by (source, normalized symptom text), where source
+# is "ai" or "rules"; recommended doctors are not part of the entry
+symptom_cache = TTLCache(
+    "symptoms",
+    maxsize=settings.SYMPTOM_CACHE_SIZE,
+    ttl=settings.SYMPTOM_CACHE_TTL,
+)
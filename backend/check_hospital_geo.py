@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Check HospitalGeoIndex.nearest against a brute-force scan, and its speed.
+
+Indexes --hospitals random hospitals (half spread over the globe, half
+around a few cities, with a share near the poles) and runs --queries random
+queries plus fixed polar ones, comparing every answer with sorting all the
+hospitals by distance. Exits non-zero on a wrong answer or on a query
+slower than --max-ms. Needs no database.
+
+    python check_hospital_geo.py --hospitals 25000 --queries 300
+"""
+import argparse
+import random
+import sys
+import time
+
+import models
+from hospital_geo import HospitalGeoIndex, haversine_km
+
+# (lat, lng) queries where grid cells are narrowest
+POLAR_QUERIES = [(85.0, 10.0), (89.0, -120.0), (89.5, 45.0), (89.95, 179.9), (90.0, 0.0),
+                 (-89.99, -60.0), (-90.0, 180.0), (-85.0, 0.0)]
+
+
+def random_point(rng: random.Random, cities):
+    roll = rng.random()
+    if roll < 0.5:
+        lat, lng = rng.choice(cities)
+        return max(-90.0, min(90.0, lat + rng.gauss(0, 0.5))), (lng + rng.gauss(0, 0.5) + 180) % 360 - 180
+    if roll < 0.55:
+        return rng.choice((1, -1)) * rng.uniform(80, 90), rng.uniform(-180, 180)
+    return rng.uniform(-90, 90), rng.uniform(-180, 180)
+
+
+def brute_force(points, lat, lng, k, radius_km):
+    distances = sorted((haversine_km(lat, lng, *point), hospital_id) for hospital_id, point in points.items())
+    return [(hospital_id, d) for d, hospital_id in distances if radius_km is None or d <= radius_km][:k]
+
+
+def same(answer, expected) -> bool:
+    """Same distances (ids may differ between equally distant hospitals)"""
+    return len(answer) == len(expected) and all(
+        abs(a[1] - e[1]) < 1e-9 for a, e in zip(answer, expected)
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hospitals", type=int, default=25000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--max-ms", type=float, default=500.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cities = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(20)]
+    index = HospitalGeoIndex()
+    index._loaded = True
+    points = {}
+    for hospital_id in range(1, args.hospitals + 1):
+        lat, lng = random_point(rng, cities)
+        points[hospital_id] = (lat, lng)
+        index._add(models.Hospital(hospital_id=hospital_id, location_lat=lat, location_long=lng))
+
+    queries = [(lat, lng, 10, None) for lat, lng in POLAR_QUERIES]
+    queries += [(lat, lng, 10, 25.0) for lat, lng in POLAR_QUERIES]
+    for _ in range(args.queries):
+        lat, lng = random_point(rng, cities)
+        queries.append((lat, lng, rng.randint(1, 20), rng.choice((None, 10.0, 100.0, 1000.0))))
+
+    mismatches, slow, timings = 0, 0, []
+    for lat, lng, k, radius_km in queries:
+        started = time.perf_counter()
+        answer = index.nearest(lat, lng, k=k, radius_km=radius_km)
+        elapsed = (time.perf_counter() - started) * 1000
+        timings.append(elapsed)
+        ok = same(answer, brute_force(points, lat, lng, k, radius_km))
+        mismatches += not ok
+        slow += elapsed > args.max_ms
+        if not ok or elapsed > args.max_ms or (lat, lng) in POLAR_QUERIES:
+            print(f"[{'ok' if ok and elapsed <= args.max_ms else 'FAIL'}] lat={lat:.2f} lng={lng:.2f} k={k} "
+                  f"radius={radius_km}: {len(answer)} results in {elapsed:.1f}ms")
+    timings.sort()
+    print(f"{len(queries)} queries over {args.hospitals} hospitals: {mismatches} wrong, {slow} over {args.max_ms:g}ms, "
+          f"p50={timings[len(timings) // 2]:.2f}ms max={timings[-1]:.1f}ms")
+    return 1 if mismatches or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Check that GET /appointments issues the same number of queries however many
+appointments it returns (no query per row).
+
+Seeds a patient, a doctor and --appointments appointments (each with its own
+patient for the admin listing) in the database in DATABASE_URL (use a
+scratch database), counts the statements each role's listing runs, doubles
+the appointments and counts again. Exits non-zero if a count grew.
+
+    DATABASE_URL=sqlite:///./query_counts.db python check_query_counts.py
+"""
+import argparse
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+
+@contextmanager
+def counting(engines):
+    """Collect the statements run on engines"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for counted in engines:
+        event.listen(counted, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for counted in engines:
+            event.remove(counted, "before_cursor_execute", count)
+
+
+def seed(patients: int, doctor_id: int, patient_id: int):
+    """One appointment for the patient and one for each of patients new patients, all with the doctor"""
+    import models
+    from database import SessionLocal
+
+    stamp = datetime.now().timestamp()
+    with SessionLocal() as db:
+        users = [models.User(name=f"Count Patient {i}", email=f"count-{stamp}-{i}@example.com", password_hash="-")
+                 for i in range(patients)]
+        db.add_all(users)
+        db.flush()
+        db.add_all([
+            models.Appointment(user_id=user_id, doctor_id=doctor_id, appointment_type=models.AppointmentType.VIDEO,
+                               appointment_time=datetime.now() + timedelta(days=1, minutes=i))
+            for i, user_id in enumerate([patient_id] + [user.user_id for user in users])
+        ])
+        db.commit()
+
+
+def accounts(stamp: str):
+    """Create a patient, an approved doctor and an admin; returns their logins and ids"""
+    import crud, models, schemas
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        patient = crud.create_user(db, schemas.UserCreate(name="Count Patient", email=f"patient-{stamp}@example.com",
+                                                          password="check"))
+        doctor = crud.create_doctor(db, schemas.DoctorCreate(
+            name="Count Doctor", email=f"doctor-{stamp}@example.com", password="check",
+            specialization="Cardiologist", license_number="L-1", experience_years=1, consultation_fee=100,
+        ))
+        crud.update_doctor_status(db, doctor.doctor_id, models.DoctorStatus.APPROVED)
+        crud.create_admin(db, schemas.AdminCreate(name="Count Admin", email=f"admin-{stamp}@example.com",
+                                                  password="check"))
+        return ({"patient": f"patient-{stamp}@example.com", "doctor": f"doctor-{stamp}@example.com",
+                 "admin": f"admin-{stamp}@example.com"}, patient.user_id, doctor.doctor_id)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=20)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    import models
+    from database import async_engine, engine
+    from main import app
+
+    models.Base.metadata.create_all(bind=engine)
+    logins, patient_id, doctor_id = accounts(str(datetime.now().timestamp()))
+    seed(args.appointments - 1, doctor_id, patient_id)
+
+    failures = 0
+    # Not entered as a context manager: the startup hooks would start the
+    # background workers, whose queries would be counted too
+    client = TestClient(app)
+    headers = {}
+    for role, email in logins.items():
+        token = client.post("/token", data={"username": email, "password": "check"}).json()["access_token"]
+        headers[role] = {"Authorization": f"Bearer {token}"}
+        client.get("/appointments", headers=headers[role])  # resolves and caches the principal
+
+    def listing_queries(role):
+        with counting([engine, async_engine.sync_engine]) as statements:
+            response = client.get("/appointments", headers=headers[role])
+        return len(response.json()), len(statements)
+
+    before = {role: listing_queries(role) for role in logins}
+    seed(args.appointments, doctor_id, patient_id)
+    after = {role: listing_queries(role) for role in logins}
+
+    for role in logins:
+        (rows_before, queries_before), (rows_after, queries_after) = before[role], after[role]
+        ok = queries_after == queries_before and rows_after > rows_before
+        failures += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {role}: {rows_before} appointments in {queries_before} queries, "
+              f"{rows_after} in {queries_after}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
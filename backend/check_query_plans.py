@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Check that the hot queries are served by the indexes from models.py.
+
+Runs EXPLAIN (PostgreSQL) or EXPLAIN QUERY PLAN (SQLite) against the database
+in DATABASE_URL and exits non-zero if a query does not use its expected index.
+Apply the migrations first (alembic upgrade head).
+"""
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, func, text
+
+import models
+from database import engine, is_sqlite
+
+
+def hot_queries():
+    """(description, statement, expected index) for every hot query shape"""
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    A, D, P = models.Appointment, models.Doctor, models.Prescription
+    return [
+        ("reminders due", select(A).where(
+            A.status == models.AppointmentStatus.CONFIRMED,
+            A.appointment_time >= now,
+            A.appointment_time <= now + timedelta(hours=24),
+        ), "ix_appointments_status_time"),
+        ("user appointments", select(A).where(A.user_id == 1), "ix_appointments_user_time"),
+        ("upcoming user appointments", select(A).where(
+            A.user_id == 1, A.appointment_time > now
+        ), "ix_appointments_user_time"),
+        ("doctor appointments", select(A).where(A.doctor_id == 1), "ix_appointments_doctor_time"),
+        ("hospital appointments", select(A).where(A.hospital_id == 1), "ix_appointments_hospital_time"),
+        ("dashboard: today's appointments", select(A).where(
+            A.appointment_time >= today_start,
+            A.appointment_time < today_start + timedelta(days=1),
+        ), "ix_appointments_appointment_time"),
+        ("dashboard: upcoming confirmed", select(func.count()).select_from(A).where(
+            A.status == models.AppointmentStatus.CONFIRMED, A.appointment_time >= now
+        ), "ix_appointments_status_time"),
+        ("dashboard: recent appointments", select(A).order_by(A.created_at.desc()).limit(5),
+         "ix_appointments_created_at"),
+        ("dashboard: new users", select(func.count()).select_from(models.User).where(
+            models.User.created_at >= now - timedelta(days=30)
+        ), "ix_users_created_at"),
+        ("dashboard: pending doctors", select(D).where(
+            D.status == models.DoctorStatus.PENDING
+        ).order_by(D.created_at.desc()).limit(5), "ix_doctors_status_created_at"),
+        ("dashboard: recent prescriptions", select(func.count()).select_from(P).where(
+            P.created_at >= now - timedelta(days=7)
+        ), "ix_prescriptions_created_at"),
+        ("doctors by specialization", select(D).where(
+            D.status == models.DoctorStatus.APPROVED, D.specialization == "Cardiologist"
+        ), "ix_doctors_status_specialization"),
+        ("approved hospitals", select(models.Hospital).where(
+            models.Hospital.status == models.HospitalStatus.APPROVED
+        ), "ix_hospitals_status"),
+        ("user prescriptions", select(P).where(P.user_id == 1).order_by(P.prescription_id),
+         "ix_prescriptions_user_id"),
+        ("user medical records", select(models.MedicalRecord).where(
+            models.MedicalRecord.user_id == 1
+        ), "ix_medical_records_user_id"),
+    ]
+
+
+@contextmanager
+def explaining(conn):
+    """Prefix every statement run on conn with the dialect's EXPLAIN"""
+    prefix = "EXPLAIN QUERY PLAN " if is_sqlite else "EXPLAIN "
+
+    def add_prefix(conn, cursor, statement, parameters, context, executemany):
+        return prefix + statement, parameters
+
+    event.listen(conn, "before_cursor_execute", add_prefix, retval=True)
+    try:
+        yield
+    finally:
+        event.remove(conn, "before_cursor_execute", add_prefix)
+
+
+def main() -> int:
+    failures = 0
+    with engine.connect() as conn:
+        if not is_sqlite:
+            # Tiny development tables make sequential scans look cheaper
+            conn.execute(text("SET enable_seqscan = off"))
+        for description, statement, index in hot_queries():
+            with explaining(conn):
+                rows = conn.execute(statement).fetchall()
+            plan = "\n".join(str(row[-1]) for row in rows)
+            ok = index in plan
+            failures += not ok
+            print(f"[{'ok' if ok else 'FAIL'}] {description}: expected {index}")
+            if not ok:
+                print("    " + plan.replace("\n", "\n    "))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Every breaker registers itself here so its state can be reported
+breakers: Dict[str, "CircuitBreaker"] = {}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker with an adaptive timeout for calls to one
+    remote service.
+
+    Closed: calls go through, and failure_threshold consecutive failures
+    open the circuit. Open: allow() is False, so callers skip the service
+    straight away, until reset_timeout seconds have passed. Half-open: a
+    single probe call is let through; its success closes the circuit, its
+    failure opens it again.
+
+    timeout() is the chosen percentile of recent successful latencies times
+    a multiplier, kept within [min_timeout, max_timeout], or max_timeout
+    until enough latencies are known. A probe gets the timeout in force when
+    the circuit opened, doubled after each failed probe: a service that is
+    still hanging stays open, one that has settled at a slower latency
+    recovers after a few probes.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 min_timeout: float = 0.5, max_timeout: float = 10.0,
+                 percentile: float = 99.0, multiplier: float = 2.0,
+                 window: int = 200, min_samples: int = 20):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self._probe_timeout = max_timeout
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        breakers[name] = self
+
+    def allow(self) -> bool:
+        """Whether to call the service now; callers that get False should use their fallback"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            if self.state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced
+                if self._probe_started is None or now - self._probe_started > self._probe_timeout:
+                    self._probe_started = now
+                    return True
+            if self.state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def _percentile(self) -> float:
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)]
+
+    def _adaptive_timeout(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self._percentile() * self.multiplier))
+
+    def timeout(self) -> float:
+        """Seconds to wait for the next call"""
+        with self._lock:
+            return self._adaptive_timeout() if self.state == CLOSED else self._probe_timeout
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._latencies.append(latency)
+            self.state = CLOSED
+            self.opened_at = self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                self._probe_timeout = min(self.max_timeout, self._probe_timeout * 2)
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._probe_timeout = self._adaptive_timeout()
+                self.times_opened += 1
+            else:
+                return
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = self._probe_started = None
+            self._latencies.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = len(self._latencies)
+            percentile = self._percentile() if latencies else None
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "probe_in_seconds": retry_in,
+            "timeout_seconds": round(self.timeout(), 3),
+            f"latency_p{self.percentile:g}_seconds": round(percentile, 3) if percentile is not None else None,
+            "latency_samples": latencies,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
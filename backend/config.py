@@ -13,6 +13,31 @@ class Settings(BaseSettings):
     
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./healthcare.db")
+    DATABASE_READ_URLS: str = os.getenv("DATABASE_READ_URLS", "")  # comma-separated replicas
+    
+    # Directory cache (public doctor/hospital listings)
+    DIRECTORY_CACHE_TTL: float = float(os.getenv("DIRECTORY_CACHE_TTL", "60"))
+    DIRECTORY_CACHE_SIZE: int = int(os.getenv("DIRECTORY_CACHE_SIZE", "1024"))
+
+    # Principal cache (accounts resolved from access tokens)
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+    # Symptom analysis cache (keyed by normalized symptom text)
+    SYMPTOM_CACHE_TTL: float = float(os.getenv("SYMPTOM_CACHE_TTL", "600"))
+    SYMPTOM_CACHE_SIZE: int = int(os.getenv("SYMPTOM_CACHE_SIZE", "4096"))
+
+    # Admin dashboard counters are recounted this often (seconds, 0 = startup only)
+    DASHBOARD_RECONCILE_INTERVAL: float = float(os.getenv("DASHBOARD_RECONCILE_INTERVAL", "3600"))
+
+    # Background job queue (notifications)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_BATCH_SIZE: int = int(os.getenv("JOB_BATCH_SIZE", "20"))  # jobs a worker claims and runs together
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # idle workers check this often
+    JOB_VISIBILITY_TIMEOUT: float = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "60"))  # claimed jobs are retried after this
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_DELAY: float = float(os.getenv("JOB_RETRY_DELAY", "10"))  # doubled after every failed attempt
+    JOB_RETRY_MAX_DELAY: float = float(os.getenv("JOB_RETRY_MAX_DELAY", "3600"))
     
     # Security settings
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
@@ -22,6 +47,12 @@ class Settings(BaseSettings):
     # AI Service settings
     AI_SERVICE_URL: str = os.getenv("AI_SERVICE_URL", "http://localhost:8001/analyze-symptoms")
     FALLBACK_AI_ENABLED: bool = os.getenv("FALLBACK_AI_ENABLED", "true").lower() == "true"
+    AI_BREAKER_FAILURES: int = int(os.getenv("AI_BREAKER_FAILURES", "5"))  # consecutive failures that open the circuit
+    AI_BREAKER_RESET_TIMEOUT: float = float(os.getenv("AI_BREAKER_RESET_TIMEOUT", "30"))  # open this long before a probe
+    AI_TIMEOUT_MIN: float = float(os.getenv("AI_TIMEOUT_MIN", "0.5"))
+    AI_TIMEOUT_MAX: float = float(os.getenv("AI_TIMEOUT_MAX", "10"))
+    AI_TIMEOUT_PERCENTILE: float = float(os.getenv("AI_TIMEOUT_PERCENTILE", "99"))  # timeout = this latency percentile
+    AI_TIMEOUT_MULTIPLIER: float = float(os.getenv("AI_TIMEOUT_MULTIPLIER", "2"))  # ... times this
     
     # Video Consultation settings
     GOOGLE_SERVICE_ACCOUNT_FILE: str = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE", "")
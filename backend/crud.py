@@ -1,11 +1,70 @@
 from http.client import HTTPException
 from sqlalchemy.orm import Session, joinedload
 from typing import List
-from datetime import datetime
+from sqlalchemy import select, exists, insert, literal
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 import json
 
 import models, schemas
-from auth import get_password_hash, verify_password
+from auth import get_password_hash, verify_password, invalidate_principal
+from pagination import encode_cursor, decode_cursor
+from cache import directory_cache
+from doctor_search import doctor_index
+from hospital_geo import hospital_geo_index
+from scheduling import is_slot_taken, DEFAULT_SLOT_MINUTES
+import dashboard_counters  # keeps the dashboard counters in step with ORM writes
+import rollups  # keeps the daily rollups in step with ORM writes
+import activity  # appends the admin activity feed on ORM writes
+import outbox  # queues the notifications an ORM write implies
+
+
+# -----------------------------
+# Pagination
+# -----------------------------
+def paginate(query, key_column, skip: int = 0, limit: int = 100, cursor: str = None):
+    """
+    Run a query one page at a time inside the database.
+    With a cursor the page starts after the last key seen (keyset), otherwise
+    skip/limit become OFFSET/LIMIT. Returns (items, next_cursor).
+    """
+    query = query.order_by(key_column)
+    if cursor:
+        query = query.filter(key_column > decode_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+    # Fetch one extra row to know whether another page exists
+    items = query.limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(getattr(items[-1], key_column.key))
+
+
+# -----------------------------
+# Identity CRUD
+# -----------------------------
+def get_identity_by_email(db: Session, email: str):
+    return db.query(models.Identity).filter(models.Identity.email == email).first()
+
+def get_principal(db: Session, role: models.UserRole, principal_id: int):
+    """The user, doctor or admin behind an identity"""
+    model, _ = models.PRINCIPALS[models.UserRole(role)]
+    return db.get(model, principal_id)
+
+def _add_identity(db: Session, role: models.UserRole, principal):
+    """Register the login email of a principal that has just been flushed"""
+    _, key = models.PRINCIPALS[role]
+    db.add(models.Identity(email=principal.email, role=role, principal_id=getattr(principal, key)))
+
+def sync_identities(db: Session):
+    """Add identities for accounts written outside crud (seed scripts, older databases)"""
+    for role, (model, key) in models.PRINCIPALS.items():
+        missing = select(
+            model.email, literal(role, models.Identity.role.type), getattr(model, key)
+        ).where(~exists().where(models.Identity.email == model.email))
+        db.execute(insert(models.Identity).from_select(["email", "role", "principal_id"], missing))
+    db.commit()
 
 
 # -----------------------------
@@ -33,6 +92,8 @@ def create_user(db: Session, user: schemas.UserCreate):
         address=user.address
     )
     db.add(db_user)
+    db.flush()
+    _add_identity(db, models.UserRole.USER, db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -46,14 +107,20 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
         setattr(db_user, field, value)
     db.commit()
     db.refresh(db_user)
+    invalidate_principal(models.UserRole.USER, user_id)
     return db_user
 
 def delete_user(db: Session, user_id: int):
     db_user = get_user(db, user_id)
     if not db_user:
         return None
+    db.query(models.Identity).filter(
+        models.Identity.role == models.UserRole.USER,
+        models.Identity.principal_id == user_id
+    ).delete(synchronize_session=False)
     db.delete(db_user)
     db.commit()
+    invalidate_principal(models.UserRole.USER, user_id)
     return db_user
 
 
@@ -69,13 +136,35 @@ def get_doctor_by_email(db: Session, email: str):
 def get_doctors(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Doctor).offset(skip).limit(limit).all()
 
-def get_doctors_by_specialization(db: Session, specialization: str):
-    return db.query(models.Doctor).filter(
-        models.Doctor.specialization.ilike(f"%{specialization}%")
-    ).all()
-
-def get_approved_doctors(db: Session):
-    return db.query(models.Doctor).filter(models.Doctor.status == models.DoctorStatus.APPROVED).all()
+def _doctor_changed(db_doctor: models.Doctor):
+    """Refresh the derived doctor views after a committed write"""
+    doctor_index.upsert(db_doctor)
+    directory_cache.invalidate("doctors")
+    invalidate_principal(models.UserRole.DOCTOR, db_doctor.doctor_id)
+
+def get_doctors_by_ids(db: Session, doctor_ids: List[int]):
+    """Load doctors in one IN query, keeping the order of doctor_ids"""
+    if not doctor_ids:
+        return []
+    doctors = db.query(models.Doctor).filter(models.Doctor.doctor_id.in_(doctor_ids)).all()
+    by_id = {doctor.doctor_id: doctor for doctor in doctors}
+    return [by_id[doctor_id] for doctor_id in doctor_ids if doctor_id in by_id]
+
+def get_doctors_by_specialization(db: Session, specialization: str, limit: int = None):
+    """Approved doctors ranked by how well they match the specialization"""
+    doctor_index.ensure_loaded(db)
+    doctor_ids = doctor_index.search(specialization=specialization)
+    return get_doctors_by_ids(db, doctor_ids[:limit] if limit else doctor_ids)
+
+def get_doctor_ids_by_specialization(db: Session, specialization: str, limit: int = None) -> List[int]:
+    """Ids of get_doctors_by_specialization, straight from the index"""
+    doctor_index.ensure_loaded(db)
+    doctor_ids = doctor_index.search(specialization=specialization)
+    return doctor_ids[:limit] if limit else doctor_ids
+
+def get_approved_doctors(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(models.Doctor).filter(models.Doctor.status == models.DoctorStatus.APPROVED)
+    return paginate(query, models.Doctor.doctor_id, skip, limit, cursor)
 
 def create_doctor(db: Session, doctor: schemas.DoctorCreate):
     hashed_password = get_password_hash(doctor.password)
@@ -94,8 +183,11 @@ def create_doctor(db: Session, doctor: schemas.DoctorCreate):
         availability=doctor.availability
     )
     db.add(db_doctor)
+    db.flush()
+    _add_identity(db, models.UserRole.DOCTOR, db_doctor)
     db.commit()
     db.refresh(db_doctor)
+    _doctor_changed(db_doctor)
     return db_doctor
 
 def update_doctor(db: Session, doctor_id: int, doctor_update: schemas.DoctorUpdate):
@@ -107,6 +199,7 @@ def update_doctor(db: Session, doctor_id: int, doctor_update: schemas.DoctorUpda
         setattr(db_doctor, field, value)
     db.commit()
     db.refresh(db_doctor)
+    _doctor_changed(db_doctor)
     return db_doctor
 
 def update_doctor_status(db: Session, doctor_id: int, status: models.DoctorStatus):
@@ -116,9 +209,42 @@ def update_doctor_status(db: Session, doctor_id: int, status: models.DoctorStatu
     db_doctor.status = status
     db.commit()
     db.refresh(db_doctor)
+    _doctor_changed(db_doctor)
     return db_doctor
 
 
+# -----------------------------
+# Doctor Availability CRUD
+# -----------------------------
+def get_doctor_availability(db: Session, doctor_id: int):
+    rules = db.query(models.DoctorAvailabilityRule).filter(
+        models.DoctorAvailabilityRule.doctor_id == doctor_id
+    ).order_by(models.DoctorAvailabilityRule.weekday, models.DoctorAvailabilityRule.start_time).all()
+    exceptions = db.query(models.DoctorAvailabilityException).filter(
+        models.DoctorAvailabilityException.doctor_id == doctor_id,
+        models.DoctorAvailabilityException.day >= datetime.now().date()
+    ).order_by(models.DoctorAvailabilityException.day).all()
+    return schemas.DoctorAvailability(
+        rules=[schemas.AvailabilityRule.model_validate(rule) for rule in rules],
+        exceptions=[schemas.AvailabilityException.model_validate(exception) for exception in exceptions]
+    )
+
+def set_doctor_availability(db: Session, doctor_id: int, availability: schemas.DoctorAvailability):
+    """Replace the weekly rules and exceptions of a doctor"""
+    db.query(models.DoctorAvailabilityRule).filter(
+        models.DoctorAvailabilityRule.doctor_id == doctor_id
+    ).delete(synchronize_session=False)
+    db.query(models.DoctorAvailabilityException).filter(
+        models.DoctorAvailabilityException.doctor_id == doctor_id
+    ).delete(synchronize_session=False)
+    for rule in availability.rules:
+        db.add(models.DoctorAvailabilityRule(doctor_id=doctor_id, **rule.dict()))
+    for exception in availability.exceptions:
+        db.add(models.DoctorAvailabilityException(doctor_id=doctor_id, **exception.dict()))
+    db.commit()
+    return get_doctor_availability(db, doctor_id)
+
+
 # -----------------------------
 # Hospital CRUD
 # -----------------------------
@@ -128,8 +254,14 @@ def get_hospital(db: Session, hospital_id: int):
 def get_hospitals(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Hospital).offset(skip).limit(limit).all()
 
-def get_approved_hospitals(db: Session):
-    return db.query(models.Hospital).filter(models.Hospital.status == models.HospitalStatus.APPROVED).all()
+def _hospital_changed(db_hospital: models.Hospital):
+    """Refresh the derived hospital views after a committed write"""
+    hospital_geo_index.upsert(db_hospital)
+    directory_cache.invalidate("hospitals")
+
+def get_approved_hospitals(db: Session, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(models.Hospital).filter(models.Hospital.status == models.HospitalStatus.APPROVED)
+    return paginate(query, models.Hospital.hospital_id, skip, limit, cursor)
 
 def create_hospital(db: Session, hospital: schemas.HospitalCreate):
     db_hospital = models.Hospital(
@@ -144,6 +276,7 @@ def create_hospital(db: Session, hospital: schemas.HospitalCreate):
     db.add(db_hospital)
     db.commit()
     db.refresh(db_hospital)
+    _hospital_changed(db_hospital)
     return db_hospital
 
 def update_hospital_status(db: Session, hospital_id: int, status: models.HospitalStatus):
@@ -153,8 +286,21 @@ def update_hospital_status(db: Session, hospital_id: int, status: models.Hospita
     db_hospital.status = status
     db.commit()
     db.refresh(db_hospital)
+    _hospital_changed(db_hospital)
     return db_hospital
 
+def get_nearby_hospitals(db: Session, lat: float, lng: float, radius_km: float, k: int):
+    """Approved hospitals within radius_km, closest first, as (hospital, distance_km)"""
+    hospital_geo_index.ensure_loaded(db)
+    nearest = hospital_geo_index.nearest(lat, lng, k=k, radius_km=radius_km)
+    if not nearest:
+        return []
+    hospitals = db.query(models.Hospital).filter(
+        models.Hospital.hospital_id.in_([hospital_id for hospital_id, _ in nearest])
+    ).all()
+    by_id = {hospital.hospital_id: hospital for hospital in hospitals}
+    return [(by_id[hospital_id], distance) for hospital_id, distance in nearest if hospital_id in by_id]
+
 
 # -----------------------------
 # Appointment CRUD
@@ -177,6 +323,15 @@ def get_user_appointments(db: Session, user_id: int, skip: int = 0, limit: int =
         .all()
     )
 
+def get_appointments_with_users(db: Session, user_id: int = None, doctor_id: int = None):
+    """Appointments with their patient eager-loaded in the same query"""
+    query = db.query(models.Appointment).options(joinedload(models.Appointment.user))
+    if user_id is not None:
+        query = query.filter(models.Appointment.user_id == user_id)
+    if doctor_id is not None:
+        query = query.filter(models.Appointment.doctor_id == doctor_id)
+    return query.all()
+
 def get_doctor_appointments(db: Session, doctor_id: int):
     doctor = db.query(models.Doctor).filter(models.Doctor.doctor_id == doctor_id).first()
     if not doctor:
@@ -202,9 +357,50 @@ def get_upcoming_appointments(db: Session, user_id: int):
         .all()
     )
 
+class SlotUnavailableError(Exception):
+    """The doctor already has an appointment overlapping the requested time"""
+
+# Fields whose change moves or frees the doctor's booked time
+SLOT_FIELDS = {"doctor_id", "appointment_time", "duration", "status"}
+
+def slot_key(appointment: models.Appointment):
+    if (appointment.doctor_id is None or appointment.appointment_time is None
+            or appointment.status == models.AppointmentStatus.CANCELLED):
+        return None
+    return f"{appointment.doctor_id}@{appointment.appointment_time:%Y-%m-%dT%H:%M}"
+
+def _reserve_slot(db: Session, appointment: models.Appointment):
+    """
+    Flush appointment while holding its doctor's time. Overlaps are checked
+    once without locks so losing requests fail fast, then again after the
+    doctor row lock (PostgreSQL/MySQL) or the SQLite write lock taken by the
+    flush; the unique slot_key backs this up in the database.
+    """
+    appointment.slot_key = slot_key(appointment)
+    if appointment.slot_key is None:
+        db.flush()
+        return
+    start = appointment.appointment_time
+    end = start + timedelta(minutes=appointment.duration or DEFAULT_SLOT_MINUTES)
+    if is_slot_taken(db, appointment.doctor_id, start, end, exclude_id=appointment.appointment_id):
+        db.rollback()
+        raise SlotUnavailableError()
+    db.query(models.Doctor.doctor_id).filter(
+        models.Doctor.doctor_id == appointment.doctor_id
+    ).with_for_update().first()
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise SlotUnavailableError()
+    if is_slot_taken(db, appointment.doctor_id, start, end, exclude_id=appointment.appointment_id):
+        db.rollback()
+        raise SlotUnavailableError()
+
 def create_appointment(db: Session, appointment: schemas.AppointmentCreate):
     db_appointment = models.Appointment(**appointment.dict())
     db.add(db_appointment)
+    _reserve_slot(db, db_appointment)
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
@@ -216,6 +412,8 @@ def update_appointment(db: Session, appointment_id: int, appointment_update: sch
     update_data = appointment_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(appointment, field, value)
+    if SLOT_FIELDS & update_data.keys():
+        _reserve_slot(db, appointment)
     db.commit()
     db.refresh(appointment)
     return appointment
@@ -225,6 +423,7 @@ def update_appointment_status(db: Session, appointment_id: int, status: schemas.
     if not appointment:
         return None
     appointment.status = status.status
+    _reserve_slot(db, appointment)
     db.commit()
     db.refresh(appointment)
     return appointment
@@ -247,8 +446,9 @@ def get_prescription(db: Session, prescription_id: int):
         models.Prescription.prescription_id == prescription_id
     ).first()
 
-def get_user_prescriptions(db: Session, user_id: int):
-    return db.query(models.Prescription).filter(models.Prescription.user_id == user_id).all()
+def get_user_prescriptions(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(models.Prescription).filter(models.Prescription.user_id == user_id)
+    return paginate(query, models.Prescription.prescription_id, skip, limit, cursor)
 
 def create_prescription(db: Session, prescription: schemas.PrescriptionCreate):
     medications_json = json.dumps([med.dict() for med in prescription.medications])
@@ -359,6 +559,8 @@ def create_admin(db: Session, admin: schemas.AdminCreate):
         password_hash=hashed_password
     )
     db.add(db_admin)
+    db.flush()
+    _add_identity(db, models.UserRole.ADMIN, db_admin)
     db.commit()
     db.refresh(db_admin)
     return db_admin
@@ -400,41 +602,56 @@ def update_call_booking_with_analysis(db: Session, call_id: int, suggested_speci
 # -----------------------------
 # Search
 # -----------------------------
-def search_doctors(db: Session, search: schemas.DoctorSearch):
-    query = db.query(models.Doctor).filter(models.Doctor.status == models.DoctorStatus.APPROVED)
-    
-    if search.specialization:
-        query = query.filter(models.Doctor.specialization.ilike(f"%{search.specialization}%"))
-    if search.min_experience:
-        query = query.filter(models.Doctor.experience_years >= search.min_experience)
-    if search.max_fee:
-        query = query.filter(models.Doctor.consultation_fee <= search.max_fee)
-    return query.all()
-
-def search_hospitals(db: Session, search: schemas.HospitalSearch):
+def search_doctors(db: Session, search: schemas.DoctorSearch, skip: int = 0, limit: int = 100, cursor: str = None):
+    """
+    Ranked, typo-tolerant doctor search served from the in-memory index.
+    Results are ordered by relevance, so the cursor carries the next offset.
+    """
+    doctor_index.ensure_loaded(db)
+    doctor_ids = doctor_index.search(
+        name=search.name,
+        specialization=search.specialization,
+        hospital_id=search.hospital_id,
+        min_experience=search.min_experience,
+        max_fee=search.max_fee,
+    )
+    start = decode_cursor(cursor) if cursor else skip
+    if not isinstance(start, int) or start < 0:
+        raise ValueError("Invalid cursor")
+    page_ids = doctor_ids[start:start + limit]
+    next_cursor = encode_cursor(start + limit) if start + limit < len(doctor_ids) else None
+    return get_doctors_by_ids(db, page_ids), next_cursor
+
+def search_hospitals(db: Session, search: schemas.HospitalSearch, skip: int = 0, limit: int = 100, cursor: str = None):
     query = db.query(models.Hospital).filter(models.Hospital.status == models.HospitalStatus.APPROVED)
     
     if search.name:
         query = query.filter(models.Hospital.name.ilike(f"%{search.name}%"))
     if search.location:
         query = query.filter(models.Hospital.address.ilike(f"%{search.location}%"))
-    return query.all()
+    return paginate(query, models.Hospital.hospital_id, skip, limit, cursor)
 
 
 # -----------------------------
 # Authentication
 # -----------------------------
 def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_email(db, username)
-    if user and verify_password(password, user.password_hash):
-        return user
-
-    doctor = get_doctor_by_email(db, username)
-    if doctor and verify_password(password, doctor.password_hash):
-        return doctor
-
-    admin = get_admin_by_email(db, username)
-    if admin and verify_password(password, admin.password_hash):
-        return admin
-
+    """
+    One identity lookup, then one password check. Databases from before
+    identities can hold the same email in several account tables; only one
+    of them owns the identity, so a failed check also tries the others
+    (see the identities migration) rather than locking those accounts out.
+    """
+    identity = get_identity_by_email(db, username)
+    if not identity:
+        return False
+    principal = get_principal(db, identity.role, identity.principal_id)
+    if principal and verify_password(password, principal.password_hash):
+        return principal
+    for role, (model, _) in models.PRINCIPALS.items():
+        if role == identity.role:
+            continue
+        shadowed = db.query(model).filter(model.email == username).first()
+        if shadowed and verify_password(password, shadowed.password_hash):
+            return shadowed
     return False
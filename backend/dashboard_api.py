@@ -1,66 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from sqlalchemy import func, and_, select
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
 import models
 import schemas
 from auth import get_current_admin
-from database import get_db
+from database import get_db, get_read_db
+from cache import caches
+from circuit_breaker import breakers
+import activity
+import dashboard_counters
+import jobs
+import rollups
 
 # Create router for dashboard endpoints
 dashboard_router = APIRouter(prefix="/admin/dashboard", tags=["admin-dashboard"])
 
 @dashboard_router.get("/stats")
-async def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(get_current_admin)
+def get_dashboard_stats(
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
 ) -> Dict[str, Any]:
     """Get comprehensive dashboard statistics for admin overview"""
-    
-    # User statistics
-    total_users = db.query(models.User).count()
-    new_users_this_month = db.query(models.User).filter(
-        models.User.created_at >= datetime.now() - timedelta(days=30)
-    ).count()
-    
-    # Doctor statistics
-    total_doctors = db.query(models.Doctor).count()
-    pending_doctors = db.query(models.Doctor).filter(
-        models.Doctor.status == models.DoctorStatus.PENDING
-    ).count()
-    approved_doctors = db.query(models.Doctor).filter(
-        models.Doctor.status == models.DoctorStatus.APPROVED
-    ).count()
-    
-    # Hospital statistics
-    total_hospitals = db.query(models.Hospital).count()
-    pending_hospitals = db.query(models.Hospital).filter(
-        models.Hospital.status == models.HospitalStatus.PENDING
-    ).count()
-    approved_hospitals = db.query(models.Hospital).filter(
-        models.Hospital.status == models.HospitalStatus.APPROVED
-    ).count()
-    
-    # Appointment statistics
-    total_appointments = db.query(models.Appointment).count()
-    today_appointments = db.query(models.Appointment).filter(
-        func.date(models.Appointment.appointment_time) == datetime.now().date()
-    ).count()
-    
-    upcoming_appointments = db.query(models.Appointment).filter(
-        and_(
-            models.Appointment.appointment_time >= datetime.now(),
-            models.Appointment.status == models.AppointmentStatus.CONFIRMED
-        )
-    ).count()
-    
-    # Prescription statistics
-    total_prescriptions = db.query(models.Prescription).count()
-    recent_prescriptions = db.query(models.Prescription).filter(
-        models.Prescription.created_at >= datetime.now() - timedelta(days=7)
-    ).count()
-    
+    now = datetime.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    U, A, P = models.User, models.Appointment, models.Prescription
+
+    # Totals and per-status counts come from the maintained counters row
+    counters = dashboard_counters.read(db)
+
+    # Time-window counts are index range scans, fetched in one round trip
+    window = db.execute(select(
+        select(func.count()).select_from(U).where(
+            U.created_at >= now - timedelta(days=30)
+        ).scalar_subquery().label("new_users_this_month"),
+        select(func.count()).select_from(A).where(
+            A.appointment_time >= today_start,
+            A.appointment_time < today_start + timedelta(days=1)
+        ).scalar_subquery().label("today_appointments"),
+        select(func.count()).select_from(A).where(
+            A.status == models.AppointmentStatus.CONFIRMED,
+            A.appointment_time >= now
+        ).scalar_subquery().label("upcoming_appointments"),
+        select(func.count()).select_from(P).where(
+            P.created_at >= now - timedelta(days=7)
+        ).scalar_subquery().label("recent_prescriptions"),
+    )).one()
+    total_doctors, approved_doctors = counters.doctors_total, counters.doctors_approved
+    total_hospitals, approved_hospitals = counters.hospitals_total, counters.hospitals_approved
     # System health metrics
     active_users_today = db.query(models.User).filter(
         models.User.last_login >= datetime.now() - timedelta(days=1)
@@ -68,128 +56,72 @@ async def get_dashboard_stats(
     
     return {
         "users": {
-            "total": total_users,
-            "new_this_month": new_users_this_month,
+            "total": counters.users_total,
+            "new_this_month": window.new_users_this_month,
             "active_today": active_users_today
         },
         "doctors": {
             "total": total_doctors,
-            "pending": pending_doctors,
+            "pending": counters.doctors_pending,
             "approved": approved_doctors,
             "approval_rate": round((approved_doctors / max(total_doctors, 1)) * 100, 1)
         },
         "hospitals": {
             "total": total_hospitals,
-            "pending": pending_hospitals,
+            "pending": counters.hospitals_pending,
             "approved": approved_hospitals,
             "approval_rate": round((approved_hospitals / max(total_hospitals, 1)) * 100, 1)
         },
         "appointments": {
-            "total": total_appointments,
-            "today": today_appointments,
-            "upcoming": upcoming_appointments
+            "total": counters.appointments_total,
+            "today": window.today_appointments,
+            "upcoming": window.upcoming_appointments
         },
         "prescriptions": {
-            "total": total_prescriptions,
-            "recent": recent_prescriptions
+            "total": counters.prescriptions_total,
+            "recent": window.recent_prescriptions
         },
         "system": {
             "status": "healthy",
-            "last_updated": datetime.now().isoformat()
+            "last_updated": datetime.now().isoformat(),
+            "counters_reconciled_at": counters.reconciled_at.isoformat() if counters.reconciled_at else None
         }
     }
 
 @dashboard_router.get("/recent-activity")
-async def get_recent_activity(
-    limit: int = 10,
-    db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(get_current_admin)
+def get_recent_activity(
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
 ) -> List[Dict[str, Any]]:
-    """Get recent system activity for admin monitoring"""
-    
-    activities = []
-    
-    # Recent user registrations
-    recent_users = db.query(models.User).order_by(
-        models.User.created_at.desc()
-    ).limit(5).all()
-    
-    for user in recent_users:
-        activities.append({
-            "type": "user_registration",
-            "message": f"New user registered: {user.name}",
-            "timestamp": user.created_at.isoformat(),
-            "entity_id": user.user_id
-        })
-    
-    # Recent doctor applications
-    recent_doctors = db.query(models.Doctor).filter(
-        models.Doctor.status == models.DoctorStatus.PENDING
-    ).order_by(models.Doctor.created_at.desc()).limit(5).all()
-    
-    for doctor in recent_doctors:
-        activities.append({
-            "type": "doctor_application",
-            "message": f"New doctor application: Dr. {doctor.name}",
-            "timestamp": doctor.created_at.isoformat(),
-            "entity_id": doctor.doctor_id
-        })
-    
-    # Recent appointments
-    recent_appointments = db.query(models.Appointment).order_by(
-        models.Appointment.created_at.desc()
-    ).limit(5).all()
-    
-    for appointment in recent_appointments:
-        user = db.query(models.User).filter(
-            models.User.user_id == appointment.user_id
-        ).first()
-        activities.append({
-            "type": "appointment_created",
-            "message": f"New appointment scheduled by {user.name if user else 'Unknown'}",
-            "timestamp": appointment.created_at.isoformat(),
-            "entity_id": appointment.appointment_id
-        })
-    
-    # Sort by timestamp and return limited results
-    # Sort by timestamp and return limited results
-    activities.sort(key=lambda x: x["timestamp"], reverse=True)
-    return activities[:limit]
+    """Get recent system activity for admin monitoring, newest first (older pages via X-Next-Cursor)"""
+    try:
+        entries, next_cursor = activity.page(db, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        {
+            "type": entry.activity_type,
+            "message": entry.message,
+            "timestamp": entry.created_at.isoformat(),
+            "entity_id": entry.entity_id
+        }
+        for entry in entries
+    ]
 
 
 @dashboard_router.get("/appointments-overview")
-async def get_appointments_overview(
-    db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(get_current_admin)
+def get_appointments_overview(
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
 ) -> Dict[str, Any]:
     """Get detailed appointments overview for admin dashboard"""
 
-    # Appointments by status
-    confirmed = db.query(models.Appointment).filter(
-        models.Appointment.status == models.AppointmentStatus.CONFIRMED
-    ).count()
-
-    requested = db.query(models.Appointment).filter(
-        models.Appointment.status == models.AppointmentStatus.REQUESTED
-    ).count()
-
-    completed = db.query(models.Appointment).filter(
-        models.Appointment.status == models.AppointmentStatus.COMPLETED
-    ).count()
-
-    cancelled = db.query(models.Appointment).filter(
-        models.Appointment.status == models.AppointmentStatus.CANCELLED
-    ).count()
-
-    # Appointments by type
-    in_person = db.query(models.Appointment).filter(
-    models.Appointment.appointment_type == models.AppointmentType.IN_PERSON
-    ).count()
-
-    video = db.query(models.Appointment).filter(
-    models.Appointment.appointment_type == models.AppointmentType.VIDEO
-    ).count()
-
+    counters = dashboard_counters.read(db)
 
     # Today's appointments
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -204,14 +136,14 @@ async def get_appointments_overview(
 
     return {
         "by_status": {
-            "confirmed": confirmed,
-            "requested": requested,
-            "completed": completed,
-            "cancelled": cancelled
+            "confirmed": counters.appointments_confirmed,
+            "requested": counters.appointments_requested,
+            "completed": counters.appointments_completed,
+            "cancelled": counters.appointments_cancelled
         },
         "by_type": {
-    "in_person": in_person,
-    "video": video
+    "in_person": counters.appointments_in_person,
+    "video": counters.appointments_video
 },
 
         "today": {
@@ -227,3 +159,112 @@ async def get_appointments_overview(
             ]
         }
     }
+
+
+
+@dashboard_router.get("/cache-stats")
+async def get_cache_stats(
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Hit/miss counters of the in-process caches, for tuning sizes and TTLs"""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+@dashboard_router.get("/circuit-breakers")
+async def get_circuit_breakers(
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """State, adaptive timeout and counters of the breakers in front of remote services"""
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+@dashboard_router.post("/reconcile")
+def reconcile_dashboard_counters(
+    db: Session = Depends(get_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Recount the dashboard counters from the base tables; returns the corrections applied"""
+    return {"corrections": dashboard_counters.reconcile(db)}
+
+
+# -----------------------------
+# Time series (read from the daily rollups only)
+# -----------------------------
+MAX_TIMESERIES_DAYS = 366
+
+def timeseries_window(start: Optional[date], end: Optional[date]):
+    end = end or datetime.now().date()
+    start = start or end - timedelta(days=29)
+    if start > end or (end - start).days >= MAX_TIMESERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"start must be on or before end and at most {MAX_TIMESERIES_DAYS} days earlier")
+    return start, end
+
+
+@dashboard_router.get("/timeseries/appointments")
+def get_appointments_timeseries(
+    group_by: str = Query("status", pattern="^(status|type)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Appointments per day (by appointment date), split by status or type"""
+    start, end = timeseries_window(start, end)
+    key = "status" if group_by == "status" else "appointment_type"
+    return rollups.series(db, "appointments", key, start, end)
+
+
+@dashboard_router.get("/timeseries/symptom-checks")
+def get_symptom_checks_timeseries(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Symptom checks per day, split by suggested specialization"""
+    start, end = timeseries_window(start, end)
+    return rollups.series(db, "symptom_checks", "suggested_specialization", start, end)
+
+
+@dashboard_router.get("/timeseries/calls")
+def get_calls_timeseries(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Call bookings per day, split by urgency"""
+    start, end = timeseries_window(start, end)
+    return rollups.series(db, "calls", "urgency", start, end)
+
+
+@dashboard_router.post("/timeseries/backfill")
+def backfill_timeseries(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Rebuild the daily rollups for [start, end] (everything by default) from the base tables"""
+    return {"rows_written": rollups.backfill(db, start, end)}
+
+
+@dashboard_router.get("/jobs")
+def get_job_queue_stats(
+    db: Session = Depends(get_read_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Background jobs per status (FAILED = dead letter), backlog and delivery throughput"""
+    return jobs.stats(db)
+
+
+@dashboard_router.post("/jobs/{job_id}/retry")
+def retry_failed_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_admin: schemas.Principal = Depends(get_current_admin)
+) -> Dict[str, Any]:
+    """Queue a dead-lettered job again with a fresh set of attempts"""
+    if not jobs.requeue(db, job_id):
+        raise HTTPException(status_code=404, detail="No failed job with this id")
+    return {"job_id": job_id, "status": models.JobStatus.QUEUED.value}
@@ -0,0 +1,179 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import case, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_ID = 1
+
+# model -> (counter prefix, attributes whose value picks a per-value counter)
+TRACKED = {
+    models.User: ("users", ()),
+    models.Doctor: ("doctors", ("status",)),
+    models.Hospital: ("hospitals", ("status",)),
+    models.Appointment: ("appointments", ("status", "appointment_type")),
+    models.Prescription: ("prescriptions", ()),
+}
+
+COUNTER_COLUMNS = {
+    column.name for column in models.DashboardCounters.__table__.columns
+    if column.name not in ("counter_id", "reconciled_at", "updated_at")
+}
+
+
+def count_if(condition):
+    """COUNT of the rows matching condition, for conditional aggregates"""
+    return func.count(case((condition, 1)))
+
+
+def _bucket(prefix: str, value) -> str:
+    return f"{prefix}_{getattr(value, 'value', value)}".lower()
+
+
+def _counters_for(prefix: str, attributes: Iterable[str], values: Dict[str, object]):
+    """Counter columns one row contributes to, given its attribute values"""
+    names = [f"{prefix}_total"]
+    for attribute in attributes:
+        if values.get(attribute) is not None:
+            names.append(_bucket(prefix, values[attribute]))
+    return [name for name in names if name in COUNTER_COLUMNS]
+
+
+def _committed_values(obj, attributes):
+    """Attribute values as they were before this flush"""
+    state = inspect(obj)
+    values = {}
+    for attribute in attributes:
+        history = state.attrs[attribute].history
+        if history.deleted:
+            values[attribute] = history.deleted[0]
+        elif history.unchanged:
+            values[attribute] = history.unchanged[0]
+        else:
+            values[attribute] = getattr(obj, attribute)
+    return values
+
+
+def _current_values(obj, attributes):
+    return {attribute: getattr(obj, attribute) for attribute in attributes}
+
+
+# -----------------------------
+# Incremental maintenance
+# -----------------------------
+def flush_deltas(session: Session) -> Counter:
+    """Counter changes implied by the rows this flush inserts, updates and deletes"""
+    deltas = Counter()
+    for obj in session.new:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            prefix, attributes = tracked
+            deltas.update(_counters_for(prefix, attributes, _current_values(obj, attributes)))
+    for obj in session.deleted:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            prefix, attributes = tracked
+            deltas.subtract(_counters_for(prefix, attributes, _committed_values(obj, attributes)))
+    for obj in session.dirty:
+        tracked = TRACKED.get(type(obj))
+        if not tracked or not tracked[1] or not session.is_modified(obj):
+            continue
+        prefix, attributes = tracked
+        deltas.update(_counters_for(prefix, attributes, _current_values(obj, attributes)))
+        deltas.subtract(_counters_for(prefix, attributes, _committed_values(obj, attributes)))
+    return Counter({name: delta for name, delta in deltas.items() if delta})
+
+
+def _increment(conn, deltas: Counter):
+    """counter += delta for each counter, creating the counters row if needed"""
+    table = models.DashboardCounters.__table__
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(conn.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(table).values(counter_id=COUNTERS_ID, **deltas)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["counter_id"],
+            set_={"updated_at": func.now(), **{name: table.c[name] + stmt.excluded[name] for name in deltas}},
+        ))
+        return
+    if not conn.execute(
+        update(table)
+        .where(table.c.counter_id == COUNTERS_ID)
+        .values(updated_at=func.now(), **{name: table.c[name] + delta for name, delta in deltas.items()})
+    ).rowcount:
+        conn.execute(insert(table).values(counter_id=COUNTERS_ID, **deltas))
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def apply_flush_deltas(session, flush_context):
+    """
+    Bump the counters in the same transaction as the rows they count. The
+    counters row is created by the first write that needs it; until the
+    first reconcile it only counts rows written since.
+    """
+    deltas = flush_deltas(session)
+    if not deltas:
+        return
+    _increment(session.connection(), deltas)
+
+
+# -----------------------------
+# Full recount
+# -----------------------------
+def compute_counts(db: Session) -> Dict[str, int]:
+    """Every counter recounted from the base tables, one scan per table"""
+    counts = {}
+    for model, (prefix, attributes) in TRACKED.items():
+        columns = [func.count().label(f"{prefix}_total")]
+        for attribute in attributes:
+            enum_type = getattr(model, attribute).type.enum_class
+            columns += [
+                count_if(getattr(model, attribute) == value).label(_bucket(prefix, value))
+                for value in enum_type if _bucket(prefix, value) in COUNTER_COLUMNS
+            ]
+        counts.update(db.execute(select(*columns).select_from(model)).one()._mapping)
+    return counts
+
+
+def reconcile(db: Session) -> Dict[str, int]:
+    """
+    Rewrite the counters from a full recount and return the corrections.
+    The counters row is written first so this transaction holds the write
+    lock (the row lock on PostgreSQL) while counting, and no concurrent
+    increment can slip in between the count and the write.
+    """
+    counters = db.get(models.DashboardCounters, COUNTERS_ID)
+    if counters is None:
+        counters = models.DashboardCounters(counter_id=COUNTERS_ID)
+        db.add(counters)
+    counters.reconciled_at = datetime.now()
+    db.flush()
+    db.refresh(counters)
+    corrections = {}
+    for name, value in compute_counts(db).items():
+        if getattr(counters, name) != value:
+            corrections[name] = value - (getattr(counters, name) or 0)
+            setattr(counters, name, value)
+    db.commit()
+    if corrections:
+        logger.warning("Dashboard counters drifted, corrected: %s", corrections)
+    return corrections
+
+
+def reconcile_in_new_session() -> Dict[str, int]:
+    with SessionLocal() as db:
+        return reconcile(db)
+
+
+def read(db: Session) -> models.DashboardCounters:
+    counters = db.get(models.DashboardCounters, COUNTERS_ID)
+    return counters if counters is not None else models.DashboardCounters(
+        counter_id=COUNTERS_ID, **{name: 0 for name in COUNTER_COLUMNS}
+    )
@@ -1,8 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
+import itertools
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from config import settings
 
 # Load environment variables
 load_dotenv()
@@ -14,26 +22,189 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database/healthcare_db.db"
 # Check if we're using SQLite
 is_sqlite = DATABASE_URL.startswith("sqlite")
 
-# Create engine with appropriate parameters
-if is_sqlite:
-    # SQLite doesn't support connection pooling
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
-else:
-    # For other databases (PostgreSQL, MySQL), use connection pooling
-    engine = create_engine(
-        DATABASE_URL,
+# Optional read replicas (comma-separated URLs) for read-only endpoints
+DATABASE_READ_URLS = [url.strip() for url in settings.DATABASE_READ_URLS.split(",") if url.strip()]
+# How long a replica that failed to connect is skipped before being retried
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# How far the replicas may lag behind the primary; reads that must see a
+# write made less than this long ago go to the primary
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+
+# SQLite tuning applied to every new connection. WAL lets readers run while a
+# write is in progress; busy_timeout makes writers wait instead of failing
+# with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, 64 MB
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": "MEMORY",
+}
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+
+def is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and make_url(url).database in (None, "", ":memory:")
+
+def sqlite_pragma_listener(url: str):
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            if name == "journal_mode" and is_memory_sqlite(url):
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_sqlite_pragmas
+
+def create_db_engine(url: str):
+    """Engine with the pool and connection settings suited to url's database"""
+    if is_memory_sqlite(url):
+        # An in-memory database lives in a single connection
+        db_engine = create_engine(url, connect_args={"check_same_thread": False})
+    elif url.startswith("sqlite"):
+        # File databases get a pool of tuned connections; readers never block
+        # each other under WAL, and writers are serialized below
+        db_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=SQLITE_POOL_SIZE,
+            max_overflow=SQLITE_POOL_SIZE,
+            pool_timeout=30,
+        )
+    else:
+        # For other databases (PostgreSQL, MySQL), use connection pooling
+        return create_engine(
+            url,
+            pool_size=10,
+            max_overflow=20,
+            pool_timeout=30,
+            pool_recycle=1800,
+        )
+    event.listen(db_engine, "connect", sqlite_pragma_listener(url))
+    return db_engine
+
+# Async drivers for the same database, used by the coroutine endpoints
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def get_async_url(url: str):
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername))
+
+def create_async_db_engine(url: str):
+    if url.startswith("sqlite"):
+        db_engine = create_async_engine(get_async_url(url))
+        event.listen(db_engine.sync_engine, "connect", sqlite_pragma_listener(url))
+        return db_engine
+    return create_async_engine(
+        get_async_url(url),
         pool_size=10,
         max_overflow=20,
         pool_timeout=30,
         pool_recycle=1800,
     )
 
+engine = create_db_engine(DATABASE_URL)
+async_engine = create_async_db_engine(DATABASE_URL)
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objects stay readable after commit since async sessions cannot lazy-load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# SQLite allows one writer at a time. Sessions in this process take a shared
+# lock before their first write, whether a flush or a DML statement run
+# through Session.execute, and hold it until the transaction ends, so
+# concurrent writers queue here instead of colliding inside SQLite. The
+# sqlite3 driver only opens its transaction at the first write, which then
+# always starts from a fresh snapshot.
+#
+# This is a trade-off, not a speed-up: queueing in Python costs 10-25% of
+# write throughput (benchmark_sqlite_writers.py), and with the default
+# busy_timeout of 5s SQLite's own retrying avoids "database is locked"
+# just as well. The lock pays off when writers wait longer than
+# busy_timeout, in bursts or with a lowered SQLITE_BUSY_TIMEOUT_MS, where
+# they would otherwise fail; set SQLITE_WRITE_LOCK=false to do without it.
+SQLITE_WRITE_LOCK = os.getenv("SQLITE_WRITE_LOCK", "true").lower() == "true"
+sqlite_write_lock = threading.Lock()
+SQLITE_WRITE_LOCK_TIMEOUT = float(os.getenv("SQLITE_WRITE_LOCK_TIMEOUT", "30"))
+
+# The session that took the write lock in the current context (a request's
+# endpoint call, a threadpool call, a job), so that a second writer started
+# inside it is caught; other requests run in contexts of their own, even on
+# the same thread
+_writing_session: ContextVar = ContextVar("writing_session", default=None)
+
+def take_write_lock(session):
+    """
+    Block until session may write. A second session that writes while one
+    opened earlier in the same context still has its write open could
+    never get the lock (and SQLite would refuse it anyway), so it fails
+    straight away: pass the open session down instead (e.g.
+    jobs.enqueue(db, ...) rather than jobs.enqueue(None, ...)).
+    """
+    if "holds_write_lock" in session.info:
+        return
+    holder = _writing_session.get()
+    if holder is not None and "holds_write_lock" in holder.info:
+        raise RuntimeError(
+            "A write transaction is already open in another session here; "
+            "SQLite cannot run a second writer alongside it"
+        )
+    if not sqlite_write_lock.acquire(timeout=SQLITE_WRITE_LOCK_TIMEOUT):
+        raise TimeoutError("Timed out waiting for the SQLite write lock")
+    session.info["holds_write_lock"] = True
+    _writing_session.set(session)
+
+def acquire_write_lock(session, flush_context, instances):
+    take_write_lock(session)
+
+def acquire_write_lock_for_dml(orm_execute_state):
+    # Core and bulk INSERT/UPDATE/DELETE run through Session.execute skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        take_write_lock(orm_execute_state.session)
+
+def release_write_lock(session, transaction):
+    if transaction.parent is None and session.info.pop("holds_write_lock", False):
+        if _writing_session.get() is session:
+            _writing_session.set(None)
+        sqlite_write_lock.release()
+
+if is_sqlite and SQLITE_WRITE_LOCK:
+    event.listen(SessionLocal, "before_flush", acquire_write_lock)
+    event.listen(SessionLocal, "do_orm_execute", acquire_write_lock_for_dml)
+    event.listen(SessionLocal, "after_transaction_end", release_write_lock)
+
+
+class ReplicaSet:
+    """Round-robin over replica engines, skipping ones that recently failed"""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self._down_until = {}
+        self._turn = itertools.count()
+
+    def candidates(self):
+        now = time.monotonic()
+        healthy = [e for e in self.engines if self._down_until.get(e, 0) <= now]
+        if not healthy:
+            return []
+        start = next(self._turn) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def mark_down(self, replica):
+        self._down_until[replica] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+read_replicas = ReplicaSet([create_db_engine(url) for url in DATABASE_READ_URLS])
+async_read_replicas = ReplicaSet([create_async_db_engine(url) for url in DATABASE_READ_URLS])
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncReadSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -45,6 +216,49 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def open_read_session():
+    """Session on a reachable replica, or on the primary when none is"""
+    for replica in read_replicas.candidates():
+        db = ReadSessionLocal(bind=replica)
+        try:
+            db.connection()
+            return db
+        except DBAPIError:
+            db.close()
+            read_replicas.mark_down(replica)
+    return SessionLocal()
+
+async def open_async_read_session():
+    for replica in async_read_replicas.candidates():
+        db = AsyncReadSessionLocal(bind=replica)
+        try:
+            await db.connection()
+            return db
+        except DBAPIError:
+            await db.close()
+            async_read_replicas.mark_down(replica)
+    return AsyncSessionLocal()
+
+# Dependency to get a session for read-only endpoints
+def get_read_db():
+    db = open_read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db():
+    db = await open_async_read_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
 # Function to create database tables
 def create_tables():
     import models
@@ -0,0 +1,213 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+# Relative weight of a hit in each indexed field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "specialization": 4.0,
+    "qualifications": 1.5,
+    "bio": 1.0,
+}
+
+# Fields a specialization query is matched against (name queries only use "name")
+SPECIALIZATION_FIELDS = ("specialization", "qualifications", "bio")
+
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.9
+FUZZY_MATCH = 0.7           # scaled by trigram similarity
+MIN_PREFIX_LENGTH = 3
+MIN_TRIGRAM_SIMILARITY = 0.4
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(token: str) -> set:
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Entry:
+    __slots__ = ("doctor_id", "fee", "experience", "hospital_id", "fields")
+
+    def __init__(self, doctor: models.Doctor):
+        self.doctor_id = doctor.doctor_id
+        self.fee = doctor.consultation_fee
+        self.experience = doctor.experience_years
+        self.hospital_id = doctor.hospital_id
+        self.fields = {field: set(tokenize(getattr(doctor, field))) for field in FIELD_WEIGHTS}
+
+
+class DoctorSearchIndex:
+    """
+    In-memory token + trigram inverted index over approved doctors.
+
+    Postings map field -> token -> doctor ids; a trigram index over the
+    vocabulary expands misspelled or partial query tokens to known tokens.
+    The index is built lazily from the database and kept current by the
+    doctor write paths in crud.py.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._entries: Dict[int, _Entry] = {}
+        self._postings: Dict[str, Dict[str, set]] = {field: defaultdict(set) for field in FIELD_WEIGHTS}
+        self._token_refs: Dict[str, int] = defaultdict(int)
+        self._trigram_tokens: Dict[str, set] = defaultdict(set)
+
+    # -----------------------------
+    # Maintenance
+    # -----------------------------
+    def ensure_loaded(self, db: Session):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            doctors = db.query(models.Doctor).filter(
+                models.Doctor.status == models.DoctorStatus.APPROVED
+            ).all()
+            self._rebuild(doctors)
+
+    def rebuild(self, db: Session):
+        with self._lock:
+            self._loaded = False
+            self.ensure_loaded(db)
+
+    def _rebuild(self, doctors: Iterable[models.Doctor]):
+        self._entries.clear()
+        for postings in self._postings.values():
+            postings.clear()
+        self._token_refs.clear()
+        self._trigram_tokens.clear()
+        for doctor in doctors:
+            self._add(_Entry(doctor))
+        self._loaded = True
+
+    def upsert(self, doctor: models.Doctor):
+        """Reflect a created/updated doctor; only approved doctors are searchable"""
+        with self._lock:
+            if not self._loaded:
+                return  # picked up by the first full load
+            self._remove(doctor.doctor_id)
+            if doctor.status == models.DoctorStatus.APPROVED:
+                self._add(_Entry(doctor))
+
+    def remove(self, doctor_id: int):
+        with self._lock:
+            self._remove(doctor_id)
+
+    def _add(self, entry: _Entry):
+        self._entries[entry.doctor_id] = entry
+        for field, tokens in entry.fields.items():
+            for token in tokens:
+                self._postings[field][token].add(entry.doctor_id)
+                self._token_refs[token] += 1
+                if self._token_refs[token] == 1:
+                    for tri in trigrams(token):
+                        self._trigram_tokens[tri].add(token)
+
+    def _remove(self, doctor_id: int):
+        entry = self._entries.pop(doctor_id, None)
+        if entry is None:
+            return
+        for field, tokens in entry.fields.items():
+            for token in tokens:
+                ids = self._postings[field][token]
+                ids.discard(doctor_id)
+                if not ids:
+                    del self._postings[field][token]
+                self._token_refs[token] -= 1
+                if self._token_refs[token] == 0:
+                    del self._token_refs[token]
+                    for tri in trigrams(token):
+                        self._trigram_tokens[tri].discard(token)
+                        if not self._trigram_tokens[tri]:
+                            del self._trigram_tokens[tri]
+
+    # -----------------------------
+    # Querying
+    # -----------------------------
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Known tokens a query token may refer to, with a match weight"""
+        matches = {}
+        if token in self._token_refs:
+            matches[token] = EXACT_MATCH
+        query_tris = trigrams(token)
+        shared = defaultdict(int)
+        for tri in query_tris:
+            for candidate in self._trigram_tokens.get(tri, ()):
+                shared[candidate] += 1
+        for candidate, count in shared.items():
+            if candidate in matches:
+                continue
+            if len(token) >= MIN_PREFIX_LENGTH and candidate.startswith(token):
+                matches[candidate] = PREFIX_MATCH
+                continue
+            similarity = count / (len(query_tris) + len(trigrams(candidate)) - count)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                matches[candidate] = FUZZY_MATCH * similarity
+        return list(matches.items())
+
+    def _score(self, text: str, fields: Sequence[str]) -> Optional[Dict[int, float]]:
+        """Score doctors against every token of text; None when text is empty"""
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        scores: Optional[Dict[int, float]] = None
+        for token in tokens:
+            token_scores: Dict[int, float] = {}
+            for candidate, weight in self._expand(token):
+                for field in fields:
+                    for doctor_id in self._postings[field].get(candidate, ()):
+                        score = weight * FIELD_WEIGHTS[field]
+                        if score > token_scores.get(doctor_id, 0.0):
+                            token_scores[doctor_id] = score
+            # Every query token has to match something
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {d: s + token_scores[d] for d, s in scores.items() if d in token_scores}
+            if not scores:
+                return {}
+        return scores
+
+    def search(self, name: Optional[str] = None, specialization: Optional[str] = None,
+               hospital_id: Optional[int] = None, min_experience: Optional[int] = None,
+               max_fee: Optional[float] = None) -> List[int]:
+        """Doctor ids matching the query and filters, best match first"""
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for text, fields in ((name, ("name",)), (specialization, SPECIALIZATION_FIELDS)):
+                part = self._score(text, fields)
+                if part is None:
+                    continue
+                scores = part if scores is None else {d: s + part[d] for d, s in scores.items() if d in part}
+            if scores is None:
+                scores = {doctor_id: 0.0 for doctor_id in self._entries}
+
+            results = []
+            for doctor_id, score in scores.items():
+                entry = self._entries[doctor_id]
+                if hospital_id is not None and entry.hospital_id != hospital_id:
+                    continue
+                if min_experience and (entry.experience or 0) < min_experience:
+                    continue
+                if max_fee and (entry.fee is None or entry.fee > max_fee):
+                    continue
+                results.append((-score, -(entry.experience or 0), doctor_id))
+            results.sort()
+            return [doctor_id for _, _, doctor_id in results]
+
+
+doctor_index = DoctorSearchIndex()
@@ -0,0 +1,160 @@
+import heapq
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEGREES = 0.1   # ~11 km grid cells
+COLUMNS = int(round(360 / CELL_DEGREES))
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return int(math.floor((lat + 90) / CELL_DEGREES)), int(math.floor((lng + 180) / CELL_DEGREES)) % COLUMNS
+
+
+class HospitalGeoIndex:
+    """
+    Fixed-size lat/long grid over approved hospitals for nearest-neighbour
+    queries. Cells are visited in rings around the query point until no
+    unvisited cell can hold anything closer than the current k-th result.
+    Built lazily from the database and kept current by the hospital write
+    paths in crud.py.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._points: Dict[int, Tuple[float, float]] = {}
+        self._cells: Dict[Tuple[int, int], set] = defaultdict(set)
+
+    # -----------------------------
+    # Maintenance
+    # -----------------------------
+    def ensure_loaded(self, db: Session):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            hospitals = db.query(models.Hospital).filter(
+                models.Hospital.status == models.HospitalStatus.APPROVED
+            ).all()
+            self._points.clear()
+            self._cells.clear()
+            for hospital in hospitals:
+                self._add(hospital)
+            self._loaded = True
+
+    def upsert(self, hospital: models.Hospital):
+        """Reflect a created/updated hospital; only approved hospitals are indexed"""
+        with self._lock:
+            if not self._loaded:
+                return  # picked up by the first full load
+            self._remove(hospital.hospital_id)
+            if hospital.status == models.HospitalStatus.APPROVED:
+                self._add(hospital)
+
+    def remove(self, hospital_id: int):
+        with self._lock:
+            self._remove(hospital_id)
+
+    def _add(self, hospital: models.Hospital):
+        if hospital.location_lat is None or hospital.location_long is None:
+            return
+        point = (hospital.location_lat, hospital.location_long)
+        self._points[hospital.hospital_id] = point
+        self._cells[_cell(*point)].add(hospital.hospital_id)
+
+    def _remove(self, hospital_id: int):
+        point = self._points.pop(hospital_id, None)
+        if point is None:
+            return
+        cell = _cell(*point)
+        self._cells[cell].discard(hospital_id)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    # -----------------------------
+    # Querying
+    # -----------------------------
+    def _ring(self, row: int, col: int, radius: int):
+        if radius == 0:
+            yield row, col
+            return
+        for dc in range(-radius, radius + 1):
+            yield row - radius, (col + dc) % COLUMNS
+            yield row + radius, (col + dc) % COLUMNS
+        for dr in range(-radius + 1, radius):
+            yield row + dr, (col - radius) % COLUMNS
+            yield row + dr, (col + radius) % COLUMNS
+
+    def _lower_bound_km(self, lat: float, radius: int) -> float:
+        """
+        Shortest distance from the query point to a cell outside ring
+        radius - 1: (radius - 1) whole rows away in latitude, or (radius - 1)
+        whole columns away in longitude, measured across the meridian (which
+        gets short near the poles, where columns converge)
+        """
+        cells = max(0, radius - 1) * CELL_DEGREES
+        lat_km = EARTH_RADIUS_KM * math.radians(cells)
+        lng_km = EARTH_RADIUS_KM * math.asin(
+            math.cos(math.radians(lat)) * math.sin(math.radians(min(90.0, cells)))
+        )
+        return min(lat_km, lng_km)
+
+    def nearest(self, lat: float, lng: float, k: int = 10,
+                radius_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Up to k (hospital_id, distance_km) pairs within radius_km, closest first"""
+        best: List[Tuple[float, int]] = []  # max-heap of (-distance, id)
+
+        def consider(hospital_id: int):
+            distance = haversine_km(lat, lng, *self._points[hospital_id])
+            if radius_km is not None and distance > radius_km:
+                return
+            if len(best) < k:
+                heapq.heappush(best, (-distance, hospital_id))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, hospital_id))
+
+        with self._lock:
+            row, col = _cell(lat, lng)
+            seen_cells = set()
+            visited = 0
+            radius = 0
+            while visited < len(self._points):
+                lower_bound = self._lower_bound_km(lat, radius)
+                if radius_km is not None and lower_bound > radius_km:
+                    break
+                if len(best) == k and lower_bound > -best[0][0]:
+                    break
+                if len(seen_cells) + 8 * radius > 2 * len(self._points):
+                    # Near the poles the bound grows too slowly to stop the
+                    # rings; past this point checking every hospital is cheaper
+                    best.clear()
+                    for hospital_id in self._points:
+                        consider(hospital_id)
+                    break
+                for cell in self._ring(row, col, radius):
+                    if cell in seen_cells:
+                        continue
+                    seen_cells.add(cell)
+                    for hospital_id in self._cells.get(cell, ()):
+                        visited += 1
+                        consider(hospital_id)
+                radius += 1
+        return sorted(((hospital_id, -neg) for neg, hospital_id in best), key=lambda item: item[1])
+
+hospital_geo_index = HospitalGeoIndex()
@@ -0,0 +1,330 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# kind -> function called with the job's payload as keyword arguments
+HANDLERS: Dict[str, Callable] = {}
+
+# Claims, outcomes and blocking handlers run on their own pool rather than
+# the threadpool that serves the synchronous endpoints
+job_executor = ThreadPoolExecutor(max_workers=max(1, settings.JOB_WORKERS), thread_name_prefix="jobs")
+
+# The job whose handler is running, for handlers that pass delivery_key() on
+current_job: contextvars.ContextVar[Optional[models.Job]] = contextvars.ContextVar("current_job", default=None)
+
+
+def handler(kind: str):
+    """Register the function (or coroutine function) that runs jobs of this kind; it should raise to request a retry"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def delivery_key() -> Optional[str]:
+    """
+    Idempotency key for the side effect of the running job, the same on every
+    attempt, so a receiver can drop a retry of a request it already handled
+    """
+    job = current_job.get()
+    if job is None:
+        return None
+    return job.idempotency_key or f"job-{job.job_id}"
+
+
+# -----------------------------
+# Producing
+# -----------------------------
+def _rows(jobs, key: Optional[str], delay: float) -> List[dict]:
+    run_at = datetime.now() + timedelta(seconds=delay)
+    return [
+        {"kind": kind, "payload": json.dumps(payload), "run_at": run_at,
+         "max_attempts": settings.JOB_MAX_ATTEMPTS, "status": models.JobStatus.QUEUED, "attempts": 0,
+         # one event queues several jobs; each gets its own key
+         "idempotency_key": f"{key}#{i}" if key else None}
+        for i, (kind, payload) in enumerate(jobs)
+    ]
+
+
+def _insert_skipping_queued(dialect_name: str):
+    """INSERT that drops rows whose idempotency key is already queued, or None where there is no such insert"""
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(dialect_name)
+    if dialect is None:
+        return None
+    return dialect.insert(models.Job.__table__).on_conflict_do_nothing(index_elements=["idempotency_key"])
+
+
+def _unqueued(execute, rows: List[dict], key: Optional[str]) -> List[dict]:
+    """rows without those whose idempotency key is already queued"""
+    if not key:
+        return rows
+    J = models.Job
+    queued = set(execute(
+        select(J.idempotency_key).where(J.idempotency_key.in_([row["idempotency_key"] for row in rows]))
+    ).scalars())
+    return [row for row in rows if row["idempotency_key"] not in queued]
+
+
+def enqueue(db: Optional[Session], *jobs: Tuple[str, dict], key: Optional[str] = None, delay: float = 0) -> List[int]:
+    """
+    Queue (kind, payload) jobs and return the ids of the ones added. With db
+    the jobs are inserted in the caller's transaction and commit with it;
+    without, they are committed in a transaction of their own. Jobs of an
+    event key that is already queued are skipped, by the insert itself, so
+    two producers racing on the same key add them once and neither fails.
+    """
+    if db is None:
+        with SessionLocal() as own:
+            job_ids = enqueue(own, *jobs, key=key, delay=delay)
+            own.commit()
+            return job_ids
+    rows = _rows(jobs, key, delay)
+    if not rows:
+        return []
+    stmt = _insert_skipping_queued(db.get_bind().dialect.name)
+    if stmt is not None:
+        # Run through the session so it takes the SQLite write lock; skipped rows return no id
+        return list(db.execute(stmt.returning(models.Job.__table__.c.job_id), rows).scalars())
+    added = [models.Job(**row) for row in _unqueued(db.execute, rows, key)]
+    db.add_all(added)
+    db.flush()
+    return [job.job_id for job in added]
+
+
+def enqueue_in_flush(session: Session, *jobs: Tuple[str, dict], key: Optional[str] = None, delay: float = 0):
+    """
+    Queue jobs from a flush event handler, on the flush's connection. The
+    session already holds the write lock there, and keys that were queued
+    before are dropped by the insert itself.
+    """
+    rows = _rows(jobs, key, delay)
+    if not rows:
+        return
+    conn = session.connection()
+    stmt = _insert_skipping_queued(conn.dialect.name)
+    if stmt is not None:
+        conn.execute(stmt, rows)
+        return
+    rows = _unqueued(conn.execute, rows, key)
+    if rows:
+        conn.execute(insert(models.Job.__table__), rows)
+
+
+# -----------------------------
+# Consuming
+# -----------------------------
+def _claimable(now: datetime):
+    J = models.Job
+    return or_(
+        and_(J.status == models.JobStatus.QUEUED, J.run_at <= now),
+        # claimed by a worker that died or overran the visibility timeout
+        and_(J.status == models.JobStatus.RUNNING, J.locked_until < now),
+    )
+
+
+def claim(db: Session, limit: int = 1) -> List[models.Job]:
+    """
+    Take up to limit due jobs, oldest first. One UPDATE marks them with a
+    fresh claim token, so when workers (in any process) race for the same
+    rows each row goes to exactly one of them; the claimed rows are then
+    read back by token.
+    """
+    J = models.Job
+    now = datetime.now()
+    token = uuid.uuid4().hex
+    due = select(J.job_id).where(_claimable(now)).order_by(J.run_at).limit(limit).with_for_update(skip_locked=True)
+    claimed = db.execute(
+        update(J)
+        .where(J.job_id.in_(due.scalar_subquery()), _claimable(now))
+        .values(status=models.JobStatus.RUNNING, attempts=J.attempts + 1, claim_token=token,
+                locked_until=now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT), updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if not claimed:
+        return []
+    return list(db.execute(select(J).where(J.claim_token == token).order_by(J.run_at)).scalars())
+
+
+def claim_next(limit: int = 1) -> List[models.Job]:
+    with SessionLocal() as db:
+        return claim(db, limit)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, so failures against one provider spread out"""
+    delay = min(settings.JOB_RETRY_MAX_DELAY, settings.JOB_RETRY_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def run(job: models.Job) -> Optional[str]:
+    """
+    Run a claimed job's handler and return the error, or None on success.
+    Coroutine handlers run on the event loop; plain functions on job_executor.
+    """
+    run_handler = HANDLERS.get(job.kind)
+    if run_handler is None:
+        return f"LookupError: No handler for job kind {job.kind!r}"
+    if job.attempts > job.max_attempts:
+        # reclaimed after its last attempt overran the visibility timeout
+        return job.last_error or "Visibility timeout expired on the last attempt"
+    arguments = json.loads(job.payload or "{}")
+    reset = current_job.set(job)
+    try:
+        if asyncio.iscoroutinefunction(run_handler):
+            await run_handler(**arguments)
+        else:
+            context = contextvars.copy_context()
+            await asyncio.get_running_loop().run_in_executor(
+                job_executor, functools.partial(context.run, run_handler, **arguments)
+            )
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    finally:
+        current_job.reset(reset)
+    return None
+
+
+def _outcome(job: models.Job, error: Optional[str], now: datetime) -> dict:
+    """Column values for a finished attempt: succeeded, due for a retry, or dead"""
+    if error is None:
+        return {"status": models.JobStatus.SUCCEEDED, "last_error": None, "finished_at": now}
+    if job.kind not in HANDLERS or job.attempts >= job.max_attempts:
+        logger.error("Job %s (%s) failed for good after %s attempts: %s", job.job_id, job.kind, job.attempts, error)
+        return {"status": models.JobStatus.FAILED, "last_error": error, "finished_at": now}
+    delay = retry_delay(job.attempts)
+    logger.warning("Job %s (%s) attempt %s failed, retrying in %.0fs: %s", job.job_id, job.kind, job.attempts, delay, error)
+    return {"status": models.JobStatus.QUEUED, "last_error": error, "run_at": now + timedelta(seconds=delay)}
+
+
+def record(outcomes: List[Tuple[models.Job, Optional[str]]]) -> int:
+    """
+    Store the outcome of each (job, error) attempt in one transaction.
+    Jobs reclaimed meanwhile (their claim token changed) are left alone.
+    Returns the number of outcomes stored.
+    """
+    J = models.Job
+    now = datetime.now()
+    stored = 0
+    with SessionLocal() as db:
+        for job, error in outcomes:
+            stored += db.execute(
+                update(J)
+                .where(J.job_id == job.job_id, J.claim_token == job.claim_token, J.status == models.JobStatus.RUNNING)
+                .values(locked_until=None, updated_at=now, **_outcome(job, error, now))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.commit()
+    return stored
+
+
+async def process_batch(limit: Optional[int] = None) -> int:
+    """Claim a batch, run its jobs concurrently and record the outcomes; returns the batch size"""
+    loop = asyncio.get_running_loop()
+    batch = await loop.run_in_executor(job_executor, claim_next, limit or settings.JOB_BATCH_SIZE)
+    if not batch:
+        return 0
+    errors = await asyncio.gather(*(run(job) for job in batch))
+    await loop.run_in_executor(job_executor, record, list(zip(batch, errors)))
+    return len(batch)
+
+
+async def worker(poll_interval: Optional[float] = None):
+    """One member of the worker pool: drain due jobs batch by batch, then poll"""
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    while True:
+        try:
+            busy = await process_batch()
+        except Exception:
+            logger.exception("Job worker iteration failed")
+            busy = 0
+        if not busy:
+            await asyncio.sleep(poll_interval)
+
+
+def start_workers(count: Optional[int] = None) -> List[asyncio.Task]:
+    count = settings.JOB_WORKERS if count is None else count
+    return [asyncio.create_task(worker()) for _ in range(count)]
+
+
+# -----------------------------
+# Administration
+# -----------------------------
+def counts(db: Session) -> Dict[str, int]:
+    """Number of jobs per status"""
+    J = models.Job
+    rows = db.execute(select(J.status, func.count()).group_by(J.status)).all()
+    result = {status.value: 0 for status in models.JobStatus}
+    result.update({status.value: count for status, count in rows})
+    return result
+
+
+def stats(db: Session) -> Dict[str, object]:
+    """Backlog and delivery throughput, from index range counts"""
+    J = models.Job
+    now = datetime.now()
+
+    def finished_since(status, seconds):
+        return select(func.count()).select_from(J).where(
+            J.status == status, J.finished_at >= now - timedelta(seconds=seconds)
+        ).scalar_subquery()
+
+    row = db.execute(select(
+        select(func.count()).select_from(J).where(
+            J.status == models.JobStatus.QUEUED, J.run_at <= now
+        ).scalar_subquery().label("due"),
+        select(func.count()).select_from(J).where(
+            J.status == models.JobStatus.QUEUED, J.run_at > now
+        ).scalar_subquery().label("waiting_to_retry"),
+        select(func.min(J.run_at)).where(
+            J.status == models.JobStatus.QUEUED, J.run_at <= now
+        ).scalar_subquery().label("oldest_due"),
+        finished_since(models.JobStatus.SUCCEEDED, 60).label("succeeded_last_minute"),
+        finished_since(models.JobStatus.SUCCEEDED, 3600).label("succeeded_last_hour"),
+        finished_since(models.JobStatus.FAILED, 3600).label("failed_last_hour"),
+    )).one()
+    return {
+        "by_status": counts(db),
+        "backlog": {
+            "due": row.due,
+            "waiting_to_retry": row.waiting_to_retry,
+            "oldest_due_seconds": round((now - row.oldest_due).total_seconds(), 1) if row.oldest_due else 0,
+        },
+        "throughput": {
+            "succeeded_last_minute": row.succeeded_last_minute,
+            "succeeded_per_second": round(row.succeeded_last_minute / 60, 2),
+            "succeeded_last_hour": row.succeeded_last_hour,
+            "failed_last_hour": row.failed_last_hour,
+        },
+    }
+
+
+def requeue(db: Session, job_id: int) -> bool:
+    """Give a dead (FAILED) job a fresh set of attempts"""
+    J = models.Job
+    requeued = db.execute(
+        update(J)
+        .where(J.job_id == job_id, J.status == models.JobStatus.FAILED)
+        .values(status=models.JobStatus.QUEUED, attempts=0, run_at=datetime.now(),
+                finished_at=None, updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(requeued)
@@ -0,0 +1,110 @@
+from collections import deque
+from typing import Any, Dict, Iterator, List, NamedTuple
+
+# Endings a keyword may carry and still count as a whole-word match
+# ("depress" matches "depressed" and "depression", "see" not "disease")
+WORD_SUFFIXES = ("s", "es", "ed", "ing", "ion", "ions", "ive", "ness", "ful")
+
+# Words a keyword may be joined to as is ("head" matches "headache", "heart"
+# matches "heartburn")
+COMPOUND_ENDINGS = ("ache", "aches", "burn")
+
+# Compound words of particular keywords that the substring rules used to
+# catch; each also matches with a plural s
+COMPOUNDS = {
+    "nose": ("nosebleed",),
+    "eye": ("eyeball", "eyelid", "eyesight", "eyestrain"),
+    "ear": ("eardrum", "earlobe", "earwax"),
+    "heart": ("heartbeat",),
+    "bone": ("backbone", "breastbone", "cheekbone", "collarbone", "hipbone", "jawbone", "shinbone", "tailbone"),
+}
+
+
+class Match(NamedTuple):
+    start: int  # offset of the matched word in the text
+    table: str
+    keyword: str
+    value: Any
+
+
+def word_forms(keyword: str) -> Iterator[str]:
+    """
+    The keyword, its suffixed forms and its compounds; a silent e is dropped
+    before a vowel suffix ("fracture" -> "fracturing")
+    """
+    yield keyword
+    stem = keyword[:-1] if keyword.endswith("e") and not keyword.endswith("ee") else keyword
+    for suffix in WORD_SUFFIXES:
+        yield (stem if suffix[0] in "aeiou" else keyword) + suffix
+    for ending in COMPOUND_ENDINGS:
+        yield keyword + ending
+    for compound in COMPOUNDS.get(keyword, ()):
+        yield compound
+        yield compound + "s"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over named keyword tables (keyword -> value).
+    find() reports every whole-word occurrence of every keyword in one pass
+    over the text, whatever the number of keywords. The automaton is
+    immutable: to change the tables, build a new matcher and swap it in.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]]):
+        # Trie of all word forms: per node its transitions, failure link and
+        # the (length, table, keyword, value) outputs ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[list] = [[]]
+        self.size = 0
+        for table, keywords in tables.items():
+            for keyword, value in keywords.items():
+                for form in set(word_forms(keyword.lower())):
+                    self._add(form, (len(form), table, keyword, value))
+                self.size += 1
+        self._link()
+
+    def _add(self, form: str, output: tuple):
+        node = 0
+        for char in form:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][char] = child
+            node = child
+        self._out[node].append(output)
+
+    def _link(self):
+        """Failure links, breadth first: the longest proper suffix of each node that is also in the trie"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Match]:
+        """Whole-word keyword occurrences in text (case-insensitive), in order of their end"""
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not out[node] or (end + 1 < len(text) and text[end + 1].isalnum()):
+                continue
+            for length, table, keyword, value in out[node]:
+                start = end - length + 1
+                if start == 0 or not text[start - 1].isalnum():
+                    matches.append(Match(start, table, keyword, value))
+        return matches
@@ -1,24 +1,38 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, APIRouter, Response
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter
 from typing import List, Optional
 from datetime import datetime, timedelta
 import os
 import shutil
+import functools
 import json
+import asyncio
+import logging
 
 # Import our modules
-import models, schemas, crud, auth
-from database import SessionLocal, engine, get_db
+import models, schemas, crud, async_crud, auth, notifications
+from database import (SessionLocal, AsyncSessionLocal, engine, get_db, get_async_db, get_read_db,
+                      open_read_session, open_async_read_session, is_sqlite, REPLICA_MAX_LAG_SECONDS)
 from ai_symptom_checker import analyze_symptoms
+from scheduling import free_slots, local_naive, MAX_WINDOW_DAYS
 from video_consultation import create_google_meet_link, send_video_consultation_emails
-from notifications import send_appointment_confirmation, send_appointment_reminder, send_prescription_ready_notification
+from notifications import send_appointment_reminder
 from telephony import handle_incoming_call, schedule_appointment_from_call
 from config import settings
 from fastapi.middleware.cors import CORSMiddleware
 from dashboard_api import dashboard_router
+import activity
+import dashboard_counters
+import jobs
+import rollups
+from cache import directory_cache
 
 origins = [
     "http://localhost:5173",  # your frontend URL
@@ -27,6 +41,10 @@ origins = [
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
+# Accounts inserted outside crud (seed scripts, older databases) need identities to log in
+with SessionLocal() as db:
+    crud.sync_identities(db)
+
 # Create FastAPI application
 app = FastAPI(
     title=settings.APP_NAME,
@@ -43,14 +61,119 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
 app.include_router(dashboard_router)
 
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_dashboard_counters_periodically():
+    """Recount the dashboard counters at startup, then every DASHBOARD_RECONCILE_INTERVAL seconds"""
+    while True:
+        try:
+            await run_in_threadpool(dashboard_counters.reconcile_in_new_session)
+        except Exception:
+            logger.exception("Dashboard counter reconciliation failed")
+        if settings.DASHBOARD_RECONCILE_INTERVAL <= 0:
+            return
+        await asyncio.sleep(settings.DASHBOARD_RECONCILE_INTERVAL)
+
+
+async def backfill_empty_tables():
+    """Rollup and feed tables created by create_all next to existing data start out empty"""
+    for backfill in (rollups.backfill_if_empty, activity.backfill_if_empty):
+        try:
+            await run_in_threadpool(backfill)
+        except Exception:
+            logger.exception("Backfill %s.%s failed", backfill.__module__, backfill.__name__)
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    app.state.background_jobs = [
+        asyncio.create_task(reconcile_dashboard_counters_periodically()),
+        asyncio.create_task(backfill_empty_tables()),
+        *jobs.start_workers(),
+    ]
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for job in app.state.background_jobs:
+        job.cancel()
+    await notifications.close_providers()
+
 # Create upload directory if it doesn't exist
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
+def paged(response: Response, page):
+    """Unpack a (items, next_cursor) page, advertising the cursor in a header"""
+    items, next_cursor = page
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+def fetch_page(fetch, *args, **kwargs):
+    try:
+        return fetch(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def afetch_page(fetch, *args, **kwargs):
+    try:
+        return await fetch(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+doctor_list_adapter = TypeAdapter(List[schemas.Doctor])
+hospital_list_adapter = TypeAdapter(List[schemas.Hospital])
+
+# aiosqlite runs each connection's queries on a thread of its own, and on
+# SQLite the AsyncSession endpoints came out slower than sync sessions on the
+# threadpool, p99 included (benchmark_async_sessions.py). So on SQLite the
+# read endpoints below run their sync query on the threadpool, and only
+# networked databases get the AsyncSession path.
+ASYNC_READS = not is_sqlite
+
+async def run_read(fetch, afetch, render, *args, replica: bool = False):
+    """
+    render(rows) for the rows of fetch(db, *args) on a sync session in the
+    threadpool, or of afetch(db, *args) on an AsyncSession when ASYNC_READS.
+    render runs while the session is open. replica reads from a read
+    replica when one is configured, else from the primary.
+    """
+    if not ASYNC_READS:
+        def run():
+            with (open_read_session() if replica else SessionLocal()) as db:
+                return render(fetch(db, *args))
+        return await run_in_threadpool(run)
+    db = await open_async_read_session() if replica else AsyncSessionLocal()
+    async with db:
+        return render(await afetch(db, *args))
+
+async def cached_response(key: tuple, fetch, afetch, render, *args):
+    """
+    Serve a public directory response from the cache. On a miss
+    run_read(fetch, afetch, render, *args) builds (json_bytes, next_cursor),
+    which is stored as-is so hits skip both the database and Pydantic
+    serialization. Misses read a replica, except within
+    REPLICA_MAX_LAG_SECONDS of an invalidation, when the replica may not
+    have the change yet and would put the old rows back in the cache for a
+    full TTL.
+    """
+    entry = directory_cache.get(key)
+    if entry is None:
+        generation = directory_cache.generation(key[0])
+        replica = not directory_cache.invalidated_within(key[0], REPLICA_MAX_LAG_SECONDS)
+        entry = await run_read(fetch, afetch, render, *args, replica=replica)
+        directory_cache.set(key, entry, generation=generation)
+    body, next_cursor = entry
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -71,7 +194,7 @@ async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.run_in_login_pool(crud.authenticate_user, db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,7 +203,7 @@ async def login_for_access_token(
         )
     
     # Determine role for token
-    if hasattr(user, 'role'):
+    if getattr(user, 'role', None):
         role = user.role
     else:
         # Default role based on model type
@@ -92,9 +215,11 @@ async def login_for_access_token(
             role = schemas.UserRole.USER
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    _, key = models.PRINCIPALS[models.UserRole(role)]
     access_token = auth.create_access_token(
-    data={"email": user.email, "role": user.role},
-    expires_delta=access_token_expires
+    data={"email": user.email, "role": role},
+    expires_delta=access_token_expires,
+    principal_id=getattr(user, key)
 )
 
     return {"access_token": access_token, "token_type": "bearer"}
@@ -102,8 +227,7 @@ async def login_for_access_token(
 # User endpoints
 @app.post("/users/", response_model=schemas.User)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
+    if crud.get_identity_by_email(db, email=user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     return crud.create_user(db=db, user=user)
 
@@ -112,7 +236,7 @@ def read_users(
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     # Only admins can list all users
     if not hasattr(current_user, 'role') or current_user.role != schemas.UserRole.ADMIN:
@@ -120,59 +244,103 @@ def read_users(
     return crud.get_users(db, skip=skip, limit=limit)
 
 @app.get("/users/me/", response_model=schemas.User)
-async def read_users_me(current_user: schemas.User = Depends(auth.get_current_user)):
-    return current_user
+async def read_users_me(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.Principal = Depends(auth.get_current_user)
+):
+    return await async_crud.get_principal(db, current_user.role, current_user.principal_id)
 
 @app.put("/users/me/", response_model=schemas.User)
 def update_user_me(
     user_update: schemas.UserUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     return crud.update_user(db, current_user.user_id, user_update)
 
 # Doctor endpoints
 @app.post("/doctors/", response_model=schemas.Doctor)
 def create_doctor(doctor: schemas.DoctorCreate, db: Session = Depends(get_db)):
-    db_doctor = crud.get_doctor_by_email(db, email=doctor.email)
-    if db_doctor:
+    if crud.get_identity_by_email(db, email=doctor.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     return crud.create_doctor(db=db, doctor=doctor)
 
 @app.get("/doctors/", response_model=List[schemas.Doctor])
-def read_doctors(
+async def read_doctors(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
 ):
     # Only return approved doctors for public access
-    return crud.get_approved_doctors(db)[skip:skip+limit]
+    def render(page):
+        doctors, next_cursor = page
+        return doctor_list_adapter.dump_json(doctor_list_adapter.validate_python(doctors, from_attributes=True)), next_cursor
+    return await cached_response(
+        ("doctors", "list", skip, limit, cursor),
+        functools.partial(fetch_page, crud.get_approved_doctors),
+        functools.partial(afetch_page, async_crud.get_approved_doctors),
+        render, skip, limit, cursor,
+    )
 
 @app.get("/doctors/{doctor_id}", response_model=schemas.Doctor)
-def read_doctor(doctor_id: int, db: Session = Depends(get_db)):
-    db_doctor = crud.get_doctor(db, doctor_id=doctor_id)
-    if db_doctor is None:
-        raise HTTPException(status_code=404, detail="Doctor not found")
-    return db_doctor
+async def read_doctor(doctor_id: int):
+    def render(db_doctor):
+        if db_doctor is None:
+            raise HTTPException(status_code=404, detail="Doctor not found")
+        return schemas.Doctor.model_validate(db_doctor).model_dump_json().encode(), None
+    return await cached_response(("doctors", doctor_id), crud.get_doctor, async_crud.get_doctor, render, doctor_id)
 
 @app.get("/doctors/me/", response_model=schemas.Doctor)
-async def read_doctors_me(current_doctor: schemas.Doctor = Depends(auth.get_current_doctor)):
-    return current_doctor
+async def read_doctors_me(
+    db: AsyncSession = Depends(get_async_db),
+    current_doctor: schemas.Principal = Depends(auth.get_current_doctor)
+):
+    return await async_crud.get_doctor(db, current_doctor.doctor_id)
 
 @app.put("/doctors/me/", response_model=schemas.Doctor)
 def update_doctor_me(
     doctor_update: schemas.DoctorUpdate,
     db: Session = Depends(get_db),
-    current_doctor: schemas.Doctor = Depends(auth.get_current_doctor)
+    current_doctor: schemas.Principal = Depends(auth.get_current_doctor)
 ):
     return crud.update_doctor(db, current_doctor.doctor_id, doctor_update)
 
+@app.put("/doctors/me/availability", response_model=schemas.DoctorAvailability)
+def update_doctor_availability_me(
+    availability: schemas.DoctorAvailability,
+    db: Session = Depends(get_db),
+    current_doctor: schemas.Principal = Depends(auth.get_current_doctor)
+):
+    return crud.set_doctor_availability(db, current_doctor.doctor_id, availability)
+
+@app.get("/doctors/{doctor_id}/availability", response_model=schemas.DoctorAvailability)
+def read_doctor_availability(doctor_id: int, db: Session = Depends(get_read_db)):
+    if crud.get_doctor(db, doctor_id=doctor_id) is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return crud.get_doctor_availability(db, doctor_id)
+
+@app.get("/doctors/{doctor_id}/slots", response_model=List[schemas.TimeSlot])
+def read_doctor_slots(
+    doctor_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db)
+):
+    # Slots are naive local time; an aware from/to (e.g. ...Z) is converted to it
+    start = local_naive(start) if start else datetime.now()
+    end = local_naive(end) if end else start + timedelta(days=7)
+    if end <= start or end - start > timedelta(days=MAX_WINDOW_DAYS):
+        raise HTTPException(status_code=400, detail=f"'to' must be after 'from' and at most {MAX_WINDOW_DAYS} days later")
+    if crud.get_doctor(db, doctor_id=doctor_id) is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return [schemas.TimeSlot(start=slot_start, end=slot_end) for slot_start, slot_end in free_slots(db, doctor_id, start, end)]
+
 # Hospital endpoints
 @app.post("/hospitals/", response_model=schemas.Hospital)
 def create_hospital(
     hospital: schemas.HospitalCreate, 
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     # Only admins and doctors can create hospitals
     if not hasattr(current_user, 'role') or (
@@ -183,49 +351,74 @@ def create_hospital(
     return crud.create_hospital(db=db, hospital=hospital)
 
 @app.get("/hospitals/", response_model=List[schemas.Hospital])
-def read_hospitals(
+async def read_hospitals(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
 ):
     # Only return approved hospitals for public access
-    return crud.get_approved_hospitals(db)[skip:skip+limit]
+    def render(page):
+        hospitals, next_cursor = page
+        return hospital_list_adapter.dump_json(hospital_list_adapter.validate_python(hospitals, from_attributes=True)), next_cursor
+    return await cached_response(
+        ("hospitals", "list", skip, limit, cursor),
+        functools.partial(fetch_page, crud.get_approved_hospitals),
+        functools.partial(afetch_page, async_crud.get_approved_hospitals),
+        render, skip, limit, cursor,
+    )
+
+@app.get("/hospitals/nearby", response_model=List[schemas.NearbyHospital])
+def read_nearby_hospitals(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(25, gt=0, le=500),
+    k: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    # Patients search by location far more than by name
+    return [
+        schemas.NearbyHospital(
+            **schemas.Hospital.model_validate(hospital).model_dump(),
+            distance_km=round(distance, 3)
+        )
+        for hospital, distance in crud.get_nearby_hospitals(db, lat, lng, radius_km, k)
+    ]
 
 @app.get("/hospitals/{hospital_id}", response_model=schemas.Hospital)
-def read_hospital(hospital_id: int, db: Session = Depends(get_db)):
-    db_hospital = crud.get_hospital(db, hospital_id=hospital_id)
-    if db_hospital is None:
-        raise HTTPException(status_code=404, detail="Hospital not found")
-    return db_hospital
+async def read_hospital(hospital_id: int):
+    def render(db_hospital):
+        if db_hospital is None:
+            raise HTTPException(status_code=404, detail="Hospital not found")
+        return schemas.Hospital.model_validate(db_hospital).model_dump_json().encode(), None
+    return await cached_response(("hospitals", hospital_id), crud.get_hospital, async_crud.get_hospital, render, hospital_id)
 
 # Appointment endpoints
+def appointment_to_schema(a: models.Appointment) -> schemas.Appointment:
+    """Build the appointment response from a row whose user is already loaded"""
+    return schemas.Appointment(
+        appointment_id=a.appointment_id,
+        user=schemas.UserInfo(user_id=a.user.user_id, full_name=a.user.name),
+        appointment_time=a.appointment_time.isoformat(),
+        status=a.status,
+        appointment_type=a.appointment_type,
+        duration=a.duration,
+        symptoms=a.symptoms,
+        notes=a.notes,
+        video_link=a.video_link
+    )
+
 # -------------------------------
 # GET all appointments
 # -------------------------------
 @app.get("/appointments", response_model=List[schemas.Appointment])
-def get_appointments(db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
-    if current_user.role == schemas.UserRole.USER:
-        appointments = db.query(models.Appointment).filter(models.Appointment.user_id == current_user.user_id).all()
-    elif current_user.role == schemas.UserRole.DOCTOR:
-        appointments = db.query(models.Appointment).filter(models.Appointment.doctor_id == current_user.doctor_id).all()
-    else:  # Admin
-        appointments = db.query(models.Appointment).all()
-
-    result = []
-    for a in appointments:
-        user = db.query(models.User).filter(models.User.user_id == a.user_id).first()
-        result.append(schemas.Appointment(
-            appointment_id=a.appointment_id,
-            user=schemas.UserInfo(user_id=user.user_id, full_name=user.name),
-            appointment_time=a.appointment_time.isoformat(),
-            status=a.status,
-            appointment_type=a.appointment_type,
-            duration=a.duration,
-            symptoms=a.symptoms,
-            notes=a.notes,
-            video_link=a.video_link
-        ))
-    return result
+async def get_appointments(current_user: schemas.Principal = Depends(auth.get_current_user)):
+    # Patients get their own appointments, doctors theirs and admins all:
+    # user_id and doctor_id are None outside their role
+    return await run_read(
+        crud.get_appointments_with_users, async_crud.get_appointments_with_users,
+        lambda appointments: [appointment_to_schema(a) for a in appointments],
+        current_user.user_id, current_user.doctor_id,
+    )
 
 # -------------------------------
 # CREATE appointment
@@ -233,25 +426,16 @@ def get_appointments(db: Session = Depends(get_db), current_user: schemas.User =
 @app.post("/appointments", response_model=schemas.Appointment)
 def create_appointment(appointment_create: schemas.AppointmentCreate,
                        db: Session = Depends(get_db),
-                       current_user: schemas.User = Depends(auth.get_current_user)):
+                       current_user: schemas.Principal = Depends(auth.get_current_user)):
     # Users can only create for themselves
     if current_user.role == schemas.UserRole.USER and appointment_create.user_id != current_user.user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    new_appt = crud.create_appointment(db, appointment_create)
-    user = db.query(models.User).filter(models.User.user_id == new_appt.user_id).first()
-
-    return schemas.Appointment(
-        appointment_id=new_appt.appointment_id,
-        user=schemas.UserInfo(user_id=user.user_id, full_name=user.name),
-        appointment_time=new_appt.appointment_time.isoformat(),
-        status=new_appt.status,
-        appointment_type=new_appt.appointment_type,
-        duration=new_appt.duration,
-        symptoms=new_appt.symptoms,
-        notes=new_appt.notes,
-        video_link=new_appt.video_link
-    )
+    try:
+        new_appt = crud.create_appointment(db, appointment_create)
+    except crud.SlotUnavailableError:
+        raise HTTPException(status_code=409, detail="The doctor is already booked at this time")
+    return appointment_to_schema(new_appt)
 
 # -------------------------------
 
@@ -261,7 +445,10 @@ def create_appointment(appointment_create: schemas.AppointmentCreate,
 # -----------------------------
 @app.put("/appointments/{appointment_id}")
 def update_appointment(appointment_id: int, appointment_update: schemas.AppointmentUpdate, db: Session = Depends(get_db)):
-    updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)  # ✅ pass id, not object
+    try:
+        updated_appointment = crud.update_appointment(db, appointment_id, appointment_update)  # ✅ pass id, not object
+    except crud.SlotUnavailableError:
+        raise HTTPException(status_code=409, detail="The doctor is already booked at this time")
     if not updated_appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     return updated_appointment
@@ -275,7 +462,7 @@ def update_appointment(appointment_id: int, appointment_update: schemas.Appointm
 def update_appointment(appointment_id: int,
                        appointment_update: schemas.AppointmentUpdate,
                        db: Session = Depends(get_db),
-                       current_user: schemas.User = Depends(auth.get_current_user)):
+                       current_user: schemas.Principal = Depends(auth.get_current_user)):
     appointment = crud.get_appointment(db, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -286,7 +473,10 @@ def update_appointment(appointment_id: int,
     if current_user.role == schemas.UserRole.DOCTOR and appointment.doctor_id != current_user.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    updated_appointment = crud.update_appointment(db, appointment, appointment_update)
+    try:
+        updated_appointment = crud.update_appointment(db, appointment, appointment_update)
+    except crud.SlotUnavailableError:
+        raise HTTPException(status_code=409, detail="The doctor is already booked at this time")
     return updated_appointment
 
 
@@ -297,7 +487,7 @@ def update_appointment(appointment_id: int,
 def update_appointment_status(appointment_id: int,
                               status_update: schemas.AppointmentStatus,
                               db: Session = Depends(get_db),
-                              current_user: schemas.User = Depends(auth.get_current_user)):
+                              current_user: schemas.Principal = Depends(auth.get_current_user)):
     appointment = crud.get_appointment(db, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -306,7 +496,10 @@ def update_appointment_status(appointment_id: int,
     if current_user.role == schemas.UserRole.DOCTOR and appointment.doctor_id != current_user.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    updated_appointment = crud.update_appointment_status(db, appointment_id, status_update)
+    try:
+        updated_appointment = crud.update_appointment_status(db, appointment_id, status_update)
+    except crud.SlotUnavailableError:
+        raise HTTPException(status_code=409, detail="The doctor is already booked at this time")
     return updated_appointment
 
 
@@ -323,8 +516,8 @@ def delete_appointment(appointment_id: int, db: Session = Depends(get_db)):
 # Get all medical records for current user
 @app.get("/medical-records", response_model=List[schemas.MedicalRecord])
 def get_medical_records(
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     records = crud.get_user_medical_records(db, current_user.user_id)
     return records
@@ -333,35 +526,33 @@ def get_medical_records(
 def create_prescription(
     prescription: schemas.PrescriptionCreate,
     db: Session = Depends(get_db),
-    current_doctor: schemas.Doctor = Depends(auth.get_current_doctor)
+    current_doctor: schemas.Principal = Depends(auth.get_current_doctor)
 ):
     # Check if doctor is associated with the appointment
     appointment = crud.get_appointment(db, prescription.appointment_id)
     if appointment.doctor_id != current_doctor.doctor_id:
         raise HTTPException(status_code=403, detail="Not authorized to create prescription for this appointment")
     
-    created_prescription = crud.create_prescription(db=db, prescription=prescription)
-    
-    # Send notification to patient
-    send_prescription_ready_notification(created_prescription)
-    
-    return created_prescription
+    # The patient's notification is queued with the prescription (see outbox.py)
+    return crud.create_prescription(db=db, prescription=prescription)
 
 @app.get("/prescriptions/", response_model=List[schemas.Prescription])
 def read_prescriptions(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     # Users can only see their own prescriptions
-    return crud.get_user_prescriptions(db, current_user.user_id)[skip:skip+limit]
+    return paged(response, fetch_page(crud.get_user_prescriptions, db, current_user.user_id, skip, limit, cursor))
 
 @app.get("/prescriptions/{prescription_id}", response_model=schemas.Prescription)
 def read_prescription(
     prescription_id: int, 
-    db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     db_prescription = crud.get_prescription(db, prescription_id=prescription_id)
     if db_prescription is None:
@@ -378,7 +569,7 @@ def read_prescription(
 def check_symptoms(
     symptom_request: schemas.SymptomAnalysisRequest,
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     # Analyze symptoms using AI service
     analysis = analyze_symptoms(symptom_request.symptoms, db)
@@ -402,23 +593,25 @@ def check_symptoms(
 @app.post("/doctors/search", response_model=List[schemas.Doctor])
 def search_doctors(
     search: schemas.DoctorSearch,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    doctors = crud.search_doctors(db, search)
-    return doctors[skip:skip+limit]
+    return paged(response, fetch_page(crud.search_doctors, db, search, skip, limit, cursor))
 
 # Hospital search endpoint
 @app.post("/hospitals/search", response_model=List[schemas.Hospital])
 def search_hospitals(
     search: schemas.HospitalSearch,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
 ):
-    hospitals = crud.search_hospitals(db, search)
-    return hospitals[skip:skip+limit]
+    return paged(response, fetch_page(crud.search_hospitals, db, search, skip, limit, cursor))
 
 # Admin endpoints
 @app.get("/admin/pending-doctors", response_model=List[schemas.Doctor])
@@ -426,7 +619,7 @@ def get_pending_doctors(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(auth.get_current_admin)
+    current_admin: schemas.Principal = Depends(auth.get_current_admin)
 ):
     # Get doctors with pending status
     pending_doctors = db.query(models.Doctor).filter(
@@ -440,7 +633,7 @@ def get_pending_hospitals(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(auth.get_current_admin)
+    current_admin: schemas.Principal = Depends(auth.get_current_admin)
 ):
     # Get hospitals with pending status
     pending_hospitals = db.query(models.Hospital).filter(
@@ -453,7 +646,7 @@ def get_pending_hospitals(
 def approve_doctor(
     doctor_id: int,
     db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(auth.get_current_admin)
+    current_admin: schemas.Principal = Depends(auth.get_current_admin)
 ):
     return crud.update_doctor_status(db, doctor_id, models.DoctorStatus.APPROVED)
 
@@ -461,7 +654,7 @@ def approve_doctor(
 def reject_doctor(
     doctor_id: int,
     db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(auth.get_current_admin)
+    current_admin: schemas.Principal = Depends(auth.get_current_admin)
 ):
     return crud.update_doctor_status(db, doctor_id, models.DoctorStatus.REJECTED)
 
@@ -469,7 +662,7 @@ def reject_doctor(
 def approve_hospital(
     hospital_id: int,
     db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(auth.get_current_admin)
+    current_admin: schemas.Principal = Depends(auth.get_current_admin)
 ):
     return crud.update_hospital_status(db, hospital_id, models.HospitalStatus.APPROVED)
 
@@ -477,7 +670,7 @@ def approve_hospital(
 def reject_hospital(
     hospital_id: int,
     db: Session = Depends(get_db),
-    current_admin: schemas.Admin = Depends(auth.get_current_admin)
+    current_admin: schemas.Principal = Depends(auth.get_current_admin)
 ):
     return crud.update_hospital_status(db, hospital_id, models.HospitalStatus.REJECTED)
 
@@ -495,7 +688,7 @@ def schedule_from_call_endpoint(
     call_id: int,
     preferred_time: Optional[str] = Query(None),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_user)
+    current_user: schemas.Principal = Depends(auth.get_current_user)
 ):
     return schedule_appointment_from_call(call_id, preferred_time)
 
@@ -505,7 +698,7 @@ def upload_doctor_document(
     file: UploadFile = File(...),
     document_type: str = Form(...),
     db: Session = Depends(get_db),
-    current_doctor: schemas.Doctor = Depends(auth.get_current_doctor)
+    current_doctor: schemas.Principal = Depends(auth.get_current_doctor)
 ):
     # Check file size
     file.file.seek(0, 2)  # Seek to end of file
@@ -551,14 +744,17 @@ def serve_file(filename: str):
 def send_appointment_reminders(
     hours_before: int = Query(24),
     db: Session = Depends(get_db),
-    current_user: schemas.User = Depends(auth.get_current_admin)  # Only admins can trigger this
+    current_user: schemas.Principal = Depends(auth.get_current_admin)  # Only admins can trigger this
 ):
-    # Get appointments happening in the next {hours_before} hours
-    from datetime import datetime, timedelta
+    """Queue reminders for confirmed appointments in the next hours_before hours; the job workers send them"""
     now = datetime.now()
     reminder_time = now + timedelta(hours=hours_before)
     
-    appointments = db.query(models.Appointment).filter(
+    appointments = db.query(models.Appointment).options(
+        joinedload(models.Appointment.user),
+        joinedload(models.Appointment.doctor),
+        joinedload(models.Appointment.hospital),
+    ).filter(
         models.Appointment.appointment_time >= now,
         models.Appointment.appointment_time <= reminder_time,
         models.Appointment.status == models.AppointmentStatus.CONFIRMED
@@ -567,17 +763,23 @@ def send_appointment_reminders(
     results = []
     for appointment in appointments:
         try:
-            send_appointment_reminder(appointment, hours_before)
+            # Already queued by an earlier call if no jobs were added
+            job_ids = send_appointment_reminder(appointment, hours_before, db=db)
             results.append({
                 "appointment_id": appointment.appointment_id,
-                "status": "success"
+                "status": "queued" if job_ids else "already_queued",
+                "job_ids": job_ids
             })
+        except SQLAlchemyError:
+            # The transaction is unusable now; reporting it per appointment would fail the commit anyway
+            raise
         except Exception as e:
             results.append({
                 "appointment_id": appointment.appointment_id,
                 "status": "error",
                 "error": str(e)
             })
+    db.commit()
     
     return {"results": results}
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Enum, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Date, Time, Float, Enum, Text, ForeignKey, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -52,9 +52,18 @@ class UrgencyLevel(str, enum.Enum):
     HIGH = "HIGH"
     EMERGENCY = "EMERGENCY"
 
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"  # out of attempts (dead letter)
+
 # Users Table (Patients)
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at", "created_at"),
+    )
     
     user_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -78,6 +87,10 @@ class User(Base):
 # Doctors Table
 class Doctor(Base):
     __tablename__ = "doctors"
+    __table_args__ = (
+        Index("ix_doctors_status_specialization", "status", "specialization"),
+        Index("ix_doctors_status_created_at", "status", "created_at"),
+    )
     
     doctor_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -102,10 +115,48 @@ class Doctor(Base):
     hospital = relationship("Hospital", back_populates="doctors")
     appointments = relationship("Appointment", back_populates="doctor")
     documents = relationship("DoctorDocument", back_populates="doctor")
+    availability_rules = relationship("DoctorAvailabilityRule", back_populates="doctor")
+    availability_exceptions = relationship("DoctorAvailabilityException", back_populates="doctor")
+
+# Weekly working hours of a doctor, split into bookable slots
+class DoctorAvailabilityRule(Base):
+    __tablename__ = "doctor_availability_rules"
+    
+    rule_id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    slot_minutes = Column(Integer, default=30)
+    
+    # Relationships
+    doctor = relationship("Doctor", back_populates="availability_rules")
+
+# One-off changes to the weekly rules (leave, extra hours)
+class DoctorAvailabilityException(Base):
+    __tablename__ = "doctor_availability_exceptions"
+    __table_args__ = (
+        Index("ix_doctor_availability_exceptions_doctor_day", "doctor_id", "day"),
+    )
+    
+    exception_id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.doctor_id"), nullable=False)
+    day = Column(Date, nullable=False)
+    start_time = Column(Time)  # both empty = the whole day
+    end_time = Column(Time)
+    is_available = Column(Boolean, default=False)  # True adds hours, False blocks them
+    slot_minutes = Column(Integer, default=30)
+    reason = Column(String(255))
+    
+    # Relationships
+    doctor = relationship("Doctor", back_populates="availability_exceptions")
 
 # Hospitals/Clinics Table
 class Hospital(Base):
     __tablename__ = "hospitals"
+    __table_args__ = (
+        Index("ix_hospitals_status", "status"),
+    )
     
     hospital_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(150), nullable=False)
@@ -126,6 +177,16 @@ class Hospital(Base):
 # Appointments Table
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("ix_appointments_user_time", "user_id", "appointment_time"),
+        Index("ix_appointments_doctor_time", "doctor_id", "appointment_time"),
+        Index("ix_appointments_hospital_time", "hospital_id", "appointment_time"),
+        Index("ix_appointments_status_time", "status", "appointment_time"),
+        Index("ix_appointments_appointment_time", "appointment_time"),
+        Index("ix_appointments_created_at", "created_at"),
+        # One live booking per doctor and start time, enforced by the database
+        Index("ix_appointments_slot_key", "slot_key", unique=True),
+    )
     
     appointment_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
@@ -139,6 +200,7 @@ class Appointment(Base):
     urgency = Column(Enum(UrgencyLevel), default=UrgencyLevel.MEDIUM)
     status = Column(Enum(AppointmentStatus), default=AppointmentStatus.REQUESTED)
     notes = Column(Text)
+    slot_key = Column(String(64))  # "<doctor_id>@<start>", NULL once cancelled
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
@@ -151,6 +213,9 @@ class Appointment(Base):
 # Medical Records Table
 class MedicalRecord(Base):
     __tablename__ = "medical_records"
+    __table_args__ = (
+        Index("ix_medical_records_user_id", "user_id"),
+    )
     
     record_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
@@ -166,6 +231,10 @@ class MedicalRecord(Base):
 # Prescriptions Table
 class Prescription(Base):
     __tablename__ = "prescriptions"
+    __table_args__ = (
+        Index("ix_prescriptions_user_id", "user_id", "prescription_id"),
+        Index("ix_prescriptions_created_at", "created_at"),
+    )
     
     prescription_id = Column(Integer, primary_key=True, index=True)
     appointment_id = Column(Integer, ForeignKey("appointments.appointment_id"))
@@ -199,6 +268,9 @@ class DoctorDocument(Base):
 # Symptom Check Table (AI Chatbot results)
 class SymptomCheck(Base):
     __tablename__ = "symptom_checks"
+    __table_args__ = (
+        Index("ix_symptom_checks_user_id", "user_id"),
+    )
     
     check_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
@@ -221,6 +293,113 @@ class Admin(Base):
     password_hash = Column(String(255), nullable=False)
     role = Column(Enum(UserRole), default=UserRole.ADMIN)
     created_at = Column(DateTime, default=func.now())
+
+# Identities Table: one row per login email, pointing at the user, doctor or admin it belongs to
+class Identity(Base):
+    __tablename__ = "identities"
+
+    identity_id = Column(Integer, primary_key=True, index=True)
+    email = Column(String(100), unique=True, nullable=False)
+    role = Column(Enum(UserRole), nullable=False)
+    principal_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+# Dashboard Counters Table: a single row of running totals for the admin
+# dashboard, bumped in the same transaction as the writes it counts
+class DashboardCounters(Base):
+    __tablename__ = "dashboard_counters"
+
+    counter_id = Column(Integer, primary_key=True)
+    users_total = Column(Integer, nullable=False, default=0)
+    doctors_total = Column(Integer, nullable=False, default=0)
+    doctors_pending = Column(Integer, nullable=False, default=0)
+    doctors_approved = Column(Integer, nullable=False, default=0)
+    doctors_rejected = Column(Integer, nullable=False, default=0)
+    doctors_suspended = Column(Integer, nullable=False, default=0)
+    hospitals_total = Column(Integer, nullable=False, default=0)
+    hospitals_pending = Column(Integer, nullable=False, default=0)
+    hospitals_approved = Column(Integer, nullable=False, default=0)
+    hospitals_rejected = Column(Integer, nullable=False, default=0)
+    appointments_total = Column(Integer, nullable=False, default=0)
+    appointments_requested = Column(Integer, nullable=False, default=0)
+    appointments_confirmed = Column(Integer, nullable=False, default=0)
+    appointments_cancelled = Column(Integer, nullable=False, default=0)
+    appointments_completed = Column(Integer, nullable=False, default=0)
+    appointments_no_show = Column(Integer, nullable=False, default=0)
+    appointments_in_person = Column(Integer, nullable=False, default=0)
+    appointments_video = Column(Integer, nullable=False, default=0)
+    prescriptions_total = Column(Integer, nullable=False, default=0)
+    reconciled_at = Column(DateTime)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Daily rollup tables for the admin trend charts. Keys are stored as plain
+# strings ("UNKNOWN" when unset) so they can be part of the primary key.
+class DailyAppointmentStats(Base):
+    __tablename__ = "daily_appointment_stats"
+
+    day = Column(Date, primary_key=True)  # appointment date
+    status = Column(String(20), primary_key=True)
+    appointment_type = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class DailySymptomCheckStats(Base):
+    __tablename__ = "daily_symptom_check_stats"
+
+    day = Column(Date, primary_key=True)
+    suggested_specialization = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class DailyCallStats(Base):
+    __tablename__ = "daily_call_stats"
+
+    day = Column(Date, primary_key=True)
+    urgency = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# Activity Log Table: append-only feed of notable writes for the admin
+# dashboard. Rows are only ever inserted, so activity_id order is time order.
+class ActivityLog(Base):
+    __tablename__ = "activity_log"
+
+    activity_id = Column(Integer, primary_key=True)
+    activity_type = Column(String(50), nullable=False)
+    message = Column(String(255), nullable=False)
+    entity_id = Column(Integer)
+    created_at = Column(DateTime, nullable=False, default=func.now(), index=True)
+
+# Jobs Table: durable queue of background work, and the outbox of the
+# notifications a write implies (queued in the same transaction), claimed in
+# batches by the worker pool in jobs.py
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index("ix_jobs_status_finished_at", "status", "finished_at"),
+        # The same event never queues the same message twice
+        Index("ix_jobs_idempotency_key", "idempotency_key", unique=True),
+    )
+
+    job_id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(Text)  # JSON keyword arguments of the handler
+    idempotency_key = Column(String(200))
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False)  # not claimed before this time
+    claim_token = Column(String(32))  # set by the claim; outcomes only apply with a matching token
+    locked_until = Column(DateTime)  # a RUNNING job past this is claimable again
+    last_error = Column(Text)
+    finished_at = Column(DateTime)  # when it SUCCEEDED or FAILED
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Role -> (model, primary key attribute) of each kind of account
+PRINCIPALS = {
+    UserRole.USER: (User, "user_id"),
+    UserRole.DOCTOR: (Doctor, "doctor_id"),
+    UserRole.ADMIN: (Admin, "admin_id"),
+}
     
 # Call Bookings Table
 class CallBooking(Base):
@@ -1,7 +1,11 @@
+import asyncio
 import requests
+import httpx
 import json
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException
+from sqlalchemy.orm import Session
+import jobs
 import schemas
 import os
 from dotenv import load_dotenv
@@ -14,88 +18,313 @@ EMAIL_SERVICE_URL = os.getenv("EMAIL_SERVICE_URL")
 SMS_SERVICE_URL = os.getenv("SMS_SERVICE_URL")
 PUSH_SERVICE_URL = os.getenv("PUSH_SERVICE_URL")
 
+SERVICE_URLS = {"email": EMAIL_SERVICE_URL, "sms": SMS_SERVICE_URL, "push": PUSH_SERVICE_URL}
+
+# Most requests the async senders keep in flight per service
+CHANNEL_CONCURRENCY = {
+    "email": int(os.getenv("EMAIL_CONCURRENCY", "20")),
+    "sms": int(os.getenv("SMS_CONCURRENCY", "20")),
+    "push": int(os.getenv("PUSH_CONCURRENCY", "50")),
+}
+
+# Batch endpoints of the services; when set, messages are grouped and sent
+# in batches of up to NOTIFICATION_BATCH_SIZE, or whatever has gathered
+# after NOTIFICATION_BATCH_WAIT seconds
+BATCH_URLS = {
+    "email": os.getenv("EMAIL_BATCH_URL"),
+    "sms": os.getenv("SMS_BATCH_URL"),
+    "push": os.getenv("PUSH_BATCH_URL"),
+}
+BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "100"))
+BATCH_WAIT = float(os.getenv("NOTIFICATION_BATCH_WAIT", "0.05"))
+
 # Template IDs
 APPOINTMENT_CONFIRMATION_TEMPLATE = os.getenv("APPOINTMENT_CONFIRMATION_TEMPLATE")
 APPOINTMENT_REMINDER_TEMPLATE = os.getenv("APPOINTMENT_REMINDER_TEMPLATE")
 PRESCRIPTION_READY_TEMPLATE = os.getenv("PRESCRIPTION_READY_TEMPLATE")
 
-def send_email(to_email: str, subject: str, template_id: str, template_data: dict) -> bool:
-    """
-    Send email using email service
-    """
+def _email_payload(to_email: str, subject: str, template_id: str, template_data: dict) -> dict:
+    return {
+        "to": to_email,
+        "subject": subject,
+        "template_id": template_id,
+        "template_data": template_data
+    }
+
+def _sms_payload(to_phone: str, message: str) -> dict:
+    return {
+        "to": to_phone,
+        "message": message
+    }
+
+def _push_payload(user_id: int, title: str, message: str, data: Optional[dict] = None) -> dict:
+    return {
+        "user_id": user_id,
+        "title": title,
+        "message": message,
+        "data": data or {}
+    }
+
+def _headers() -> dict:
+    """Idempotency-Key of the queued job being delivered, so a retry after a lost response is not sent twice"""
+    key = jobs.delivery_key()
+    return {"Idempotency-Key": key} if key else {}
+
+def _post(url: str, payload: dict):
+    response = requests.post(url, json=payload, headers=_headers(), timeout=10)
+    if response.status_code != 200:
+        raise RuntimeError(f"Notification service answered {response.status_code}")
+
+
+# -----------------------------
+# Blocking delivery (raises on failure)
+# -----------------------------
+def deliver_email(to_email: str, subject: str, template_id: str, template_data: dict):
     if not EMAIL_SERVICE_URL:
         # Fallback: print email details
         print(f"Email to: {to_email}")
         print(f"Subject: {subject}")
         print(f"Template: {template_id}")
         print(f"Data: {json.dumps(template_data, indent=2)}")
-        return True
-    
+        return
+    _post(EMAIL_SERVICE_URL, _email_payload(to_email, subject, template_id, template_data))
+
+def deliver_sms(to_phone: str, message: str):
+    if not SMS_SERVICE_URL:
+        # Fallback: print SMS details
+        print(f"SMS to: {to_phone}")
+        print(f"Message: {message}")
+        return
+    _post(SMS_SERVICE_URL, _sms_payload(to_phone, message))
+
+def deliver_push_notification(user_id: int, title: str, message: str, data: Optional[dict] = None):
+    if not PUSH_SERVICE_URL:
+        # Fallback: print push notification details
+        print(f"Push to user: {user_id}")
+        print(f"Title: {title}")
+        print(f"Message: {message}")
+        print(f"Data: {data}")
+        return
+    _post(PUSH_SERVICE_URL, _push_payload(user_id, title, message, data))
+
+def send_email(to_email: str, subject: str, template_id: str, template_data: dict) -> bool:
+    """
+    Send email using email service, right away
+    """
     try:
-        payload = {
-            "to": to_email,
-            "subject": subject,
-            "template_id": template_id,
-            "template_data": template_data
-        }
-        
-        response = requests.post(EMAIL_SERVICE_URL, json=payload, timeout=10)
-        return response.status_code == 200
+        deliver_email(to_email, subject, template_id, template_data)
+        return True
     except Exception as e:
         print(f"Email service error: {e}")
         return False
 
 def send_sms(to_phone: str, message: str) -> bool:
     """
-    Send SMS using SMS service
+    Send SMS using SMS service, right away
     """
-    if not SMS_SERVICE_URL:
-        # Fallback: print SMS details
-        print(f"SMS to: {to_phone}")
-        print(f"Message: {message}")
-        return True
-    
     try:
-        payload = {
-            "to": to_phone,
-            "message": message
-        }
-        
-        response = requests.post(SMS_SERVICE_URL, json=payload, timeout=10)
-        return response.status_code == 200
+        deliver_sms(to_phone, message)
+        return True
     except Exception as e:
         print(f"SMS service error: {e}")
         return False
 
 def send_push_notification(user_id: int, title: str, message: str, data: Optional[dict] = None) -> bool:
     """
-    Send push notification
+    Send push notification, right away
     """
-    if not PUSH_SERVICE_URL:
-        # Fallback: print push notification details
-        print(f"Push to user: {user_id}")
-        print(f"Title: {title}")
-        print(f"Message: {message}")
-        print(f"Data: {data}")
-        return True
-    
     try:
-        payload = {
-            "user_id": user_id,
-            "title": title,
-            "message": message,
-            "data": data or {}
-        }
-        
-        response = requests.post(PUSH_SERVICE_URL, json=payload, timeout=10)
-        return response.status_code == 200
+        deliver_push_notification(user_id, title, message, data)
+        return True
     except Exception as e:
         print(f"Push service error: {e}")
         return False
 
-def send_appointment_confirmation(appointment: schemas.Appointment, video_link: Optional[str] = None):
+
+# -----------------------------
+# Async delivery over pooled connections (raises on failure)
+# -----------------------------
+class Provider:
+    """
+    One notification service as seen by the async senders: a keep-alive
+    connection pool shared by every request, and a cap on requests in flight
+    so a burst queues here instead of overloading the service
+    """
+
+    def __init__(self, url: str, concurrency: int):
+        self.url = url
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def post(self, payload: dict, headers: Optional[dict] = None) -> httpx.Response:
+        async with self.semaphore:
+            response = await self.client.post(self.url, json=payload, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"Notification service answered {response.status_code}")
+        return response
+
+# channel -> Provider, created on first use inside the running event loop
+_providers: Dict[str, Provider] = {}
+
+def provider(channel: str) -> Provider:
+    if channel not in _providers:
+        _providers[channel] = Provider(SERVICE_URLS[channel], CHANNEL_CONCURRENCY[channel])
+    return _providers[channel]
+
+class Batcher:
+    """
+    Collects one service's messages into batches, one per template, and
+    posts a batch to the service's batch endpoint once it is full or has
+    waited long enough. The endpoint answers {"results": [{"ok": ...,
+    "error": ...}, ...]} in message order, and each sender gets the result
+    for its own recipient.
+    """
+
+    def __init__(self, url: str, concurrency: int, size: int, wait: float):
+        self.size = size
+        self.wait = wait
+        self.provider = Provider(url, concurrency)
+        self.pending: Dict[Optional[str], List[Tuple[dict, asyncio.Future]]] = {}
+        self.timers: Dict[Optional[str], asyncio.TimerHandle] = {}
+        self.sending = set()
+
+    async def send(self, payload: dict, template: Optional[str] = None):
+        """Add a message to its template's batch and wait until it is sent; raises if it was not delivered"""
+        loop = asyncio.get_running_loop()
+        key = jobs.delivery_key()
+        if key:
+            payload = {**payload, "idempotency_key": key}
+        future = loop.create_future()
+        batch = self.pending.setdefault(template, [])
+        batch.append((payload, future))
+        if len(batch) >= self.size:
+            self.flush(template)
+        elif len(batch) == 1:
+            self.timers[template] = loop.call_later(self.wait, self.flush, template)
+        await future
+
+    def flush(self, template: Optional[str]):
+        timer = self.timers.pop(template, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(template, [])
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._post(template, batch))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _post(self, template: Optional[str], batch: List[Tuple[dict, asyncio.Future]]):
+        try:
+            response = await self.provider.post({"template_id": template, "messages": [payload for payload, _ in batch]})
+            results = response.json()["results"]
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch endpoint answered {len(results)} results for {len(batch)} messages")
+        except Exception as e:
+            results = [{"ok": False, "error": f"{type(e).__name__}: {e}"}] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():  # the sender was cancelled
+                continue
+            if result.get("ok"):
+                future.set_result(None)
+            else:
+                future.set_exception(RuntimeError(f"Notification service rejected the message: {result.get('error')}"))
+
+    async def close(self):
+        for template in list(self.pending):
+            self.flush(template)
+        await asyncio.gather(*self.sending, return_exceptions=True)
+        await self.provider.client.aclose()
+
+# channel -> Batcher, for the channels with a batch endpoint
+_batchers: Dict[str, Batcher] = {}
+
+def batcher(channel: str) -> Batcher:
+    if channel not in _batchers:
+        _batchers[channel] = Batcher(BATCH_URLS[channel], CHANNEL_CONCURRENCY[channel], BATCH_SIZE, BATCH_WAIT)
+    return _batchers[channel]
+
+async def close_providers():
+    """Send the open batches and close the pooled connections (on shutdown, or before switching event loops)"""
+    batchers = list(_batchers.values())
+    _batchers.clear()
+    for open_batcher in batchers:
+        await open_batcher.close()
+    providers = list(_providers.values())
+    _providers.clear()
+    for open_provider in providers:
+        await open_provider.client.aclose()
+
+# Queued notifications are delivered by these on the job workers (see jobs.py)
+@jobs.handler("email")
+async def adeliver_email(to_email: str, subject: str, template_id: str, template_data: dict):
+    payload = _email_payload(to_email, subject, template_id, template_data)
+    if BATCH_URLS["email"]:
+        return await batcher("email").send(payload, template_id)
+    if not EMAIL_SERVICE_URL:
+        return deliver_email(to_email, subject, template_id, template_data)
+    await provider("email").post(payload, _headers())
+
+@jobs.handler("sms")
+async def adeliver_sms(to_phone: str, message: str):
+    if BATCH_URLS["sms"]:
+        return await batcher("sms").send(_sms_payload(to_phone, message))
+    if not SMS_SERVICE_URL:
+        return deliver_sms(to_phone, message)
+    await provider("sms").post(_sms_payload(to_phone, message), _headers())
+
+@jobs.handler("push")
+async def adeliver_push_notification(user_id: int, title: str, message: str, data: Optional[dict] = None):
+    if BATCH_URLS["push"]:
+        return await batcher("push").send(_push_payload(user_id, title, message, data))
+    if not PUSH_SERVICE_URL:
+        return deliver_push_notification(user_id, title, message, data)
+    await provider("push").post(_push_payload(user_id, title, message, data), _headers())
+
+ASYNC_DELIVERIES = {"email": adeliver_email, "sms": adeliver_sms, "push": adeliver_push_notification}
+
+async def send_all(*messages) -> List[bool]:
+    """
+    Send (channel, arguments) messages concurrently, each channel within its
+    own concurrency limit. Returns one success flag per message.
+    """
+    async def send(channel: str, arguments: dict) -> bool:
+        try:
+            await ASYNC_DELIVERIES[channel](**arguments)
+            return True
+        except Exception as e:
+            print(f"{channel} service error: {type(e).__name__}: {e}")
+            return False
+    return list(await asyncio.gather(*(send(channel, arguments) for channel, arguments in messages)))
+
+async def asend_email(to_email: str, subject: str, template_id: str, template_data: dict) -> bool:
+    return (await send_all(email_message(to_email, subject, template_id, template_data)))[0]
+
+async def asend_sms(to_phone: str, message: str) -> bool:
+    return (await send_all(sms_message(to_phone, message)))[0]
+
+async def asend_push_notification(user_id: int, title: str, message: str, data: Optional[dict] = None) -> bool:
+    return (await send_all(push_message(user_id, title, message, data)))[0]
+
+
+# -----------------------------
+# Messages
+# -----------------------------
+# (channel, arguments) pairs, queued as jobs or sent with send_all
+def email_message(to_email: str, subject: str, template_id: str, template_data: dict):
+    return ("email", {"to_email": to_email, "subject": subject, "template_id": template_id, "template_data": template_data})
+
+def sms_message(to_phone: str, message: str):
+    return ("sms", {"to_phone": to_phone, "message": message})
+
+def push_message(user_id: int, title: str, message: str, data: Optional[dict] = None):
+    return ("push", {"user_id": user_id, "title": title, "message": message, "data": data})
+
+def appointment_confirmation_messages(appointment: schemas.Appointment, video_link: Optional[str] = None):
     """
-    Send appointment confirmation to patient and doctor
+    Appointment confirmation to patient and doctor
     """
     # Patient notification
     patient_data = {
@@ -107,17 +336,7 @@ def send_appointment_confirmation(appointment: schemas.Appointment, video_link:
         "video_link": video_link or "N/A"
     }
     
-    # Send email to patient
-    send_email(
-        appointment.user.email,
-        "Appointment Confirmation",
-        APPOINTMENT_CONFIRMATION_TEMPLATE,
-        patient_data
-    )
-    
-    # Send SMS to patient
-    sms_message = f"Your appointment with Dr. {appointment.doctor.name} is confirmed for {appointment.appointment_time.strftime('%Y-%m-%d %H:%M')}"
-    send_sms(appointment.user.phone, sms_message)
+    sms_text = f"Your appointment with Dr. {appointment.doctor.name} is confirmed for {appointment.appointment_time.strftime('%Y-%m-%d %H:%M')}"
     
     # Doctor notification
     doctor_data = {
@@ -129,19 +348,17 @@ def send_appointment_confirmation(appointment: schemas.Appointment, video_link:
         "video_link": video_link or "N/A"
     }
     
-    # Send email to doctor
-    send_email(
-        appointment.doctor.email,
-        "New Appointment Scheduled",
-        APPOINTMENT_CONFIRMATION_TEMPLATE,
-        doctor_data
-    )
-    
-    return True
+    return [
+        # Email and SMS to patient
+        email_message(appointment.user.email, "Appointment Confirmation", APPOINTMENT_CONFIRMATION_TEMPLATE, patient_data),
+        sms_message(appointment.user.phone, sms_text),
+        # Email to doctor
+        email_message(appointment.doctor.email, "New Appointment Scheduled", APPOINTMENT_CONFIRMATION_TEMPLATE, doctor_data),
+    ]
 
-def send_appointment_reminder(appointment: schemas.Appointment, hours_before: int = 24):
+def appointment_reminder_messages(appointment: schemas.Appointment, hours_before: int = 24):
     """
-    Send appointment reminder
+    Appointment reminder by email, SMS and push
     """
     reminder_data = {
         "patient_name": appointment.user.name,
@@ -152,31 +369,19 @@ def send_appointment_reminder(appointment: schemas.Appointment, hours_before: in
         "hours_before": hours_before
     }
     
-    # Send email reminder
-    send_email(
-        appointment.user.email,
-        f"Appointment Reminder - {hours_before} hours",
-        APPOINTMENT_REMINDER_TEMPLATE,
-        reminder_data
-    )
+    sms_text = f"Reminder: Your appointment with Dr. {appointment.doctor.name} is in {hours_before} hours ({appointment.appointment_time.strftime('%Y-%m-%d %H:%M')})"
     
-    # Send SMS reminder
-    sms_message = f"Reminder: Your appointment with Dr. {appointment.doctor.name} is in {hours_before} hours ({appointment.appointment_time.strftime('%Y-%m-%d %H:%M')})"
-    send_sms(appointment.user.phone, sms_message)
-    
-    # Send push notification
-    send_push_notification(
-        appointment.user.user_id,
-        "Appointment Reminder",
-        f"Your appointment is in {hours_before} hours",
-        {"appointment_id": appointment.appointment_id}
-    )
-    
-    return True
+    return [
+        email_message(appointment.user.email, f"Appointment Reminder - {hours_before} hours",
+                      APPOINTMENT_REMINDER_TEMPLATE, reminder_data),
+        sms_message(appointment.user.phone, sms_text),
+        push_message(appointment.user.user_id, "Appointment Reminder", f"Your appointment is in {hours_before} hours",
+                     {"appointment_id": appointment.appointment_id}),
+    ]
 
-def send_prescription_ready_notification(prescription: schemas.Prescription):
+def prescription_ready_messages(prescription: schemas.Prescription):
     """
-    Send notification that prescription is ready
+    Notification that prescription is ready, by email, SMS and push
     """
     prescription_data = {
         "patient_name": prescription.user.name,
@@ -185,26 +390,63 @@ def send_prescription_ready_notification(prescription: schemas.Prescription):
         "medications_count": len(json.loads(prescription.medications)) if prescription.medications else 0
     }
     
-    # Send email
-    send_email(
-        prescription.user.email,
-        "Your Prescription is Ready",
-        PRESCRIPTION_READY_TEMPLATE,
-        prescription_data
-    )
-    
-    # Send SMS
-    send_sms(
-        prescription.user.phone,
-        f"Your prescription from Dr. {prescription.doctor.name} is ready. Check your email or app for details."
-    )
-    
-    # Send push notification
-    send_push_notification(
-        prescription.user.user_id,
-        "Prescription Ready",
-        "Your prescription is now available",
-        {"prescription_id": prescription.prescription_id}
-    )
-    
-    return True
\ No newline at end of file
+    return [
+        email_message(prescription.user.email, "Your Prescription is Ready", PRESCRIPTION_READY_TEMPLATE, prescription_data),
+        sms_message(prescription.user.phone,
+                    f"Your prescription from Dr. {prescription.doctor.name} is ready. Check your email or app for details."),
+        push_message(prescription.user.user_id, "Prescription Ready", "Your prescription is now available",
+                     {"prescription_id": prescription.prescription_id}),
+    ]
+
+
+# -----------------------------
+# Queued senders (return job ids; with db the jobs commit with the caller's transaction)
+# -----------------------------
+# Event keys: queueing the messages of an event again is a no-op
+def appointment_confirmation_key(appointment) -> str:
+    return f"appointment-confirmed:{appointment.appointment_id}:{appointment.appointment_time:%Y-%m-%dT%H:%M}"
+
+def appointment_reminder_key(appointment, hours_before: int) -> str:
+    return f"appointment-reminder:{appointment.appointment_id}:{hours_before}:{appointment.appointment_time:%Y-%m-%dT%H:%M}"
+
+def prescription_ready_key(prescription) -> str:
+    return f"prescription-ready:{prescription.prescription_id}"
+
+def send_appointment_confirmation(appointment: schemas.Appointment, video_link: Optional[str] = None,
+                                  db: Optional[Session] = None) -> List[int]:
+    return jobs.enqueue(db, *appointment_confirmation_messages(appointment, video_link),
+                        key=appointment_confirmation_key(appointment))
+
+def send_appointment_reminder(appointment: schemas.Appointment, hours_before: int = 24,
+                              db: Optional[Session] = None) -> List[int]:
+    return jobs.enqueue(db, *appointment_reminder_messages(appointment, hours_before),
+                        key=appointment_reminder_key(appointment, hours_before))
+
+def send_prescription_ready_notification(prescription: schemas.Prescription,
+                                         db: Optional[Session] = None) -> List[int]:
+    return jobs.enqueue(db, *prescription_ready_messages(prescription), key=prescription_ready_key(prescription))
+
+
+# -----------------------------
+# Async senders (all channels at once; return one success flag per message)
+# -----------------------------
+async def asend_appointment_confirmation(appointment: schemas.Appointment, video_link: Optional[str] = None) -> List[bool]:
+    return await send_all(*appointment_confirmation_messages(appointment, video_link))
+
+async def asend_appointment_reminder(appointment: schemas.Appointment, hours_before: int = 24) -> List[bool]:
+    return await send_all(*appointment_reminder_messages(appointment, hours_before))
+
+async def asend_prescription_ready_notification(prescription: schemas.Prescription) -> List[bool]:
+    return await send_all(*prescription_ready_messages(prescription))
+
+async def asend_appointment_reminders(appointments: List[schemas.Appointment], hours_before: int = 24) -> Dict[int, List[bool]]:
+    """
+    Reminders for many appointments at once (batched when the services have
+    batch endpoints). Returns appointment_id -> one success flag per message.
+    """
+    messages = [appointment_reminder_messages(appointment, hours_before) for appointment in appointments]
+    sent = iter(await send_all(*(message for per_appointment in messages for message in per_appointment)))
+    return {
+        appointment.appointment_id: [next(sent) for _ in per_appointment]
+        for appointment, per_appointment in zip(appointments, messages)
+    }
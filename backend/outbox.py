@@ -0,0 +1,71 @@
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+import jobs
+import models
+import notifications
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _changed(obj, attribute: str) -> bool:
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+
+def _appointment_confirmed(session: Session, appointment: models.Appointment) -> bool:
+    """Newly confirmed, or moved while confirmed"""
+    if appointment.status != models.AppointmentStatus.CONFIRMED:
+        return False
+    if appointment in session.new:
+        return True
+    return _changed(appointment, "status") or _changed(appointment, "appointment_time")
+
+
+def flush_events(session: Session) -> List[Tuple[str, object]]:
+    """(kind, row) for the notifications implied by the rows this flush writes"""
+    events = []
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, models.Appointment) and _appointment_confirmed(session, obj):
+            events.append(("appointment_confirmed", obj))
+        elif isinstance(obj, models.Prescription) and obj in session.new:
+            events.append(("prescription_ready", obj))
+    return events
+
+
+def _messages(kind: str, obj) -> Tuple[str, list]:
+    if kind == "appointment_confirmed":
+        return (notifications.appointment_confirmation_key(obj),
+                notifications.appointment_confirmation_messages(obj, obj.video_link))
+    return notifications.prescription_ready_key(obj), notifications.prescription_ready_messages(obj)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def collect_flush_notifications(session, flush_context):
+    # Attribute history is only available here, before the flush is finalized
+    session.info.setdefault("outbox", []).extend(flush_events(session))
+
+
+@event.listens_for(SessionLocal, "after_flush_postexec")
+def queue_flush_notifications(session, flush_context):
+    """
+    Queue notifications in the same transaction as the change they announce.
+    The messages are built here, once new rows are persistent and can load
+    the patient and doctor they address.
+    """
+    for kind, obj in session.info.pop("outbox", []):
+        try:
+            key, messages = _messages(kind, obj)
+        except Exception:
+            # e.g. a row missing the patient or doctor its messages address
+            logger.exception("Could not build the %s notifications for %r", kind, obj)
+            continue
+        jobs.enqueue_in_flush(session, *messages, key=key)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def discard_flush_notifications(session):
+    session.info.pop("outbox", None)
@@ -0,0 +1,13 @@
+import base64
+import json
+
+
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"k": key}).encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Return the key stored in an opaque cursor, raising ValueError if malformed"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))["k"]
+    except Exception:
+        raise ValueError("Invalid cursor")
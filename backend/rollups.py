@@ -0,0 +1,178 @@
+from collections import Counter, namedtuple
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+UNKNOWN = "UNKNOWN"
+
+# A per-day count of `model` rows, bucketed by the date of `day_attribute`
+# and the values of `keys` (attribute names shared by model and table)
+Rollup = namedtuple("Rollup", "name table model day_attribute keys")
+
+ROLLUPS = {
+    rollup.name: rollup for rollup in (
+        Rollup("appointments", models.DailyAppointmentStats.__table__, models.Appointment,
+               "appointment_time", ("status", "appointment_type")),
+        Rollup("symptom_checks", models.DailySymptomCheckStats.__table__, models.SymptomCheck,
+               "created_at", ("suggested_specialization",)),
+        Rollup("calls", models.DailyCallStats.__table__, models.CallBooking,
+               "call_timestamp", ("urgency",)),
+    )
+}
+BY_MODEL = {rollup.model: rollup for rollup in ROLLUPS.values()}
+
+
+def _key_value(value) -> str:
+    if value is None:
+        return UNKNOWN
+    return str(getattr(value, "value", value))
+
+
+def _bucket(rollup: Rollup, values: Dict[str, object]) -> Optional[tuple]:
+    day = values[rollup.day_attribute]
+    if day is None:
+        return None
+    return (day.date() if isinstance(day, datetime) else day,) + tuple(_key_value(values[key]) for key in rollup.keys)
+
+
+def _values(obj, attributes, committed: bool):
+    """Attribute values after this flush, or as they were before it"""
+    if not committed:
+        return {attribute: getattr(obj, attribute) for attribute in attributes}
+    state = inspect(obj)
+    values = {}
+    for attribute in attributes:
+        history = state.attrs[attribute].history
+        if history.deleted:
+            values[attribute] = history.deleted[0]
+        elif history.unchanged:
+            values[attribute] = history.unchanged[0]
+        else:
+            values[attribute] = getattr(obj, attribute)
+    return values
+
+
+# -----------------------------
+# Incremental maintenance
+# -----------------------------
+def flush_deltas(session: Session) -> Dict[str, Counter]:
+    """Per-rollup bucket changes implied by the rows this flush writes"""
+    deltas: Dict[str, Counter] = {}
+
+    def add(obj, sign: int, committed: bool):
+        rollup = BY_MODEL[type(obj)]
+        bucket = _bucket(rollup, _values(obj, (rollup.day_attribute,) + rollup.keys, committed))
+        if bucket is not None:
+            deltas.setdefault(rollup.name, Counter())[bucket] += sign
+
+    for obj in session.new:
+        if type(obj) in BY_MODEL:
+            add(obj, 1, committed=False)
+    for obj in session.deleted:
+        if type(obj) in BY_MODEL:
+            add(obj, -1, committed=True)
+    for obj in session.dirty:
+        if type(obj) in BY_MODEL and session.is_modified(obj):
+            add(obj, 1, committed=False)
+            add(obj, -1, committed=True)
+    return {name: Counter({b: d for b, d in counter.items() if d}) for name, counter in deltas.items()}
+
+
+def _increment(conn, rollup: Rollup, bucket: tuple, delta: int):
+    """count += delta for one (day, *keys) row, creating it if needed"""
+    table = rollup.table
+    key = dict(zip(("day",) + rollup.keys, bucket))
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(conn.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(table).values(**key, count=delta)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=list(key), set_={"count": table.c.count + stmt.excluded.count}
+        ))
+        return
+    match = and_(*[table.c[column] == value for column, value in key.items()])
+    if not conn.execute(update(table).where(match).values(count=table.c.count + delta)).rowcount:
+        conn.execute(insert(table).values(**key, count=delta))
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def apply_flush_deltas(session, flush_context):
+    """Update the daily rollups in the same transaction as the rows they count"""
+    deltas = flush_deltas(session)
+    if not deltas:
+        return
+    conn = session.connection()
+    for name, counter in deltas.items():
+        for bucket, delta in counter.items():
+            _increment(conn, ROLLUPS[name], bucket, delta)
+
+
+# -----------------------------
+# Backfill
+# -----------------------------
+def backfill(db: Session, start: Optional[date] = None, end: Optional[date] = None,
+             names: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Rebuild rollup rows for days in [start, end] (all days by default) from
+    the base tables. Returns the number of rollup rows written per rollup.
+    """
+    written = {}
+    for name in names or list(ROLLUPS):
+        rollup = ROLLUPS[name]
+        table, day_column = rollup.table, getattr(rollup.model, rollup.day_attribute)
+        source_filter, rollup_filter = [day_column.isnot(None)], []
+        if start is not None:
+            source_filter.append(day_column >= datetime.combine(start, time.min))
+            rollup_filter.append(table.c.day >= start)
+        if end is not None:
+            source_filter.append(day_column < datetime.combine(end + timedelta(days=1), time.min))
+            rollup_filter.append(table.c.day <= end)
+        keys = [func.coalesce(getattr(rollup.model, key), UNKNOWN) for key in rollup.keys]
+        source = select(func.date(day_column), *keys, func.count()).where(*source_filter).group_by(
+            func.date(day_column), *keys
+        )
+        db.execute(delete(table).where(*rollup_filter))
+        result = db.execute(insert(table).from_select(["day", *rollup.keys, "count"], source))
+        written[name] = result.rowcount
+    db.commit()
+    return written
+
+
+def backfill_if_empty():
+    """Fill rollups that are empty while their source tables are not (e.g. created by create_all)"""
+    with SessionLocal() as db:
+        names = [
+            name for name, rollup in ROLLUPS.items()
+            if db.execute(select(rollup.table.c.day).limit(1)).first() is None
+            and db.execute(select(getattr(rollup.model, rollup.day_attribute)).limit(1)).first() is not None
+        ]
+        return backfill(db, names=names) if names else {}
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def series(db: Session, name: str, key: str, start: date, end: date) -> Dict[str, object]:
+    """Daily counts per value of key over [start, end], zero-filled for charting"""
+    rollup = ROLLUPS[name]
+    table = rollup.table
+    rows = db.execute(
+        select(table.c.day, table.c[key], func.sum(table.c.count))
+        .where(table.c.day >= start, table.c.day <= end)
+        .group_by(table.c.day, table.c[key])
+    ).all()
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    index = {day: i for i, day in enumerate(days)}
+    values: Dict[str, List[int]] = {}
+    for day, value, count in rows:
+        values.setdefault(value, [0] * len(days))[index[day]] += int(count)
+    return {
+        "days": [day.isoformat() for day in days],
+        "series": values,
+        "totals": {value: sum(counts) for value, counts in values.items()},
+    }
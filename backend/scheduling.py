@@ -0,0 +1,209 @@
+import bisect
+import json
+import re
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+DEFAULT_SLOT_MINUTES = 30
+# Appointments starting this long before a window can still overlap it
+MAX_APPOINTMENT_MINUTES = 8 * 60
+MAX_WINDOW_DAYS = 90
+
+Rule = namedtuple("Rule", "weekday start_time end_time slot_minutes")
+Slot = Tuple[datetime, datetime]
+
+
+class IntervalIndex:
+    """
+    Booked [start, end) intervals sorted by start. A running maximum of the
+    end times answers "does anything overlap [start, end)?" with one bisect.
+    """
+
+    def __init__(self, intervals: Iterable[Slot]):
+        self._intervals = sorted(intervals)
+        self._starts = [start for start, _ in self._intervals]
+        self._max_end = []
+        running = None
+        for _, end in self._intervals:
+            running = end if running is None or end > running else running
+            self._max_end.append(running)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        # Only intervals starting before `end` can overlap
+        i = bisect.bisect_left(self._starts, end)
+        return i > 0 and self._max_end[i - 1] > start
+
+    def __len__(self):
+        return len(self._intervals)
+
+
+def local_naive(value: datetime) -> datetime:
+    """
+    value as naive server-local time, the way rules, exceptions and
+    appointment times are stored; aware values are converted first
+    """
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+def _parse_clock(value: str) -> time:
+    hours, minutes = value.strip().split(":")
+    return time(int(hours), int(minutes))
+
+
+def legacy_rules(availability: Optional[str]) -> List[Rule]:
+    """Weekly rules from the free-form Doctor.availability JSON, e.g. {"mon-fri": "10:00-16:00"}"""
+    if not availability:
+        return []
+    try:
+        spec = json.loads(availability)
+    except (TypeError, ValueError):
+        return []
+    rules = []
+    if not isinstance(spec, dict):
+        return rules
+    for days, hours in spec.items():
+        try:
+            start, end = (_parse_clock(part) for part in str(hours).split("-"))
+        except ValueError:
+            continue
+        for part in re.split(r"[,\s]+", str(days).lower()):
+            names = [name[:3] for name in part.split("-") if name]
+            if not names or not all(name in DAY_NAMES for name in names):
+                continue
+            first = DAY_NAMES.index(names[0])
+            last = DAY_NAMES.index(names[-1])
+            weekday = first
+            while True:
+                rules.append(Rule(weekday, start, end, DEFAULT_SLOT_MINUTES))
+                if weekday == last:
+                    break
+                weekday = (weekday + 1) % 7
+    return rules
+
+
+def _day_windows(day: date, rules: Sequence[Rule], exceptions: Sequence[models.DoctorAvailabilityException]):
+    """Working windows and blocked intervals of one day"""
+    windows = [
+        (datetime.combine(day, rule.start_time), datetime.combine(day, rule.end_time),
+         rule.slot_minutes or DEFAULT_SLOT_MINUTES)
+        for rule in rules if rule.weekday == day.weekday()
+    ]
+    blocked = []
+    for exception in exceptions:
+        if exception.day != day:
+            continue
+        if exception.start_time is None or exception.end_time is None:
+            if not exception.is_available:
+                return [], []  # day off
+            continue
+        start = datetime.combine(day, exception.start_time)
+        end = datetime.combine(day, exception.end_time)
+        if exception.is_available:
+            windows.append((start, end, exception.slot_minutes or DEFAULT_SLOT_MINUTES))
+        else:
+            blocked.append((start, end))
+    return windows, blocked
+
+
+def booked_intervals(db: Session, doctor_ids: Sequence[int], start: datetime, end: datetime,
+                     exclude_id: Optional[int] = None) -> Dict[int, List[Slot]]:
+    """[start, end) of the live appointments per doctor that may overlap the window"""
+    query = db.query(
+        models.Appointment.doctor_id, models.Appointment.appointment_time, models.Appointment.duration
+    ).filter(
+        models.Appointment.doctor_id.in_(doctor_ids),
+        models.Appointment.appointment_time >= start - timedelta(minutes=MAX_APPOINTMENT_MINUTES),
+        models.Appointment.appointment_time < end,
+        models.Appointment.status != models.AppointmentStatus.CANCELLED,
+    )
+    if exclude_id is not None:
+        query = query.filter(models.Appointment.appointment_id != exclude_id)
+    booked = defaultdict(list)
+    for doctor_id, appointment_time, duration in query:
+        booked[doctor_id].append((appointment_time, appointment_time + timedelta(minutes=duration or DEFAULT_SLOT_MINUTES)))
+    return booked
+
+
+def is_slot_taken(db: Session, doctor_id: int, start: datetime, end: datetime,
+                  exclude_id: Optional[int] = None) -> bool:
+    start, end = local_naive(start), local_naive(end)
+    return IntervalIndex(booked_intervals(db, [doctor_id], start, end, exclude_id)[doctor_id]).overlaps(start, end)
+
+
+def free_slots_for_doctors(db: Session, doctor_ids: Sequence[int],
+                           start: datetime, end: datetime) -> Dict[int, List[Slot]]:
+    """
+    Open slots per doctor in [start, end). Rules, exceptions and booked
+    appointments for all doctors are loaded with one query each.
+    """
+    if not doctor_ids:
+        return {}
+    start, end = local_naive(start), local_naive(end)
+    rules = defaultdict(list)
+    for rule in db.query(models.DoctorAvailabilityRule).filter(
+        models.DoctorAvailabilityRule.doctor_id.in_(doctor_ids)
+    ):
+        rules[rule.doctor_id].append(Rule(rule.weekday, rule.start_time, rule.end_time, rule.slot_minutes))
+    # Doctors who never set structured hours fall back to the legacy JSON column
+    without_rules = [doctor_id for doctor_id in doctor_ids if doctor_id not in rules]
+    if without_rules:
+        for doctor_id, availability in db.query(models.Doctor.doctor_id, models.Doctor.availability).filter(
+            models.Doctor.doctor_id.in_(without_rules)
+        ):
+            rules[doctor_id] = legacy_rules(availability)
+
+    exceptions = defaultdict(list)
+    for exception in db.query(models.DoctorAvailabilityException).filter(
+        models.DoctorAvailabilityException.doctor_id.in_(doctor_ids),
+        models.DoctorAvailabilityException.day >= start.date(),
+        models.DoctorAvailabilityException.day <= end.date(),
+    ):
+        exceptions[exception.doctor_id].append(exception)
+
+    booked = booked_intervals(db, doctor_ids, start, end)
+
+    slots = {}
+    for doctor_id in doctor_ids:
+        taken = IntervalIndex(booked[doctor_id])
+        doctor_slots = []
+        day = start.date()
+        while day <= end.date():
+            windows, blocked = _day_windows(day, rules[doctor_id], exceptions[doctor_id])
+            blocked = IntervalIndex(blocked)
+            for window_start, window_end, slot_minutes in windows:
+                step = timedelta(minutes=slot_minutes)
+                slot_start = window_start
+                while slot_start + step <= window_end:
+                    slot_end = slot_start + step
+                    if (slot_start >= start and slot_end <= end
+                            and not blocked.overlaps(slot_start, slot_end)
+                            and not taken.overlaps(slot_start, slot_end)):
+                        doctor_slots.append((slot_start, slot_end))
+                    slot_start = slot_end
+            day += timedelta(days=1)
+        doctor_slots.sort()
+        slots[doctor_id] = doctor_slots
+    return slots
+
+
+def free_slots(db: Session, doctor_id: int, start: datetime, end: datetime) -> List[Slot]:
+    return free_slots_for_doctors(db, [doctor_id], start, end)[doctor_id]
+
+
+def next_free_slot(db: Session, doctor_ids: Sequence[int], after: datetime,
+                   horizon_days: int = 14) -> Optional[Tuple[int, datetime, datetime]]:
+    """Earliest open (doctor_id, start, end); ties go to the earlier doctor in doctor_ids"""
+    best = None
+    after = local_naive(after)
+    by_doctor = free_slots_for_doctors(db, doctor_ids, after, after + timedelta(days=horizon_days))
+    for doctor_id in doctor_ids:
+        doctor_slots = by_doctor.get(doctor_id)
+        if doctor_slots and (best is None or doctor_slots[0][0] < best[1]):
+            best = (doctor_id, doctor_slots[0][0], doctor_slots[0][1])
+    return best
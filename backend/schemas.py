@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from datetime import datetime, date
+from datetime import datetime, date, time
 from typing import Optional, List
 from enum import Enum
 
@@ -123,6 +123,37 @@ class DoctorUpdate(BaseModel):
     availability: Optional[str] = None
     is_online: Optional[bool] = None
 
+# --------------------
+# Doctor Availability Schemas
+# --------------------
+class AvailabilityRule(BaseModel):
+    weekday: int = Field(..., ge=0, le=6)  # 0 = Monday
+    start_time: time
+    end_time: time
+    slot_minutes: int = Field(30, ge=5, le=240)
+
+    class Config:
+         from_attributes = True
+
+class AvailabilityException(BaseModel):
+    day: date
+    start_time: Optional[time] = None  # both empty = the whole day
+    end_time: Optional[time] = None
+    is_available: bool = False  # True adds hours, False blocks them
+    slot_minutes: int = Field(30, ge=5, le=240)
+    reason: Optional[str] = None
+
+    class Config:
+         from_attributes = True
+
+class DoctorAvailability(BaseModel):
+    rules: List[AvailabilityRule] = []
+    exceptions: List[AvailabilityException] = []
+
+class TimeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
 # --------------------
 # Hospital Schemas
 # --------------------
@@ -147,6 +178,9 @@ class Hospital(HospitalBase):
     class Config:
          from_attributes = True
 
+class NearbyHospital(Hospital):
+    distance_km: float
+
 # --------------------
 # Appointment Schemas
 # --------------------
@@ -358,6 +392,32 @@ class Token(BaseModel):
 
     class Config:
         from_attributes = True
+
+class Principal(BaseModel):
+    """
+    The account behind an access token, as the auth getters return it. A
+    frozen copy of the row rather than the row itself, so it can be cached
+    and shared between requests without a session.
+    """
+    role: UserRole
+    principal_id: int
+    email: str
+    is_active: bool  # False for a patient who has not been verified yet
+
+    class Config:
+        frozen = True
+
+    @property
+    def user_id(self) -> Optional[int]:
+        return self.principal_id if self.role == UserRole.USER else None
+
+    @property
+    def doctor_id(self) -> Optional[int]:
+        return self.principal_id if self.role == UserRole.DOCTOR else None
+
+    @property
+    def admin_id(self) -> Optional[int]:
+        return self.principal_id if self.role == UserRole.ADMIN else None
         # --------------------
 # Symptom Analysis Request Schema
 # --------------------
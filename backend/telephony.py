@@ -1,6 +1,7 @@
 import requests
 import json
 from typing import Optional, Dict, Any
+from datetime import datetime
 from fastapi import HTTPException
 import models
 import schemas
@@ -8,6 +9,7 @@ from database import get_db
 from sqlalchemy.orm import Session
 import crud
 from ai_symptom_checker import analyze_symptoms_from_call
+from scheduling import next_free_slot
 import os
 from dotenv import load_dotenv
 
@@ -128,15 +130,22 @@ def schedule_appointment_from_call(call_booking_id: int, preferred_time: Optiona
     if not doctors:
         raise HTTPException(status_code=404, detail="No available doctors found")
     
-    # For simplicity, pick the first available doctor
-    doctor = doctors[0]
-    
+    if preferred_time:
+        # For simplicity, pick the best-ranked doctor
+        doctor = doctors[0]
+        appointment_time = preferred_time
+    else:
+        # Earliest open slot across the ranked doctors
+        slot = next_free_slot(db, [d.doctor_id for d in doctors], datetime.now())
+        if slot is None:
+            raise HTTPException(status_code=409, detail="No free appointment slots in the next two weeks")
+        doctor_id, slot_start, _ = slot
+        doctor = next(d for d in doctors if d.doctor_id == doctor_id)
+        appointment_time = slot_start.isoformat()
+
     # Find a hospital associated with the doctor
     hospital_id = doctor.hospital_id
-    
-    # Create appointment
-    appointment_time = preferred_time or "2024-01-15T10:00:00"  # In real implementation, would find actual available slot
-    
+
     appointment_data = schemas.AppointmentCreate(
         user_id=call_booking.user_id or 1,  # Default user if not registered
         doctor_id=doctor.doctor_id,
@@ -147,7 +156,10 @@ def schedule_appointment_from_call(call_booking_id: int, preferred_time: Optiona
         urgency=call_booking.urgency
     )
     
-    appointment = crud.create_appointment(db, appointment_data)
+    try:
+        appointment = crud.create_appointment(db, appointment_data)
+    except crud.SlotUnavailableError:
+        raise HTTPException(status_code=409, detail="The doctor is already booked at this time")
     
     # Update call booking with appointment ID
     call_booking.booked_appointment_id = appointment.appointment_id